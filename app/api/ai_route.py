@@ -1,65 +1,272 @@
 from app.graph.graph import graph
 from fastapi import APIRouter, Query, UploadFile, File, HTTPException, status
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from app.config.config import Config
 from app.ingestion.ingestion import ingest_docs
 import os
+import json
 import shutil
 import uuid
-from app.utils.utils import cleanup_session
-from fastapi.responses import FileResponse
+from app.utils.utils import cleanup_session, file_hashes, fingerprint_hashes
+from app.db.answer_cache import answer_cache
+from app.db.session_registry import session_registry, Session, INGESTING, FAILED
+from app.db.session_store import session_index_store
+from app.llms.embeddings import get_embedding_model
+from app.utils.concurrency import run_blocking, blocking_executor
+from app.graph.streaming import STREAM_ANSWER_KEY, AnswerTokenExtractor
+from app.graph.context import group_passages
+from fastapi.responses import FileResponse, StreamingResponse
 from app.schemas import AgentResponse
+from app.utils.metrics import metrics
+from app.utils.tracing import traced, set_attributes
 
 # A router for handling AI research requests, which includes uploading documents, invoking the LangGraph for processing, and returning the response along with any generated reports. 
 # It also includes a route for downloading generated reports.
 router = APIRouter(prefix="/ai", tags=["AI Content Research Agent"])
 
 
+def save_uploads(upload_path: str, files: List[UploadFile]) -> List[str]:
+    """
+    Save the uploaded files into the session's upload directory and return their paths.
+    """
+    os.makedirs(upload_path, exist_ok=True)  # create a directory for this session's uploads
+    file_paths: List[str] = []
+    for file in files:
+        file_name = f"{str(uuid.uuid4())}_{file.filename}"  # generate a unique filename to avoid conflicts
+        file_path = os.path.join(upload_path, file_name)  # generate the full file path for storage
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)  # save the uploaded file to disk
+            size = buffer.tell()
+        metrics.observe("upload_bytes", size)
+        metrics.increment("upload_bytes_total", size)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def save_report(report_filename: str, report_md: str):
+    """
+    Save a generated markdown report into the report store.
+    """
+    report_path = os.path.join(Config.REPORT_STORE_PATH, report_filename)
+    with open(report_path, "w") as f:
+        f.write(report_md)  # save the report markdown to a file for download
+
+
+async def lookup_answer(fingerprint: str, query: str, no_cache: bool) -> Tuple[Optional[Dict], List[float]]:
+    """
+    Look up a cached answer for the query over the corpus. Returns the cached response data (or None) and the query embedding, which is needed to store the fresh answer.
+    """
+    query_vector = await run_blocking(get_embedding_model(Config.EMBED_MODEL).embed_query, query)
+    if no_cache:
+        metrics.increment("answer_cache_bypass_total")
+        return None, query_vector
+    return answer_cache.get(fingerprint, query_vector), query_vector
+
+
+def trim_documents(response: Dict) -> Dict:
+    """
+    Cap the selected chunks returned to the client at Config.RESPONSE_MAX_DOCUMENTS (a map-reduce summary selects every chunk of the session). The retrieval plan still reports the full selection.
+    """
+    documents = response.get("documents") or []
+    if len(documents) > Config.RESPONSE_MAX_DOCUMENTS:
+        response["documents"] = documents[:Config.RESPONSE_MAX_DOCUMENTS]
+        response["grouped_docs"] = group_passages(response["documents"])
+        response["documents_truncated"] = len(documents)  # number of selected chunks before the cap
+    return response
+
+
+async def ingest_session(session_id: str, file_paths: List[str], hashes: List[str]) -> Session:
+    """
+    Register the uploads of a request as a session (keep_session) and ingest them on the bounded executor. A session whose ingestion failed cannot be queried and is removed right away.
+    """
+    session = Session(session_id, status=INGESTING)
+    session.add_files(file_paths, hashes)
+    await run_blocking(session_registry.register, session)  # writes the session's state file, shared with the other workers
+    try:
+        chunks = await run_blocking(ingest_docs, session_id, file_paths, Config.SESSION_PERSIST)  # ingest the uploaded documents (load, chunk, embed) on the bounded executor
+    except Exception as e:
+        session.status, session.error = FAILED, str(e)
+        await run_blocking(session_registry.delete, session_id)
+        raise
+    session_registry.ready(session, chunks)
+    return session
+
+
+async def run_agent(session_id: str, query: str, fingerprint: Optional[str] = None, query_vector: Optional[List[float]] = None) -> AgentResponse:
+    """
+    Run the graph for a query against an ingested session, save the generated report and, if a corpus fingerprint is given, store a successful answer in the answer cache.
+    The session's index is pinned in the session index store while the graph runs, so it cannot be evicted between the nodes that read it.
+    """
+    with session_index_store.pin(session_id):
+        response = await graph.ainvoke({"session_id": session_id, "query": query, "report_md": None, "answer": None})  # invoke the graph with the session ID and user query to get the response
+    set_attributes(task=response.get("task"), chunks=len(response.get("documents") or []))
+    trim_documents(response)
+
+    resp_status=200
+    resp_message="Agent Answered the Query"
+
+    # ensure there's always an answer
+    if response.get("answer") is None:
+        response["answer"] = "Sorry, I could not find an answer to your question based on the provided documents."
+        resp_status=400
+        resp_message="The agent couldn't successfully answer the query."
+    # save the report markdown if generated and add a download URL
+    if response.get("report_md"):
+        report_filename = f"report_{session_id}_{uuid.uuid4().hex[:8]}.md"  # a session can answer many queries, each report gets its own file
+        await run_blocking(save_report, report_filename, response["report_md"])
+        response["report_url"] = f"/reports/download/{report_filename}"  # include the report URL in the response for the frontend to access
+
+    if fingerprint is not None and query_vector is not None and resp_status == 200:
+        # cache only what the client receives about the answer, not the retrieved documents of this session
+        answer_cache.put(fingerprint, query, query_vector, {key: response.get(key) for key in ("answer", "task", "report_md", "report_url")})
+
+    return AgentResponse(status=resp_status, message=resp_message, data=response)
+
+
 @router.post("/ai-research", response_model=AgentResponse, status_code=status.HTTP_200_OK)
-def ai_research(query: str = Query(..., description="Research query to ask the agent"), files: List[UploadFile] = File(...)):
+@traced("ai_research")
+async def ai_research(query: str = Query(..., description="Research query to ask the agent"), files: List[UploadFile] = File(...), no_cache: bool = Query(False, description="Bypass the answer cache and always run the agent"), keep_session: bool = Query(False, description="Keep the ingested documents as a session for follow-up queries")):
     """
     Endpoint to handle AI research requests. It accepts a research query and a list of files to be ingested.
+    The endpoint is async: blocking work (saving uploads, parsing, embedding, FAISS) runs on a bounded executor and the LLM calls are awaited, so a single worker can keep many requests in flight.
+    Answers are cached per uploaded corpus: a request with the same files and a similar query is answered from the cache without ingestion or LLM calls (with keep_session the files are still ingested for the session, but the agent is not run). With no_cache the cache is not read, but the fresh answer still replaces the cached one.
+    By default the request is self-contained: the index is kept in memory only and the uploads and index are removed once the response is built.
+    With keep_session the ingested documents are kept as a session (see /ai/sessions) and persisted (Config.SESSION_PERSIST): follow-up queries can use the returned session_id until the session expires (Config.SESSION_TTL after its last use).
     """
     session_id = str(uuid.uuid4())  # generate a unique session ID for this research session
+    set_attributes(session_id=session_id, files=len(files), keep_session=keep_session)
     try:
         UPLOAD_PATH = f"{Config.UPLOAD_PATH}/{session_id}"  # create a unique upload path for this session to store the uploaded files
-        os.makedirs(UPLOAD_PATH, exist_ok=True)  # create a directory for this session's uploads
-        file_paths: List[str] = []
-        for file in files:
-            file_name = f"{str(uuid.uuid4())}_{file.filename}"  # generate a unique filename to avoid conflicts
-            file_path = os.path.join(UPLOAD_PATH, file_name)  # generate the full file path for storage
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)  # save the uploaded file to disk
-            file_paths.append(file_path)
-        
-        ingest_docs(session_id, file_paths)  # ingest the uploaded documents (load, chunk, embed)
-
-        response = graph.invoke({"session_id": session_id, "query": query, "report_md": None, "answer": None})  # invoke the graph with the session ID and user query to get the response
-
-        resp_status=200
-        resp_message="Agent Answered the Query"
-
-        # ensure there's always an answer
-        if response.get("answer") is None:
-            response["answer"] = "Sorry, I could not find an answer to your question based on the provided documents."
-            resp_status=400
-            resp_message="The agent couldn't successfully answer the query."
-        # save the report markdown if generated and add a download URL
-        if response.get("report_md"):
-            report_filename = f"report_{session_id}.md"
-            report_path = os.path.join(Config.REPORT_STORE_PATH, report_filename)
-            with open(report_path, "w") as f:
-                f.write(response["report_md"])  # save the report markdown to a file for download
-            response["report_url"] = f"/reports/download/{report_filename}"  # include the report URL in the response for the frontend to access
-            
-        agent_body = AgentResponse(status=resp_status, message=resp_message, data=response)
+        file_paths = await run_blocking(save_uploads, UPLOAD_PATH, files)  # save the uploaded files to disk off the event loop
+
+        hashes = await run_blocking(file_hashes, file_paths)  # content hashes, used to detect changed files in later session updates
+        fingerprint, query_vector = None, None
+        if Config.ANSWER_CACHE_ENABLED:
+            fingerprint = fingerprint_hashes(hashes)  # identifies the uploaded corpus by content
+            cached, query_vector = await lookup_answer(fingerprint, query, no_cache)
+            if cached is not None:
+                set_attributes(cached=True)
+                if not keep_session:
+                    await run_blocking(cleanup_session, session_id)  # nothing was ingested, drop the uploads (no session is registered, so no session_id is returned)
+                    return AgentResponse(status=200, message="Agent Answered the Query", data={**cached, "cached": True})
+                await ingest_session(session_id, file_paths, hashes)  # the session is needed for follow-up queries, the answer is not
+                return AgentResponse(status=200, message="Agent Answered the Query", data={**cached, "session_id": session_id, "cached": True})
+
+        if not keep_session:
+            try:
+                with session_index_store.pin(session_id):  # published by ingestion, read by the graph: not evicted in between
+                    await run_blocking(ingest_docs, session_id, file_paths, "none")  # ephemeral index, never written to disk
+                    return await run_agent(session_id, query, fingerprint, query_vector)
+            finally:
+                await run_blocking(cleanup_session, session_id)  # clean up uploaded files and vector DB for this request, executed before returning the response
+
+        with session_index_store.pin(session_id):  # published by ingestion, read by the graph: not evicted in between
+            await ingest_session(session_id, file_paths, hashes)
+            agent_body = await run_agent(session_id, query, fingerprint, query_vector)
+        agent_body.data["session_id"] = session_id
         return agent_body
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))  # Catch the ValueError from tool_selector_node
     except Exception as e:
         raise e  # raise any exceptions that occur during processing to be handled by FastAPI's error handlers
-    finally:
-        cleanup_session(session_id)  # clean up uploaded files and vector DB for this session to free up space, executed before returning the response
+
+
+def discard_session(session_id: str):
+    """
+    Remove the session of a request with its uploads and index, whether or not it was registered as a session.
+    """
+    if not session_registry.delete(session_id):
+        cleanup_session(session_id)
+
+
+ANSWER_NODES={"qna", "compare", "insight", "summarize", "extract"} # graph nodes that produce the final answer
+
+
+def sse(event: str, data: Dict) -> str:
+    """
+    Format one server-sent event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@traced("ai_research_stream")
+async def research_events(session_id: str, query: str, file_paths: List[str], keep_session: bool = False):
+    """
+    Run ingestion and the graph for a research request and yield server-sent events for every stage:
+    uploaded, ingested (chunk count), task (chosen task), retrieved (chunks selected by the retrieval plan, and the plan), token (answer text as it arrives from Groq) and finally answer (the complete response) or error.
+    Like in ai_research, the uploads and index are removed when the stream ends, unless keep_session keeps them as a session (its session_id is sent with the uploaded and answer events).
+    """
+    set_attributes(session_id=session_id, files=len(file_paths), keep_session=keep_session)
+    with session_index_store.pin(session_id):  # kept in memory from ingestion until the stream ends (or the client disconnects)
+        try:
+            yield sse("uploaded", {"files": len(file_paths), **({"session_id": session_id} if keep_session else {})})
+
+            if keep_session:
+                session = await ingest_session(session_id, file_paths, await run_blocking(file_hashes, file_paths))
+                chunks = session.chunks
+            else:
+                chunks = await run_blocking(ingest_docs, session_id, file_paths, "none")
+            yield sse("ingested", {"chunks": chunks})
+
+            result: Dict = {}
+            extractor = AnswerTokenExtractor("answer")  # pulls the answer text out of the JSON the answer node is generating
+            config = {"configurable": {STREAM_ANSWER_KEY: True}}
+            inputs = {"session_id": session_id, "query": query, "report_md": None, "answer": None}
+            async for mode, chunk in graph.astream(inputs, config=config, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") in ANSWER_NODES and isinstance(message.content, str):
+                        text = extractor.feed(message.content)
+                        if text:
+                            yield sse("token", {"text": text})
+                    continue
+                for node_name, update in chunk.items():
+                    if not update:
+                        continue
+                    if node_name == "tool_selector":
+                        set_attributes(task=update["task"])
+                        yield sse("task", {"task": update["task"]})
+                    elif node_name == "plan":
+                        yield sse("retrieved", {"documents": [{"doc_name": d.metadata.get("doc_name"), "page": d.metadata.get("page")} for d in update["documents"][:Config.RESPONSE_MAX_DOCUMENTS]], "plan": update["retrieval_plan"]})
+                    elif node_name in ANSWER_NODES:
+                        result.update(update)
+
+            answer = result.get("answer")
+            data: Dict = {"answer": answer, **({"session_id": session_id} if keep_session else {})}
+            if result.get("report_md"):
+                report_filename = f"report_{session_id}_{uuid.uuid4().hex[:8]}.md"
+                await run_blocking(save_report, report_filename, result["report_md"])
+                data["report_url"] = f"/reports/download/{report_filename}"
+            if answer is None:
+                data["answer"] = "Sorry, I could not find an answer to your question based on the provided documents."
+                yield sse("answer", {"status": 400, "message": "The agent couldn't successfully answer the query.", "data": data})
+            else:
+                yield sse("answer", {"status": 200, "message": "Agent Answered the Query", "data": data})
+        except ValueError as e:
+            keep_session = False  # a failed session cannot be queried
+            yield sse("error", {"status": 400, "detail": str(e)})
+        except Exception as e:
+            keep_session = False
+            yield sse("error", {"status": 500, "detail": str(e)})
+        finally:
+            if not keep_session:
+                blocking_executor.submit(discard_session, session_id)  # not awaited, removed in the background (also when the client disconnects)
+    # a kept session stays until it expires, see /ai/sessions
+
+
+@router.post("/ai-research/stream")
+async def ai_research_stream(query: str = Query(..., description="Research query to ask the agent"), files: List[UploadFile] = File(...), keep_session: bool = Query(False, description="Keep the ingested documents as a session for follow-up queries")):
+    """
+    Streaming variant of the research endpoint. Returns server-sent events (text/event-stream) for each stage of the request and streams the answer tokens as they are generated.
+    """
+    session_id = str(uuid.uuid4())
+    UPLOAD_PATH = f"{Config.UPLOAD_PATH}/{session_id}"
+    file_paths = await run_blocking(save_uploads, UPLOAD_PATH, files)  # uploads are saved before streaming starts, the request files are closed once the endpoint returns
+    return StreamingResponse(
+        research_events(session_id, query, file_paths, keep_session),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # disable proxy buffering so events are flushed immediately
+    )
 
 
 @router.get("/reports/download/{report_filename}")
@@ -71,4 +278,4 @@ def download(report_filename: str):
         f"{Config.REPORT_STORE_PATH}/{report_filename}",  # serve the report file from the report store directory
         media_type="text/markdown",  # set the media type to markdown for proper handling by the browser or client
         filename=report_filename  # set the filename for the downloaded file
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,146 @@
+from fastapi import APIRouter, Query, UploadFile, File, HTTPException, status
+from typing import Dict, List
+import os
+import uuid
+from app.config.config import Config
+from app.ingestion.ingestion import ingest_docs, remove_docs
+from app.api.ai_route import save_uploads, lookup_answer, run_agent
+from app.db.session_registry import session_registry, Session, READY, FAILED, upload_name
+from app.utils.utils import file_hashes
+from app.utils.concurrency import run_blocking
+from app.schemas import AgentResponse, SessionResponse
+from app.utils.tracing import traced, set_attributes
+
+# A router for long-lived research sessions: documents are uploaded and ingested once in the background, then any number of queries can be issued against the session until it expires.
+# Documents of a session can be added, replaced and removed without rebuilding its index.
+router = APIRouter(prefix="/ai/sessions", tags=["Research Sessions"])
+
+
+def get_session(session_id: str, touch: bool = True) -> Session:
+    """
+    Return the session or raise 404 if it does not exist (or has expired).
+    """
+    session = session_registry.get(session_id, touch=touch)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+    return session
+
+
+def update_session(add_paths: List[str], add_hashes: List[str], remove_doc_ids: List[str]):
+    """
+    Build the ingestion job of a session update: remove the given documents from the index (and their uploaded files), then ingest the added files into the existing index.
+    """
+    def job(session: Session):
+        if remove_doc_ids:
+            session.chunks -= remove_docs(session.session_id, remove_doc_ids, Config.SESSION_PERSIST)
+            for doc_id in remove_doc_ids:
+                doc = session.documents.pop(doc_id)
+                if os.path.exists(doc["path"]):
+                    os.remove(doc["path"])
+        if add_paths:
+            first_doc = session.add_files(add_paths, add_hashes)
+            session.chunks += ingest_docs(session.session_id, add_paths, Config.SESSION_PERSIST, first_doc)
+    return job
+
+
+def submit_update(session: Session, add_paths: List[str], add_hashes: List[str], remove_doc_ids: List[str]):
+    if not session_registry.submit(session, update_session(add_paths, add_hashes, remove_doc_ids)):
+        raise HTTPException(status_code=409, detail="The session's documents are still being ingested.")
+
+
+@router.post("", response_model=SessionResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_session(files: List[UploadFile] = File(...)):
+    """
+    Upload documents and create a session. Ingestion (load, chunk, embed) runs on the background ingestion workers; poll GET /ai/sessions/{session_id} until the status is "ready".
+    """
+    session_id = str(uuid.uuid4())
+    file_paths = await run_blocking(save_uploads, f"{Config.UPLOAD_PATH}/{session_id}", files)
+    hashes = await run_blocking(file_hashes, file_paths)  # content hashes, used for change detection and as answer cache key
+    session = await run_blocking(session_registry.register, Session(session_id))  # writes the session's state file, so every worker can report its status
+    await run_blocking(submit_update, session, file_paths, hashes, [])  # persisted, so the session survives eviction from the in-memory index store
+    return SessionResponse(**session.to_dict())
+
+
+@router.get("/{session_id}", response_model=SessionResponse)
+def session_status(session_id: str):
+    """
+    Return the status of a session (pending, ingesting, ready or failed) and its documents. Polling does not extend the session's lifetime.
+    """
+    return SessionResponse(**get_session(session_id, touch=False).to_dict())
+
+
+@router.post("/{session_id}/documents", response_model=SessionResponse, status_code=status.HTTP_202_ACCEPTED)
+async def add_documents(session_id: str, files: List[UploadFile] = File(...)):
+    """
+    Add files to a session, in the background. Files are matched with the session's documents by content hash and name:
+    identical content is skipped, a file with the name of an existing document but different content replaces that document, other files are added.
+    Only new and changed files are parsed and embedded; the rest of the index is kept as is.
+    """
+    session = await run_blocking(get_session, session_id)
+    file_paths = await run_blocking(save_uploads, f"{Config.UPLOAD_PATH}/{session_id}", files)
+    hashes = await run_blocking(file_hashes, file_paths)
+    known_hashes = {doc["hash"] for doc in session.documents.values()}
+    by_name: Dict[str, str] = {doc["name"]: doc_id for doc_id, doc in session.documents.items()}
+    add_paths, add_hashes, replaced, skipped = [], [], [], []
+    for path, digest in zip(file_paths, hashes):
+        if digest in known_hashes or digest in add_hashes:
+            skipped.append(path)  # unchanged (or uploaded twice)
+            continue
+        if upload_name(path) in by_name:
+            replaced.append(by_name.pop(upload_name(path)))  # changed file, the old version is removed
+        add_paths.append(path)
+        add_hashes.append(digest)
+    for path in skipped:
+        os.remove(path)
+    if add_paths:
+        await run_blocking(submit_update, session, add_paths, add_hashes, replaced)
+    return SessionResponse(**session.to_dict())
+
+
+@router.delete("/{session_id}/documents/{doc_id}", response_model=SessionResponse, status_code=status.HTTP_202_ACCEPTED)
+def delete_document(session_id: str, doc_id: str):
+    """
+    Remove a document (its vectors, docstore entries and uploaded file) from a session, in the background.
+    """
+    session = get_session(session_id)
+    if doc_id not in session.documents:
+        raise HTTPException(status_code=404, detail="Document not found in this session.")
+    submit_update(session, [], [], [doc_id])
+    return SessionResponse(**session.to_dict())
+
+
+@router.post("/{session_id}/query", response_model=AgentResponse, status_code=status.HTTP_200_OK)
+@traced("session_query")
+async def query_session(session_id: str, query: str = Query(..., description="Research query to ask the agent"), no_cache: bool = Query(False, description="Bypass the answer cache and always run the agent")):
+    """
+    Ask the agent a query against an ingested session. Each query extends the session's lifetime by Config.SESSION_TTL.
+    """
+    set_attributes(session_id=session_id)
+    session = await run_blocking(get_session, session_id)
+    if session.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Ingestion failed for this session: {session.error}")
+    if session.status != READY:
+        raise HTTPException(status_code=409, detail="The session's documents are still being ingested.")
+    try:
+        fingerprint, query_vector = None, None
+        if Config.ANSWER_CACHE_ENABLED:
+            fingerprint = session.fingerprint  # changes whenever documents are added, replaced or removed
+            cached, query_vector = await lookup_answer(fingerprint, query, no_cache)
+            if cached is not None:
+                set_attributes(cached=True)
+                return AgentResponse(status=200, message="Agent Answered the Query", data={**cached, "session_id": session_id, "cached": True})
+        agent_body = await run_agent(session_id, query, fingerprint, query_vector)
+        agent_body.data["session_id"] = session_id
+        return agent_body
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/{session_id}")
+async def delete_session(session_id: str):
+    """
+    Delete a session with its uploaded files and index.
+    """
+    if not await run_blocking(session_registry.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+    return {"session_id": session_id, "status": "deleted"}
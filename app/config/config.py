@@ -12,16 +12,108 @@ class Config:
     
     GROQ_API_KEY=os.getenv("GROQ_API_KEY")  # API key for GROQ vector database service
     MODEL=os.getenv("MODEL", "llama-3.1-8b-instant")  # Default language model to use
+    GROQ_BASE_URL=os.getenv("GROQ_BASE_URL", "")  # Base URL of the Groq API, empty uses api.groq.com (the benchmarks point it at a local fake server)
+    LLM_MAX_CONCURRENCY=int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # Maximum number of in-flight LLM calls per process
+    LLM_REQUESTS_PER_MINUTE=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # Local request budget per minute and process (N workers allow N times this), 0 relies on Groq's rate-limit headers only
+    LLM_TOKENS_PER_MINUTE=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # Local (estimated) prompt token budget per minute, 0 relies on Groq's rate-limit headers only
+    LLM_MAX_RETRIES=int(os.getenv("LLM_MAX_RETRIES", "4"))  # Retries of a call rejected with 429 (rate limited)
+    LLM_BACKOFF_BASE=float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # Base delay in seconds of the jittered exponential backoff
+    LLM_BACKOFF_MAX=float(os.getenv("LLM_BACKOFF_MAX", "20"))  # Upper bound in seconds of a single backoff delay
+    LLM_TIMEOUT=float(os.getenv("LLM_TIMEOUT", "60"))  # HTTP timeout in seconds of LLM calls
+
+    EMBED_MODEL=os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")  # Embedding model used for ingestion and retrieval
+    EMBED_DEVICE=os.getenv("EMBED_DEVICE", "cpu")  # Device the embedding model runs on (e.g. cpu, cuda)
+    EMBED_NUM_THREADS=int(os.getenv("EMBED_NUM_THREADS", "0"))  # Number of torch (or ONNX Runtime) threads for embedding, 0 keeps the default
+    EMBED_BACKEND=os.getenv("EMBED_BACKEND", "torch").lower()  # Embedding backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, CPU)
+    EMBED_ONNX_QUANTIZE=os.getenv("EMBED_ONNX_QUANTIZE", "false").lower()=="true"  # Quantize the ONNX model to int8 (faster, vectors get a new model id)
+    EMBED_ONNX_DIR=os.getenv("EMBED_ONNX_DIR", "app/data/onnx")  # Directory of the exported ONNX models
+    EMBED_WARMUP=os.getenv("EMBED_WARMUP", "true").lower()=="true"  # Load the embedding model at application startup instead of on the first request
+    EMBED_SERVICE_URL=os.getenv("EMBED_SERVICE_URL", "")  # Shared embedding service (unix:/path/to.sock or http://127.0.0.1:8100), empty loads the model in every worker
+    EMBED_SERVICE_MAX_BATCH=int(os.getenv("EMBED_SERVICE_MAX_BATCH", "64"))  # The service closes a batch once it holds this many texts
+    EMBED_SERVICE_MAX_WAIT_MS=float(os.getenv("EMBED_SERVICE_MAX_WAIT_MS", "5"))  # ... or this many milliseconds after its first request
+    EMBED_SERVICE_TIMEOUT=float(os.getenv("EMBED_SERVICE_TIMEOUT", "60"))  # HTTP timeout in seconds of embedding service requests
+    EMBED_SERVICE_MODELS=[name.strip() for name in os.getenv("EMBED_SERVICE_MODELS", EMBED_MODEL).split(",") if name.strip()]  # Models the embedding service serves (comma separated), requests for other models get a 400
+
+    TOOL_SELECTOR_MODE=os.getenv("TOOL_SELECTOR_MODE", "llm").lower()  # Task classification: "llm" (always ask the LLM) or "local" (embedding prototypes with LLM fallback)
+    TOOL_SELECTOR_MARGIN=float(os.getenv("TOOL_SELECTOR_MARGIN", "0.05"))  # In local mode, minimum cosine margin between the two best tasks to skip the LLM call
+    TOOL_SELECTOR_MIN_SIMILARITY=float(os.getenv("TOOL_SELECTOR_MIN_SIMILARITY", "0.35"))  # In local mode, minimum cosine similarity to the best task prototype; less similar (possibly out-of-scope) queries are left to the LLM, which can reject them
     
     REPO_ROOT=Path(__file__).resolve().parents[2] # Root directory of the repository, used as a base for constructing paths to data directories
     VECTOR_DB_DIR=os.getenv("VECTOR_DB_DIR", "app/data/vector_dbs")  # Directory to store vector databases
     UPLOAD_DIR=os.getenv("UPLOAD_DIR", "app/data/uploads")  # Directory to store uploaded documents
     REPORT_STORE_DIR=os.getenv("REPORT_STORE_DIR", "app/data/reports")  # Directory to store generated reports
 
+    BLOCKING_WORKERS=int(os.getenv("BLOCKING_WORKERS", str(os.cpu_count() or 4)))  # Size of the executor that runs CPU-bound work (parsing, embedding, FAISS) off the event loop
+    INGEST_STREAMING=os.getenv("INGEST_STREAMING", "false").lower()=="true"  # Stream pages and chunks through ingestion in batches instead of materializing the whole corpus
+    INGEST_BATCH_SIZE=int(os.getenv("INGEST_BATCH_SIZE", "256"))  # Chunks embedded and indexed per batch in streaming ingestion
+    LOADER_WORKERS=int(os.getenv("LOADER_WORKERS", str(min(4, os.cpu_count() or 1))))  # Processes used to parse PDFs in parallel, 1 disables the process pool
+    LOADER_START_METHOD=os.getenv("LOADER_START_METHOD", "spawn")  # multiprocessing start method of the loader pool (spawn is safe in a threaded server)
+    LOADER_PARALLEL_MIN_BYTES=int(os.getenv("LOADER_PARALLEL_MIN_BYTES", str(2*1024*1024)))  # Uploads smaller than this are parsed in-process
+    LOADER_PDF_SPLIT_BYTES=int(os.getenv("LOADER_PDF_SPLIT_BYTES", str(5*1024*1024)))  # PDFs at least this large are split into page ranges across workers
+    LOADER_PDF_PAGES_PER_TASK=int(os.getenv("LOADER_PDF_PAGES_PER_TASK", "50"))  # Pages per task when a large PDF is split
+    CONTEXT_TOKEN_BUDGET=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))  # Maximum number of context tokens (retrieved passages) put into an answer prompt
+    CONTEXT_TOKEN_ENCODING=os.getenv("CONTEXT_TOKEN_ENCODING", "cl100k_base")  # tiktoken encoding used to measure the context
+    CONTEXT_DEDUP_THRESHOLD=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))  # Passages at least this similar (word 5-gram Jaccard) to a better ranked passage are dropped
+    ANSWER_CACHE_ENABLED=os.getenv("ANSWER_CACHE_ENABLED", "true").lower()=="true"  # Reuse answers for similar queries over the same uploaded files
+    ANSWER_CACHE_THRESHOLD=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Minimum cosine similarity between query embeddings for a cache hit
+    ANSWER_CACHE_TTL=float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # Seconds a cached answer stays valid
+    ANSWER_CACHE_MAX_ENTRIES=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))  # Maximum number of cached answers, least recently used are evicted beyond it
+    RETRIEVAL_MODE=os.getenv("RETRIEVAL_MODE", "dense").lower()  # "dense" (FAISS only) or "hybrid" (FAISS + BM25 fused with reciprocal rank fusion)
+    HYBRID_DENSE_WEIGHT=float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))  # Weight of the dense ranking in the fusion
+    HYBRID_SPARSE_WEIGHT=float(os.getenv("HYBRID_SPARSE_WEIGHT", "1.0"))  # Weight of the BM25 ranking in the fusion
+    HYBRID_RRF_K=int(os.getenv("HYBRID_RRF_K", "60"))  # Rank offset of reciprocal rank fusion, larger values flatten the contribution of top ranks
+    HYBRID_FETCH_K=int(os.getenv("HYBRID_FETCH_K", "32"))  # Candidates fetched from each retriever before fusion
+    BM25_K1=float(os.getenv("BM25_K1", "1.5"))  # BM25 term frequency saturation
+    BM25_B=float(os.getenv("BM25_B", "0.75"))  # BM25 document length normalization
+    RETRIEVAL_POOL_K=int(os.getenv("RETRIEVAL_POOL_K", "40"))  # Candidate chunks retrieved while the task is classified, the retrieval plan of the task selects from them
+    RETRIEVAL_TOP_K=int(os.getenv("RETRIEVAL_TOP_K", "8"))  # Chunks used by insight and extract
+    QNA_TOP_K=int(os.getenv("QNA_TOP_K", "5"))  # Chunks used to answer a question
+    COMPARE_PER_DOC_K=int(os.getenv("COMPARE_PER_DOC_K", "4"))  # Chunks per document used for a comparison
+    COMPARE_MAX_DOCS=int(os.getenv("COMPARE_MAX_DOCS", "6"))  # Maximum number of documents in a comparison
+    COMPARE_TOKEN_BUDGET=int(os.getenv("COMPARE_TOKEN_BUDGET", "4000"))  # Context token budget of a comparison
+    SUMMARIZE_TOP_K=int(os.getenv("SUMMARIZE_TOP_K", "20"))  # Chunks selected (with MMR) for a summary
+    SUMMARIZE_MMR_LAMBDA=float(os.getenv("SUMMARIZE_MMR_LAMBDA", "0.5"))  # MMR trade-off for summaries, 1.0 is pure relevance and 0.0 pure diversity
+    SUMMARIZE_TOKEN_BUDGET=int(os.getenv("SUMMARIZE_TOKEN_BUDGET", "5000"))  # Context token budget of a summary
+    SUMMARIZE_MAP_REDUCE_MIN_TOKENS=int(os.getenv("SUMMARIZE_MAP_REDUCE_MIN_TOKENS", "8000"))  # Sessions with more tokens than this are summarized completely with map-reduce
+    SUMMARIZE_MAP_GROUP_TOKENS=int(os.getenv("SUMMARIZE_MAP_GROUP_TOKENS", "3000"))  # Context tokens per map call, also the size of the groups of partial summaries reduced together
+    RESPONSE_MAX_DOCUMENTS=int(os.getenv("RESPONSE_MAX_DOCUMENTS", "40"))  # Selected chunks returned in a response (documents, grouped_docs); map-reduce summaries select every chunk of the session
+    VECTOR_INDEX=os.getenv("VECTOR_INDEX", "auto").lower()  # Vector index type: "auto" (by corpus size), "flat" (exact), "ivf" or "hnsw"
+    VECTOR_INDEX_MIN_CHUNKS=int(os.getenv("VECTOR_INDEX_MIN_CHUNKS", "20000"))  # In auto mode, sessions with at least this many chunks use VECTOR_INDEX_LARGE (with VECTOR_INDEX_STORAGE), smaller ones stay exact float32
+    VECTOR_INDEX_LARGE=os.getenv("VECTOR_INDEX_LARGE", "hnsw").lower()  # Approximate index used for large sessions in auto mode: "ivf" or "hnsw"
+    VECTOR_INDEX_STORAGE=os.getenv("VECTOR_INDEX_STORAGE", "flat").lower()  # Vector storage: "flat" (float32), "sqfp16" (float16), "sq8" (8 bit scalar quantization) or "pq" (product quantization)
+    VECTOR_INDEX_TRAIN_MAX=int(os.getenv("VECTOR_INDEX_TRAIN_MAX", "100000"))  # Maximum number of vectors used to train IVF / quantizers
+    IVF_NLIST=int(os.getenv("IVF_NLIST", "0"))  # Number of IVF lists, 0 chooses about 4*sqrt(chunks)
+    IVF_NPROBE=int(os.getenv("IVF_NPROBE", "16"))  # IVF lists scanned per query, higher is more accurate and slower
+    HNSW_M=int(os.getenv("HNSW_M", "32"))  # Neighbours per HNSW node, higher is more accurate and uses more memory
+    HNSW_EF_CONSTRUCTION=int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))  # HNSW build-time search depth
+    HNSW_EF_SEARCH=int(os.getenv("HNSW_EF_SEARCH", "64"))  # HNSW query-time search depth, higher is more accurate and slower
+    PQ_M=int(os.getenv("PQ_M", "48"))  # Product quantization sub-quantizers (bytes per vector with 8 bits), must divide the embedding dimension
+    PQ_NBITS=int(os.getenv("PQ_NBITS", "8"))  # Bits per product quantization code
+    SESSION_INDEX_MAX_MB=int(os.getenv("SESSION_INDEX_MAX_MB", "512"))  # Memory budget of the in-process session index store, least recently used sessions are evicted beyond it
+    VECTOR_DB_PERSIST=os.getenv("VECTOR_DB_PERSIST", "none").lower()  # Persist session indexes to disk: "none", "async" (background write-behind) or "sync"
+    SESSION_TTL=float(os.getenv("SESSION_TTL", "3600"))  # Seconds a session (uploads and index) is kept after it was last used
+    SESSION_SWEEP_INTERVAL=float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))  # Seconds between two runs of the expired session sweeper
+    SESSION_INGEST_WORKERS=int(os.getenv("SESSION_INGEST_WORKERS", "2"))  # Sessions ingested concurrently in the background
+    SESSION_PERSIST=os.getenv("SESSION_PERSIST", "async").lower()  # Persistence of session indexes ("none", "async", "sync"), so sessions evicted from memory can be reloaded from disk
+    TRACE_EXPORT=os.getenv("TRACE_EXPORT", "none").lower()  # Export request traces: "none", "file" (JSON lines in TRACE_FILE) or "http" (POST to TRACE_COLLECTOR_URL)
+    TRACE_FILE=os.getenv("TRACE_FILE", "app/data/traces.jsonl")  # File the traces are appended to
+    TRACE_COLLECTOR_URL=os.getenv("TRACE_COLLECTOR_URL", "")  # Collector endpoint receiving one JSON trace per request
+    SLOW_REQUEST_SECONDS=float(os.getenv("SLOW_REQUEST_SECONDS", "10"))  # Requests taking at least this long are written to the slow request log with their stage timings, 0 disables it
+    SLOW_REQUEST_LOG_FILE=os.getenv("SLOW_REQUEST_LOG_FILE", "app/data/slow_requests.jsonl")  # File of the slow request log
+
     UPLOAD_PATH=(REPO_ROOT/UPLOAD_DIR).resolve() # Full path to the upload directory, resolved from the repository root and the upload directory name
     VECTOR_DB_PATH=(REPO_ROOT/VECTOR_DB_DIR).resolve() # Full path to the vector database directory, resolved from the repository root and the vector database directory name
     REPORT_STORE_PATH=(REPO_ROOT/REPORT_STORE_DIR).resolve() # Full path to the report store directory, resolved from the repository root and the report store directory name
 
+    EMBED_CACHE_ENABLED=os.getenv("EMBED_CACHE_ENABLED", "true").lower()=="true"  # Reuse embeddings of previously seen chunks across sessions
+    EMBED_CACHE_FILE=os.getenv("EMBED_CACHE_FILE", "app/data/embedding_cache.sqlite3")  # SQLite file backing the embedding cache
+    EMBED_CACHE_MAX_MB=int(os.getenv("EMBED_CACHE_MAX_MB", "256"))  # Size cap of the cached vectors, least recently used entries are evicted beyond it
+    EMBED_CACHE_PATH=(REPO_ROOT/EMBED_CACHE_FILE).resolve() # Full path to the embedding cache file, resolved from the repository root
+    EMBED_ONNX_PATH=(REPO_ROOT/EMBED_ONNX_DIR).resolve() # Full path to the exported ONNX models, resolved from the repository root
+    TRACE_PATH=(REPO_ROOT/TRACE_FILE).resolve() # Full path to the trace file, resolved from the repository root
+    SLOW_REQUEST_LOG_PATH=(REPO_ROOT/SLOW_REQUEST_LOG_FILE).resolve() # Full path to the slow request log, resolved from the repository root
+
 Config.UPLOAD_PATH.mkdir(parents=True, exist_ok=True)  # Ensure the upload directory exists
 Config.VECTOR_DB_PATH.mkdir(parents=True, exist_ok=True)  # Ensure the vector database directory exists
-Config.REPORT_STORE_PATH.mkdir(parents=True, exist_ok=True)  # Ensure the report store directory exists
\ No newline at end of file
+Config.REPORT_STORE_PATH.mkdir(parents=True, exist_ok=True)  # Ensure the report store directory exists
+Config.EMBED_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)  # Ensure the embedding cache directory exists
\ No newline at end of file
@@ -0,0 +1,94 @@
+import math
+from typing import Optional
+import faiss
+import numpy as np
+from app.config.config import Config
+
+def _encoding(n: int, d: int) -> str:
+    """
+    index_factory code of the vector storage (Config.VECTOR_INDEX_STORAGE): full float32, float16 or 8 bit scalar quantization, or product quantization.
+    Product quantization needs at least 39 training points per centroid of its codebooks (2^PQ_NBITS centroids); smaller corpora fall back to 8 bit scalar quantization, which needs no minimum.
+    """
+    storage=Config.VECTOR_INDEX_STORAGE
+    if storage=="sqfp16":
+        return "SQfp16"
+    if storage=="sq8" or (storage=="pq" and n<39*2**Config.PQ_NBITS):
+        return "SQ8"
+    if storage=="pq":
+        m=max(i for i in range(1, min(Config.PQ_M, d)+1) if d%i==0) # number of sub-quantizers must divide the dimension
+        return f"PQ{m}x{Config.PQ_NBITS}"
+    return "Flat"
+
+def _nlist(n: int) -> int:
+    """
+    Number of IVF lists: Config.IVF_NLIST, or about 4*sqrt(n), with at least 39 training points per list.
+    """
+    nlist=Config.IVF_NLIST or int(4*math.sqrt(n))
+    return max(1, min(nlist, n//39))
+
+def index_description(n: int, d: int) -> Optional[str]:
+    """
+    Return the faiss index_factory description for a corpus of n vectors of dimension d, or None if the exact float32 flat index (the default of the langchain store) is the right choice.
+    With Config.VECTOR_INDEX="auto", corpora below Config.VECTOR_INDEX_MIN_CHUNKS stay exact float32 flat whatever the storage setting (exact search is fast enough there) and larger ones use Config.VECTOR_INDEX_LARGE ("ivf" or "hnsw") with Config.VECTOR_INDEX_STORAGE.
+    """
+    kind=Config.VECTOR_INDEX
+    if kind=="auto":
+        if n<Config.VECTOR_INDEX_MIN_CHUNKS:
+            return None
+        kind=Config.VECTOR_INDEX_LARGE
+    encoding=_encoding(n, d)
+    if kind=="ivf":
+        return f"IVF{_nlist(n)},{encoding}"
+    if kind=="hnsw":
+        return f"HNSW{Config.HNSW_M}" if encoding=="Flat" else f"HNSW{Config.HNSW_M}_{encoding}"
+    return None if encoding=="Flat" else encoding
+
+def is_flat(index) -> bool:
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+def build_index(vectors: np.ndarray, description: str):
+    """
+    Build an index from the factory description and add the vectors (in order, so positions are preserved), training it first if the index type needs training (IVF, SQ, PQ).
+    """
+    d=vectors.shape[1]
+    try:
+        index=faiss.index_factory(d, description, faiss.METRIC_L2)
+    except RuntimeError as e:
+        print(f"Unsupported index description {description}, falling back to a flat index: {e}")
+        index=faiss.IndexFlatL2(d)
+    if not index.is_trained:
+        train=vectors
+        if len(vectors)>Config.VECTOR_INDEX_TRAIN_MAX:
+            train=vectors[np.random.default_rng(0).choice(len(vectors), Config.VECTOR_INDEX_TRAIN_MAX, replace=False)] # a sample is enough to train the quantizers
+        index.train(train)
+    ivf=faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable) # keeps reconstruct() working (removals rebuild the index, see VectorDB.delete_documents)
+    hnsw=faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efConstruction=Config.HNSW_EF_CONSTRUCTION
+    index.add(vectors)
+    configure_search(index)
+    return index
+
+def configure_search(index):
+    """
+    Apply the recall / latency settings of Config to an index: nprobe for IVF, efSearch for HNSW.
+    """
+    ivf=faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe=Config.IVF_NPROBE
+    hnsw=faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch=Config.HNSW_EF_SEARCH
+
+def bytes_per_vector(index) -> int:
+    """
+    Approximate memory per stored vector: the code size of the storage, plus ids for IVF and the neighbour links for HNSW.
+    """
+    index=faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.downcast_index(index.storage).code_size+2*Config.HNSW_M*4
+    if isinstance(index, faiss.IndexIVF):
+        return index.code_size+8
+    return getattr(index, "code_size", index.d*4)
@@ -0,0 +1,102 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from app.config.config import Config
+from app.utils.metrics import metrics
+
+@dataclass
+class CachedAnswer:
+    fingerprint: str # fingerprint of the uploaded file contents the answer was produced for
+    query: str # original query text
+    vector: np.ndarray # normalized query embedding
+    response: Dict # response data returned for the query
+    created_at: float # time.time() when the answer was stored
+
+class AnswerCache:
+    """
+    In-process semantic cache of agent answers.
+    An answer is reused when a new request uploads the same files (same corpus fingerprint) and its query embedding is within a cosine-similarity threshold of a cached query, so paraphrased questions hit as well.
+    Entries expire after ttl seconds and at most max_entries answers are kept, evicting the least recently used.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold=threshold
+        self.ttl=ttl
+        self.max_entries=max_entries
+        self._entries: "OrderedDict[int, CachedAnswer]"=OrderedDict() # entry id -> answer, least recently used first
+        self._by_fingerprint: Dict[str, List[int]]={} # corpus fingerprint -> entry ids
+        self._ids=itertools.count()
+        self._lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector=np.asarray(vector, dtype=np.float32)
+        return vector/(np.linalg.norm(vector) or 1.0)
+
+    def _remove(self, entry_id: int):
+        entry=self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids=self._by_fingerprint.get(entry.fingerprint, [])
+        if entry_id in ids:
+            ids.remove(entry_id)
+        if not ids:
+            self._by_fingerprint.pop(entry.fingerprint, None)
+
+    def get(self, fingerprint: str, query_vector) -> Optional[Dict]:
+        """
+        Return the cached response of the most similar query over the same corpus, or None if no live entry is similar enough.
+        """
+        vector=self._normalize(query_vector)
+        now=time.time()
+        with self._lock:
+            best_id, best_score=None, self.threshold
+            for entry_id in list(self._by_fingerprint.get(fingerprint, [])):
+                entry=self._entries[entry_id]
+                if now-entry.created_at>self.ttl:
+                    self._remove(entry_id) # expired
+                    continue
+                score=float(vector@entry.vector)
+                if score>=best_score:
+                    best_id, best_score=entry_id, score
+            if best_id is None:
+                self.misses+=1
+                metrics.increment("answer_cache_misses_total")
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits+=1
+            metrics.increment("answer_cache_hits_total")
+            return dict(self._entries[best_id].response)
+
+    def put(self, fingerprint: str, query: str, query_vector, response: Dict):
+        """
+        Store the response for a query over a corpus, evicting the least recently used answers beyond max_entries.
+        """
+        entry=CachedAnswer(fingerprint, query, self._normalize(query_vector), dict(response), time.time())
+        with self._lock:
+            entry_id=next(self._ids)
+            self._entries[entry_id]=entry
+            self._by_fingerprint.setdefault(fingerprint, []).append(entry_id)
+            while len(self._entries)>self.max_entries:
+                self._remove(next(iter(self._entries)))
+                metrics.increment("answer_cache_evictions_total")
+
+    def stats(self) -> Dict:
+        """
+        Return the number of cached answers and the hit rate since start-up.
+        """
+        with self._lock:
+            lookups=self.hits+self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "hit_rate": self.hits/lookups if lookups else 0.0}
+
+answer_cache=AnswerCache(
+    threshold=Config.ANSWER_CACHE_THRESHOLD,
+    ttl=Config.ANSWER_CACHE_TTL,
+    max_entries=Config.ANSWER_CACHE_MAX_ENTRIES
+) # process-wide answer cache
@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import threading
+import weakref
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+def write_chunks(path: str, rows: Iterable[Tuple[int, str, Document]]):
+    """
+    Write the chunks of an index to a new SQLite file: one row per index position with the docstore id, the chunk text and its metadata as JSON.
+    """
+    conn=sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE chunks (position INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            ((position, chunk_id, doc.page_content, json.dumps(doc.metadata, default=str)) for position, chunk_id, doc in rows)
+        )
+        conn.execute("CREATE UNIQUE INDEX chunks_by_id ON chunks (chunk_id)")
+        conn.commit()
+    finally:
+        conn.close()
+
+class ChunkStore:
+    """
+    Read-only access to the chunks of a persisted index. Rows are read on demand by position or id, so opening a session does not load its chunks.
+    """
+
+    def __init__(self, path: str):
+        self._conn=sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock=threading.Lock() # the connection is shared by the request threads
+        self._count=None
+        self._finalizer=weakref.finalize(self, self._conn.close) # closed once the store is no longer used (e.g. its index was evicted), or by close()
+
+    def close(self):
+        self._finalizer()
+
+    def _query(self, sql: str, params: tuple=()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count=self._query("SELECT COUNT(*) FROM chunks")[0][0]
+        return self._count
+
+    def chunk_id(self, position: int) -> str:
+        rows=self._query("SELECT chunk_id FROM chunks WHERE position=?", (position,))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def document(self, chunk_id: str) -> Union[Document, None]:
+        rows=self._query("SELECT text, metadata FROM chunks WHERE chunk_id=?", (chunk_id,))
+        if not rows:
+            return None
+        return Document(page_content=rows[0][0], metadata=json.loads(rows[0][1]))
+
+    def ids(self) -> List[Tuple[int, str]]:
+        return self._query("SELECT position, chunk_id FROM chunks ORDER BY position")
+
+    def positions(self, chunk_ids: List[str]) -> Dict[str, int]:
+        """
+        Index positions of the given chunks, by chunk id.
+        """
+        positions: Dict[str, int]={}
+        for start in range(0, len(chunk_ids), 500): # stay below SQLite's limit of bound parameters
+            batch=chunk_ids[start:start+500]
+            positions.update(self._query(f"SELECT chunk_id, position FROM chunks WHERE chunk_id IN ({','.join('?'*len(batch))})", tuple(batch)))
+        return positions
+
+    def doc_chunks(self) -> Dict[str, List[str]]:
+        """
+        Chunk ids of every document (doc_id metadata), in index order, read with a single query.
+        """
+        doc_chunks: Dict[str, List[str]]={}
+        for doc_id, chunk_id in self._query("SELECT json_extract(metadata, '$.doc_id'), chunk_id FROM chunks ORDER BY position"):
+            doc_chunks.setdefault(doc_id, []).append(chunk_id)
+        return doc_chunks
+
+    def documents(self) -> Iterator[Tuple[str, Document]]:
+        """
+        All chunks in index order, as (chunk id, Document).
+        """
+        for chunk_id, text, metadata in self._query("SELECT chunk_id, text, metadata FROM chunks ORDER BY position"):
+            yield chunk_id, Document(page_content=text, metadata=json.loads(metadata))
+
+class LazyIdMap(Mapping):
+    """
+    index position -> docstore id mapping of a persisted index, read from the chunk store on demand (the langchain FAISS store expects a dict here).
+    """
+
+    def __init__(self, store: ChunkStore):
+        self._store=store
+
+    def __getitem__(self, position: int) -> str:
+        return self._store.chunk_id(int(position))
+
+    def __len__(self) -> int:
+        return self._store.count()
+
+    def __iter__(self) -> Iterator[int]:
+        return (position for position, _ in self._store.ids())
+
+    def items(self):
+        return self._store.ids()
+
+    def values(self):
+        return [chunk_id for _, chunk_id in self._store.ids()]
+
+    def positions(self, chunk_ids: List[str]) -> Dict[str, int]:
+        return self._store.positions(chunk_ids)
+
+class LazyDocstore(Docstore):
+    """
+    Read-only docstore of a persisted index, looking chunks up in the chunk store by id.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self._store=store
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc=self._store.document(search)
+        return f"ID {search} not found." if doc is None else doc
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("Persisted indexes are read-only, load the session writable to modify it.")
+
+    def items(self) -> Iterator[Tuple[str, Document]]:
+        return self._store.documents()
+
+def docstore_items(docstore) -> Iterator[Tuple[str, Document]]:
+    """
+    All (chunk id, Document) pairs of a docstore, lazy or in memory, in insertion (index) order.
+    """
+    if isinstance(docstore, LazyDocstore):
+        return docstore.items()
+    return iter(docstore._dict.items())
+
+def read_manifest(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
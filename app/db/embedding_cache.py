@@ -0,0 +1,127 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.config.config import Config
+from app.utils.metrics import metrics
+
+def text_hash(text: str) -> str:
+    """
+    Content hash of a chunk text, used as the cache key together with the embedding model name.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by a local SQLite database, shared across sessions.
+    Vectors are keyed by (model name, chunk text hash) and stored as raw float32 bytes. The total size of the stored vectors is capped at max_bytes; when the cap is exceeded the least recently used entries are evicted.
+    The size is read from the database rather than counted in memory, so several workers sharing the file all see the writes of the others.
+    """
+
+    _BATCH=500 # max keys per SQL statement, stays below SQLite's bound-parameter limit
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes=max_bytes # upper bound for the summed size of all cached vectors
+        self._lock=threading.Lock() # a single connection is shared between threads, so every access is serialized
+        self._conn=sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL") # readers in other processes are not blocked by our writes
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+        """)
+        self._conn.execute("DROP INDEX IF EXISTS idx_embeddings_last_used") # replaced by the covering index below
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings (last_used, nbytes)") # LRU order and sizes without reading the vectors
+        self._conn.commit()
+
+    def _size(self) -> Tuple[int, int]:
+        """
+        Total bytes and number of the cached vectors, summed over the covering index. Caller holds the lock.
+        """
+        total, entries=self._conn.execute("SELECT COALESCE(SUM(nbytes), 0), COUNT(*) FROM embeddings INDEXED BY idx_embeddings_lru").fetchone()
+        return total, entries
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up the cached vectors for the given hashes. Returns a dict with an entry for every hash that was found.
+        """
+        found: Dict[str, List[float]]={}
+        unique=list(dict.fromkeys(hashes))
+        now=time.time()
+        with self._lock:
+            for start in range(0, len(unique), self._BATCH):
+                batch=unique[start:start+self._BATCH]
+                placeholders=",".join("?"*len(batch))
+                rows=self._conn.execute(f"SELECT hash, vector FROM embeddings WHERE model=? AND hash IN ({placeholders})", [model, *batch]).fetchall()
+                for h, blob in rows:
+                    found[h]=np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    self._conn.executemany("UPDATE embeddings SET last_used=? WHERE model=? AND hash=?", [(now, model, h) for h, _ in rows]) # refresh recency for LRU eviction
+            self._conn.commit()
+        hits=sum(1 for h in hashes if h in found)
+        metrics.increment("embedding_cache_hits_total", hits)
+        metrics.increment("embedding_cache_misses_total", len(hashes)-hits)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """
+        Store vectors for the given hashes and evict least recently used entries if the cache grows over its size cap.
+        """
+        if not items:
+            return
+        now=time.time()
+        rows=[]
+        for h, vector in items.items():
+            blob=np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((model, h, blob, len(blob), now))
+        with self._lock:
+            for row in rows:
+                self._conn.execute("INSERT OR IGNORE INTO embeddings (model, hash, vector, nbytes, last_used) VALUES (?, ?, ?, ?, ?)", row) # ignored if another worker stored the same key first
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Delete least recently used entries until the total size is back under 90% of the cap (to avoid evicting on every insert). Caller holds the lock.
+        Each round deletes the oldest entries in one statement, as many as the excess holds at the average vector size; vectors of different sizes may need another round.
+        """
+        total, entries=self._size()
+        if total<=self.max_bytes:
+            return
+        target=int(self.max_bytes*0.9)
+        while total>target and entries:
+            count=-(-(total-target)*entries//total) # ceil of excess / average vector size
+            deleted=self._conn.execute("DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings INDEXED BY idx_embeddings_lru ORDER BY last_used LIMIT ?)", (count,)).rowcount
+            metrics.increment("embedding_cache_evictions_total", deleted)
+            total, entries=self._size()
+
+    def stats(self) -> Dict:
+        """
+        Return the number of entries and bytes currently held in the cache.
+        """
+        with self._lock:
+            total, entries=self._size()
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+_cache: Optional[EmbeddingCache]=None
+_cache_lock=threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, opening it on first use, or None when caching is disabled in Config.
+    """
+    global _cache
+    if not Config.EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache=EmbeddingCache(str(Config.EMBED_CACHE_PATH), Config.EMBED_CACHE_MAX_MB*1024*1024)
+    return _cache
@@ -0,0 +1,326 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+from app.config.config import Config
+from app.db.session_store import session_index_store
+from app.utils.concurrency import blocking_executor
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+from app.utils.utils import cleanup_session, fingerprint_hashes
+
+PENDING="pending" # created, waiting for an ingestion worker
+INGESTING="ingesting" # documents are being loaded, chunked and embedded
+READY="ready" # indexed, accepts queries
+FAILED="failed" # ingestion failed, see error
+STATE_FILE="session.json" # state of a session in its upload directory, shared by all workers
+LOCK_FILE="session.lock" # lock file serializing updates of the state file across workers
+
+def upload_name(path: str) -> str:
+    """
+    Original file name of an upload (uploads are stored as <uuid>_<file name>).
+    """
+    return os.path.basename(path).split("_", 1)[-1]
+
+@dataclass
+class Session:
+    session_id: str
+    status: str=PENDING
+    documents: Dict[str, Dict]=field(default_factory=dict) # doc_id -> {"name", "path", "hash"} of the session's files
+    next_doc: int=0 # index of the next doc_id, ids are never reused within a session
+    chunks: int=0 # number of indexed chunks
+    error: Optional[str]=None # error message of the last failed ingestion
+    created_at: float=field(default_factory=time.time)
+    last_used: float=field(default_factory=time.time)
+
+    @property
+    def expires_at(self) -> float:
+        return self.last_used+Config.SESSION_TTL
+
+    @property
+    def file_paths(self) -> List[str]:
+        return [doc["path"] for doc in self.documents.values()]
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Corpus fingerprint of the session's current files, the answer cache key.
+        """
+        return fingerprint_hashes(doc["hash"] for doc in self.documents.values())
+
+    def add_files(self, file_paths: List[str], hashes: List[str]) -> int:
+        """
+        Register files as documents of the session. Doc ids are assigned in file order starting at the returned index, the same way the loader assigns them (see load_documents' first_doc).
+        """
+        first_doc=self.next_doc
+        for offset, (path, digest) in enumerate(zip(file_paths, hashes)):
+            self.documents[f"doc_{first_doc+offset}"]={"name": upload_name(path), "path": path, "hash": digest}
+        self.next_doc+=len(file_paths)
+        return first_doc
+
+    def to_state(self) -> Dict:
+        """
+        Everything needed to restore the session in another worker, plus its expiry for the sweep.
+        """
+        return {**asdict(self), "expires_at": self.expires_at}
+
+    def to_dict(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "status": self.status,
+            "files": [doc["name"] for doc in self.documents.values()],
+            "documents": [{"doc_id": doc_id, "name": doc["name"], "hash": doc["hash"]} for doc_id, doc in self.documents.items()],
+            "chunks": self.chunks,
+            "error": self.error,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at
+        }
+
+def _state_path(session_id: str) -> str:
+    return os.path.join(Config.UPLOAD_PATH, session_id, STATE_FILE)
+
+def read_state(session_id: str) -> Optional[Session]:
+    """
+    Read a session from its state file, or None if the session has no state file (never registered, or deleted).
+    """
+    try:
+        with open(_state_path(session_id)) as f:
+            data=json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    data.pop("expires_at", None)
+    return Session(**data)
+
+def write_state(session: Session):
+    """
+    Atomically replace the session's state file. Raises FileNotFoundError if the session's upload directory was removed.
+    """
+    path=_state_path(session.session_id)
+    tmp_path=f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(session.to_state(), f)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def state_lock(session_id: str):
+    """
+    Hold an exclusive lock on the session's state file, across the worker processes. Raises FileNotFoundError if the session's upload directory was removed.
+    """
+    with open(os.path.join(Config.UPLOAD_PATH, session_id, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class SessionRegistry:
+    """
+    Registry of research sessions. A session owns its uploaded files and vector index, accepts any number of queries once its ingestion finished, and expires Config.SESSION_TTL seconds after it was last used.
+    The state of every session is kept in a state file in its upload directory (see Session.to_state), so sessions are shared by all uvicorn workers: any worker can report a session's status, query it and refresh its expiry, and the sweep of every worker sees the same expiry.
+    The worker running an ingestion owns the session's state until the job ends; other workers reload the state file on every lookup.
+    Ingestion runs on a dedicated worker pool (Config.SESSION_INGEST_WORKERS), so long ingestions neither block requests nor starve the blocking executor of the query path.
+    Expired sessions are removed by sweep(), which the application runs periodically.
+    """
+
+    def __init__(self, ingest_workers: int):
+        self._sessions: Dict[str, Session]={}
+        self._lock=threading.Lock()
+        self._workers=ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="ingest")
+        self._jobs=set() # session ids with a queued or running background ingestion (or a pending publication) in this process
+
+    def _save(self, session: Session) -> bool:
+        """
+        Write the session's state file, keeping the latest last_used written by any worker. Returns False if the session was deleted meanwhile (its upload directory is gone).
+        """
+        try:
+            with state_lock(session.session_id):
+                stored=read_state(session.session_id)
+                if stored is not None:
+                    session.last_used=max(session.last_used, stored.last_used)
+                write_state(session)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _refresh(self, session_id: str, session: Optional[Session]) -> Optional[Session]:
+        """
+        Update the session from its state file (another worker may have changed its status, documents or expiry). Returns None if the session was deleted. Called with the lock held.
+        """
+        stored=read_state(session_id)
+        if stored is None:
+            self._sessions.pop(session_id, None)
+            return None
+        if session is None:
+            self._sessions[session_id]=session=stored
+            return session
+        if stored.documents!=session.documents:
+            session_index_store.discard(session_id) # updated by another worker, reload the index from disk
+        session.__dict__.update(stored.__dict__)
+        return session
+
+    def register(self, session: Session) -> Session:
+        """
+        Add a new session and write its state file. The session's upload directory must exist.
+        """
+        with self._lock:
+            self._sessions[session.session_id]=session
+            self._save(session)
+        metrics.increment("sessions_created_total")
+        return session
+
+    def get(self, session_id: str, touch: bool=True) -> Optional[Session]:
+        """
+        Return the session (refreshing its expiry when touch is set), or None if it does not exist or has expired.
+        """
+        with self._lock:
+            session=self._sessions.get(session_id)
+            local=session_id in self._jobs # the state of a session ingesting in this process is only written by this process
+            if not touch:
+                session=session if local else self._refresh(session_id, session)
+                return session if session is not None and session.expires_at>=time.time() else None
+            try:
+                with state_lock(session_id): # no other worker may write the state file between reading and touching it
+                    if not local:
+                        session=self._refresh(session_id, session)
+                    if session is None or session.expires_at<time.time():
+                        return None
+                    session.last_used=time.time()
+                    write_state(session)
+            except FileNotFoundError:
+                self._sessions.pop(session_id, None) # deleted by another worker
+                return None
+            return session
+
+    def submit(self, session: Session, job) -> bool:
+        """
+        Run job(session) (an ingestion or an update of the session's documents) on the ingestion worker pool, tracking the session's status.
+        The session is "ingesting" while the job runs, so queries never see a half-updated index. Returns False if another job of the session is still queued or running, in this or another worker.
+        """
+        with self._lock:
+            if session.session_id in self._jobs:
+                return False
+            try:
+                with state_lock(session.session_id):
+                    stored=read_state(session.session_id)
+                    if stored is not None and stored.status==INGESTING:
+                        return False
+                    session.status=INGESTING
+                    write_state(session)
+            except FileNotFoundError:
+                return False
+            self._jobs.add(session.session_id)
+            self._sessions.setdefault(session.session_id, session)
+        self._workers.submit(self._run, session, job)
+        return True
+
+    def _run(self, session: Session, job):
+        started=time.perf_counter()
+        try:
+            with span("session_ingest", session_id=session.session_id) as current: # background jobs are traced on their own
+                job(session)
+                current.set(documents=len(session.documents), chunks=session.chunks)
+            session.status, session.error=READY, None
+        except Exception as e:
+            print(f"Ingestion failed for session {session.session_id}: {e}")
+            session.error=str(e)
+            session.status=READY if session.chunks else FAILED # a failed update leaves the previously indexed documents queryable
+        metrics.observe("session_ingest_seconds", time.perf_counter()-started, status=session.status)
+        session.last_used=time.time() # the TTL starts once the session can be used
+        self._publish(session)
+
+    def ready(self, session: Session, chunks: int):
+        """
+        Mark a session that was ingested within a request (ai_research with keep_session) as ready. Other workers see it ready once its index is written to disk (see _publish).
+        """
+        with self._lock:
+            session.chunks, session.status=chunks, READY
+            session.last_used=time.time()
+            self._jobs.add(session.session_id) # the in-memory state is ahead of the state file until it is published
+        blocking_executor.submit(self._publish, session)
+
+    def _publish(self, session: Session):
+        """
+        Write the state of a finished ingestion once the session's index is on disk, so other workers never try to load an index that is still being written (Config.SESSION_PERSIST="async").
+        """
+        session_index_store.wait_for_persist(session.session_id)
+        with self._lock:
+            deleted=session.session_id not in self._sessions or not self._save(session)
+            self._jobs.discard(session.session_id)
+        if deleted:
+            cleanup_session(session.session_id) # deleted while ingesting, drop what ingestion produced
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Remove a session and its files and index, in any worker. A session that is still ingesting in this process is cleaned up once its ingestion finishes.
+        """
+        with self._lock:
+            session=self._sessions.pop(session_id, None)
+            running=session_id in self._jobs
+        if session is None and read_state(session_id) is None:
+            return False
+        if not running:
+            cleanup_session(session_id)
+        elif os.path.exists(_state_path(session_id)):
+            os.remove(_state_path(session_id)) # other workers see the deletion right away
+        return True
+
+    def sweep(self) -> int:
+        """
+        Remove expired sessions, judged by their state files, so a session used through another worker is not removed here.
+        Upload directories without a state file (requests without a session, or left behind by an earlier process) and stale index directories are removed once they were not modified within the TTL. Returns the number of removed upload directories.
+        """
+        now=time.time()
+        removed=0
+        for entry in os.scandir(Config.UPLOAD_PATH):
+            if not entry.is_dir():
+                continue
+            session_id=entry.name
+            with self._lock:
+                if session_id in self._jobs:
+                    continue # background ingestions are never interrupted
+            try:
+                if read_state(session_id) is None:
+                    if entry.stat().st_mtime+Config.SESSION_TTL<now:
+                        cleanup_session(session_id)
+                        removed+=1
+                    continue
+                with state_lock(session_id): # a worker touching the session waits until it is either kept or removed
+                    stored=read_state(session_id)
+                    if stored is None:
+                        continue
+                    if stored.status in (PENDING, INGESTING):
+                        expired=os.stat(_state_path(session_id)).st_mtime+Config.SESSION_TTL<now # ingesting in another worker, removed only if that worker stopped
+                    else:
+                        expired=stored.expires_at<now
+                    if not expired:
+                        continue
+                    cleanup_session(session_id)
+                removed+=1
+                metrics.increment("sessions_expired_total")
+                with self._lock: # taken after the state lock is released, get() takes them in the opposite order
+                    self._sessions.pop(session_id, None)
+            except FileNotFoundError:
+                continue # removed meanwhile, e.g. by another worker's sweep
+        with self._lock:
+            for session_id in [s for s in self._sessions if s not in self._jobs and not os.path.exists(_state_path(s))]:
+                self._sessions.pop(session_id) # deleted or swept by another worker
+        for entry in os.scandir(Config.VECTOR_DB_PATH):
+            if "_vector_db" not in entry.name:
+                continue
+            session_id=entry.name.split("_vector_db")[0] # also matches temporary directories left behind by an interrupted write
+            if os.path.isdir(os.path.join(Config.UPLOAD_PATH, session_id)):
+                continue # belongs to a session or request that still has uploads, removed together with them
+            try:
+                if entry.is_dir() and entry.stat().st_mtime+Config.SESSION_TTL<now:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+        return removed
+
+session_registry=SessionRegistry(ingest_workers=Config.SESSION_INGEST_WORKERS) # process-wide session registry
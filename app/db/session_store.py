@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Optional
+from app.config.config import Config
+from app.utils.metrics import metrics
+
+class SessionIndexStore:
+    """
+    In-process LRU store of session vector indexes, keyed by session_id.
+    Ingestion publishes the freshly built index here and retrieval reads it back directly, skipping the save_local / load_local round trip through disk.
+    Entries are evicted least-recently-used first once the total estimated size of the stored indexes exceeds max_bytes. The most recently published entry is always kept, even if it alone is larger than max_bytes.
+    Sessions pinned by a running request (see pin) are never evicted, since an index that was not persisted could not be reloaded; the store may exceed max_bytes until they are unpinned.
+    Optionally, indexes are also persisted to disk by a background writer (write-behind), so that evicted sessions can still be reloaded from disk.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes=max_bytes # upper bound for the summed size of all stored indexes
+        self._entries: "OrderedDict[str, object]"=OrderedDict() # session_id -> VectorDB, ordered from least to most recently used
+        self._sizes: Dict[str, int]={} # session_id -> estimated size in bytes
+        self._lock=threading.Lock() # guards the entries and sizes
+        self._writer=ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-writer") # single background writer for write-behind persistence
+        self._pending: Dict[str, Future]={} # session_id -> last scheduled disk write
+        self._pins: Dict[str, int]={} # session_id -> number of running requests using the session's index
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def put(self, session_id: str, vector_db, size: int):
+        """
+        Publish the index of a session, evicting least recently used sessions if the store grows over its byte budget.
+        """
+        with self._lock:
+            if session_id in self._entries:
+                self._entries.move_to_end(session_id) # refresh position for an already known session
+            self._entries[session_id]=vector_db
+            self._sizes[session_id]=size
+            self._evict(keep=session_id)
+            metrics.increment("session_index_published_total")
+
+    def _evict(self, keep: Optional[str]=None):
+        """
+        Drop least recently used sessions until the store fits into max_bytes, skipping pinned sessions and keep. Called with the lock held.
+        """
+        for session_id in list(self._entries): # least recently used first
+            if self.total_bytes<=self.max_bytes:
+                break
+            if session_id==keep or self._pins.get(session_id):
+                continue
+            del self._entries[session_id]
+            self._sizes.pop(session_id, None)
+            metrics.increment("session_index_evictions_total")
+        metrics.set("session_index_store_bytes", self.total_bytes)
+        metrics.set("session_index_store_sessions", len(self._entries))
+
+    @contextmanager
+    def pin(self, session_id: str):
+        """
+        Keep the session's index in the store while the with block runs (reference counted, so concurrent requests of a session can pin it). A session may be pinned before its index is published.
+        """
+        with self._lock:
+            self._pins[session_id]=self._pins.get(session_id, 0)+1
+        try:
+            yield
+        finally:
+            with self._lock:
+                count=self._pins.pop(session_id)-1
+                if count:
+                    self._pins[session_id]=count
+                else:
+                    self._evict() # evictions skipped while the session was pinned
+
+    def put_if_absent(self, session_id: str, vector_db, size: int) -> bool:
+        """
+        Store an index loaded from disk, unless the session was published meanwhile (a newer version must not be replaced by the one read from disk). Returns whether it was stored.
+        """
+        with self._lock:
+            if session_id in self._entries:
+                return False
+            self._entries[session_id]=vector_db
+            self._sizes[session_id]=size
+            self._evict(keep=session_id)
+            metrics.increment("session_index_loaded_total")
+            return True
+
+    def get(self, session_id: str):
+        """
+        Return the stored index for a session (marking it as recently used), or None if it is not held in memory.
+        """
+        with self._lock:
+            vector_db=self._entries.get(session_id)
+            if vector_db is None:
+                metrics.increment("session_index_misses_total")
+                return None
+            self._entries.move_to_end(session_id)
+            metrics.increment("session_index_hits_total")
+            return vector_db
+
+    def discard(self, session_id: str):
+        """
+        Remove a session from the store, if present.
+        """
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+
+    def persist_async(self, session_id: str, vector_db) -> Future:
+        """
+        Schedule a background write of the session index to disk (write-behind).
+        """
+        future=self._writer.submit(vector_db.save_db)
+        with self._lock:
+            self._pending[session_id]=future
+        future.add_done_callback(lambda f: self._forget(session_id, f))
+        return future
+
+    def _forget(self, session_id: str, future: Future):
+        with self._lock:
+            if self._pending.get(session_id) is future:
+                self._pending.pop(session_id, None) # only forget the write if no newer write was scheduled meanwhile
+        if future.exception() is not None:
+            print(f"Index persistence failed for session {session_id}: {future.exception()}")
+
+    def wait_for_persist(self, session_id: str):
+        """
+        Block until any pending disk write for the session has finished, so the on-disk index can be safely removed or read.
+        """
+        with self._lock:
+            future=self._pending.get(session_id)
+        if future is not None:
+            future.exception() # waits for completion without re-raising; failures are already reported by _forget
+
+session_index_store=SessionIndexStore(max_bytes=Config.SESSION_INDEX_MAX_MB*1024*1024) # process-wide session index store
@@ -0,0 +1,100 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+_TOKEN=re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Identifiers, names and numbers are kept as they are, which is what dense retrieval tends to miss.
+    """
+    return _TOKEN.findall(text.lower())
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring, built per session next to the FAISS index.
+    Building is linear in the corpus size (one pass over the chunk tokens), and a query only touches the postings of its own terms.
+    Removed chunks are dropped from the postings, so scoring never sees them.
+    """
+
+    def __init__(self, k1: float=1.5, b: float=0.75):
+        self.k1=k1 # term frequency saturation
+        self.b=b # document length normalization
+        self._postings: Dict[str, Dict[str, int]]=defaultdict(dict) # term -> {chunk id: term frequency}
+        self._lengths: Dict[str, int]={} # chunk id -> number of tokens
+        self._total_length=0 # sum of all chunk lengths, for the average length
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """
+        Index the given chunks under their docstore ids.
+        """
+        for chunk_id, text in zip(ids, texts):
+            tokens=tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self._postings[term][chunk_id]=tf
+            self._lengths[chunk_id]=len(tokens)
+            self._total_length+=len(tokens)
+
+    def copy(self) -> "BM25Index":
+        """
+        Independent copy of the index, to be modified while the original keeps serving queries.
+        """
+        clone=BM25Index(k1=self.k1, b=self.b)
+        clone._postings=defaultdict(dict, {term: dict(postings) for term, postings in self._postings.items()})
+        clone._lengths=dict(self._lengths)
+        clone._total_length=self._total_length
+        return clone
+
+    def remove(self, ids: Iterable[str]):
+        """
+        Remove the given chunks from the index.
+        """
+        ids=set(ids)
+        for chunk_id in ids:
+            self._total_length-=self._lengths.pop(chunk_id, 0)
+        for term in list(self._postings):
+            postings=self._postings[term]
+            for chunk_id in ids.intersection(postings):
+                del postings[chunk_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Return the ids and BM25 scores of the k best matching chunks, best first.
+        """
+        n=len(self._lengths)
+        if n==0:
+            return []
+        avg_length=self._total_length/n or 1.0
+        scores: Dict[str, float]=defaultdict(float)
+        for term in set(tokenize(query)):
+            postings=self._postings.get(term)
+            if not postings:
+                continue
+            idf=math.log(1+(n-len(postings)+0.5)/(len(postings)+0.5))
+            for chunk_id, tf in postings.items():
+                norm=self.k1*(1-self.b+self.b*self._lengths[chunk_id]/avg_length)
+                scores[chunk_id]+=idf*tf*(self.k1+1)/(tf+norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def nbytes(self) -> int:
+        """
+        Rough estimate of the memory held by the index.
+        """
+        return sum(len(term)+100*len(postings) for term, postings in self._postings.items())+100*len(self._lengths)
+
+def reciprocal_rank_fusion(rankings: List[List[str]], weights: List[float], k: int) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked id lists with weighted reciprocal rank fusion: score(id) = sum(weight / (k + rank)). Returns (id, score) pairs, best first.
+    """
+    scores: Dict[str, float]=defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id]+=weight/(k+rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,42 +1,383 @@
+import json
 import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
 from app.config.config import Config
+from app.llms.embeddings import embedding_model_id, get_embedding_model
+from app.db.session_store import session_index_store
+from app.db.embedding_cache import get_embedding_cache, text_hash
+from app.db.sparse_index import BM25Index, reciprocal_rank_fusion
+from app.db.ann_index import build_index, bytes_per_vector, configure_search, index_description, is_flat
+from app.db.chunk_store import ChunkStore, LazyDocstore, LazyIdMap, docstore_items, read_manifest, write_chunks
+from app.graph.context import count_tokens
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+
+INDEX_FILE="index.faiss" # faiss.write_index format (IVF inverted lists are memory-mapped on load)
+CHUNKS_FILE="chunks.sqlite3" # chunk texts and metadata by index position and id
+MANIFEST_FILE="manifest.json" # format version, embedding model and sizes
+FORMAT_VERSION=1
 
 class VectorDB:
     """
     This class manages a vector database for storing and retrieving semantic embeddings.
-     It uses FAISS for efficient similarity search and HuggingFaceEmbeddings for generating vectors.
-     The database is stored locally on disk and can be loaded or created as needed.
-     Each session has its own vector database file, identified by the session_id.
+     It uses FAISS for efficient similarity search and the shared embedding model (see app.llms.embeddings; in-process, or the shared embedding service when Config.EMBED_SERVICE_URL is set) for generating vectors.
+     Built indexes are published to the in-process session index store, so retrieval can use them without a disk round trip. Persisting to disk is optional (Config.VECTOR_DB_PERSIST) and can happen in the background.
+     For hybrid retrieval (Config.RETRIEVAL_MODE="hybrid") a BM25 sparse index over the same chunks is kept next to the FAISS index, and dense and sparse results are fused with reciprocal rank fusion.
+     On disk, a session is a directory with the raw faiss index, a SQLite chunk store read on demand and a JSON manifest; no pickle is involved.
+     Sessions start with an exact flat index; once ingestion finished, large sessions switch to an approximate index (IVF or HNSW, optionally with float16 / 8 bit / product-quantized storage, see app.db.ann_index).
+     Each session has its own vector database, identified by the session_id.
     """
 
-    def __init__(self, embed_model_name="sentence-transformers/all-MiniLM-L6-v2", db_path=Config.VECTOR_DB_PATH, session_id=None):
+    def __init__(self, embed_model_name=Config.EMBED_MODEL, db_path=Config.VECTOR_DB_PATH, session_id=None):
         """
         Initialize the VectorDB with the specified embedding model, database path, and session ID.
         """
-        self.embed_model=HuggingFaceEmbeddings(model_name=embed_model_name) # Initialize the embedding model
+        self.embed_model_name=embedding_model_id(embed_model_name) # Identity of the vectors (model name, plus the backend if its vectors differ), the embedding cache key and recorded in the manifest
+        self.embed_model=get_embedding_model(embed_model_name) # Get the process-wide shared embedding model instead of loading a new copy per instance
         self.db_path=os.path.join(db_path, f"{session_id}_vector_db") # Set the path for the vector database file based on the session ID
         self.session_id=session_id # Store the session ID for reference
         self.vector_db=None # Initialize the vector database attribute, which will hold the FAISS index instance
+        self.sparse_index: Optional[BM25Index]=None # BM25 index over the same chunks, keyed by docstore id (hybrid retrieval only)
+        self.doc_chunks: Dict[str, List[str]]={} # doc_id -> docstore ids of its chunks in index order, kept up to date on every change
+        self.doc_tokens: Dict[str, int]={} # doc_id -> tokens of its chunks, counted at ingestion (summaries choose map-reduce by the session total)
+        self._positions: Optional[Dict[str, int]]=None # docstore id -> index position of an in-memory index, built when it is published (or on first use)
 
-    def load_db(self):
+    def load_db(self, writable: bool=False):
         """
-        Load the vector database from disk if it exists, otherwise create a new one.
+        Load the vector database for the session, preferring the in-memory session index store and falling back to disk.
+        From disk, chunks are read on demand from the chunk store and the index is read into memory (faiss only memory-maps the inverted lists of IVF indexes; flat and HNSW indexes are read completely).
+        The opened index is put back into the session index store, so following queries of the session do not read it (or rebuild its sparse index) again.
+        Pass writable=True to load the index and chunks into memory instead, for adding or removing documents.
+        Writable loads are copy-on-write: a published index is shared by running queries and a pending background write, so it is copied, and the modified copy replaces it in the store when it is published.
         """
-        if self.db_path and os.path.exists(self.db_path): # Check if the database file exists at the specified path
-            self.vector_db=FAISS.load_local(self.db_path, self.embed_model, allow_dangerous_deserialization=True) # Load the existing vector database using FAISS and the embedding model
+        cached=session_index_store.get(self.session_id) # Check whether ingestion already published the index for this session in this process
+        if cached is not None and writable and not isinstance(cached.vector_db.docstore, LazyDocstore):
+            self._copy(cached)
+            return
+        if cached is not None and not writable:
+            self.vector_db=cached.vector_db
+            self.sparse_index=cached.sparse_index
+            self.doc_chunks=cached.doc_chunks
+            self.doc_tokens=cached.doc_tokens
+            self._positions=cached._positions
+            return
+        session_index_store.wait_for_persist(self.session_id) # Make sure a pending background write is complete before reading from disk
+        if self.db_path and os.path.exists(os.path.join(self.db_path, MANIFEST_FILE)): # Check if the database exists at the specified path
+            self.vector_db=self._read(writable) # Load the existing vector database
         else:
             self.vector_db=None # If the database file does not exist, set the vector_db attribute to None, indicating that a new database will need to be created when documents are added
+        if self.vector_db is not None and Config.RETRIEVAL_MODE=="hybrid":
+            self._build_sparse_index() # the sparse index is not persisted, rebuilding it from the docstore is linear in the chunk count
+        if self.vector_db is not None and not writable:
+            session_index_store.put_if_absent(self.session_id, self, self.nbytes())
+
+    def _copy(self, published: "VectorDB"):
+        """
+        Take a private copy of a published vector database (index, docstore, id mapping, sparse index and document bookkeeping) to modify.
+        """
+        source=published.vector_db
+        try:
+            index=faiss.clone_index(source.index)
+        except RuntimeError:
+            index=faiss.deserialize_index(faiss.serialize_index(source.index)) # index types the cloner does not support
+        docstore=InMemoryDocstore(dict(source.docstore._dict)) # the stored Documents themselves are never modified, copying the mapping is enough
+        self.vector_db=FAISS(self.embed_model, index, docstore, dict(source.index_to_docstore_id))
+        self.sparse_index=published.sparse_index.copy() if published.sparse_index is not None else None
+        self.doc_chunks={doc_id: list(chunk_ids) for doc_id, chunk_ids in published.doc_chunks.items()}
+        self.doc_tokens=dict(published.doc_tokens)
+
+    def _read(self, writable: bool) -> Optional[FAISS]:
+        """
+        Open the persisted index of the session. Returns None if it was built with a different embedding model (its vectors are not comparable).
+        """
+        manifest=read_manifest(os.path.join(self.db_path, MANIFEST_FILE))
+        if manifest.get("embed_model")!=self.embed_model_name:
+            print(f"Ignoring index of session {self.session_id}: built with {manifest.get('embed_model')}, not {self.embed_model_name}")
+            return None
+        index_path=os.path.join(self.db_path, INDEX_FILE)
+        store=ChunkStore(os.path.join(self.db_path, CHUNKS_FILE))
+        if writable:
+            index=faiss.read_index(index_path)
+            chunks=list(store.documents())
+            store.close() # everything is in memory now
+            docstore=InMemoryDocstore(dict(chunks))
+            id_map={position: chunk_id for position, (chunk_id, _) in enumerate(chunks)}
+            self.doc_chunks={}
+            for chunk_id, doc in chunks:
+                self.doc_chunks.setdefault(doc.metadata.get("doc_id"), []).append(chunk_id)
+        else:
+            try:
+                index=faiss.read_index(index_path, faiss.IO_FLAG_MMAP|faiss.IO_FLAG_READ_ONLY) # maps the inverted lists of IVF indexes, other index types are read into memory
+            except RuntimeError:
+                index=faiss.read_index(index_path)
+            docstore, id_map=LazyDocstore(store), LazyIdMap(store)
+            self.doc_chunks=store.doc_chunks()
+        self.doc_tokens=manifest.get("doc_tokens") or self._count_tokens(docstore_items(docstore)) # counted again for indexes written before token counts were recorded
+        configure_search(index) # apply the current nprobe / efSearch settings
+        return FAISS(self.embed_model, index, docstore, id_map)
+
+    @staticmethod
+    def _count_tokens(chunks) -> Dict[str, int]:
+        """
+        Tokens per document of the given (chunk id, Document) pairs.
+        """
+        doc_tokens: Dict[str, int]={}
+        for _, doc in chunks:
+            doc_id=doc.metadata.get("doc_id")
+            doc_tokens[doc_id]=doc_tokens.get(doc_id, 0)+count_tokens(doc.page_content)
+        return doc_tokens
+
+    def token_count(self) -> int:
+        """
+        Tokens of all chunks of the session (recorded at ingestion, no chunk is read).
+        """
+        return sum(self.doc_tokens.values())
+
+    def _build_sparse_index(self):
+        self.sparse_index=BM25Index(k1=Config.BM25_K1, b=Config.BM25_B)
+        chunks=list(docstore_items(self.vector_db.docstore))
+        self.sparse_index.add((chunk_id for chunk_id, _ in chunks), (doc.page_content for _, doc in chunks))
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed the given texts, consulting the persistent embedding cache first so that only unseen chunks are passed through the model.
+        """
+        cache=get_embedding_cache()
+        if cache is None:
+            with span("embed", texts=len(texts)), metrics.timer("ingest_stage_seconds", stage="embed"):
+                return self.embed_model.embed_documents(texts) # caching disabled, embed everything
+        hashes=[text_hash(text) for text in texts]
+        cached=cache.get_many(self.embed_model_name, hashes) # vectors of chunks seen in earlier sessions
+        missing={h: text for h, text in zip(hashes, texts) if h not in cached} # unseen chunks, de-duplicated by hash
+        if missing:
+            with span("embed", texts=len(missing), cached=len(texts)-len(missing)), metrics.timer("ingest_stage_seconds", stage="embed"):
+                vectors=self.embed_model.embed_documents(list(missing.values()))
+            fresh=dict(zip(missing.keys(), vectors))
+            cache.put_many(self.embed_model_name, fresh)
+            cached.update(fresh)
+        return [cached[h] for h in hashes]
 
     def add_documents(self, docs):
         """
-        Add documents to the vector database, generating embeddings and saving the updated database to disk.
+        Add documents to the vector database, generating embeddings (through the embedding cache). Call publish() afterwards to make the index available to retrieval.
         """
         if not docs:
             return None # If no documents are provided, return None to indicate that no action was taken
+        texts=[doc.page_content for doc in docs]
+        metadatas=[doc.metadata for doc in docs]
+        ids=[str(uuid.uuid4()) for _ in docs] # docstore ids, shared by the dense and the sparse index
+        text_embeddings=list(zip(texts, self.embed_texts(texts))) # pair each chunk text with its (possibly cached) vector
+        if self.vector_db is None:
+            self.vector_db=FAISS.from_embeddings(text_embeddings, self.embed_model, metadatas=metadatas, ids=ids) # If the vector database has not been initialized (i.e., it was not loaded from disk), create a new FAISS index from the precomputed embeddings
+        else:
+            self.vector_db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids) # If the vector database already exists, add the new embeddings to the existing FAISS index
+        for chunk_id, doc in zip(ids, docs):
+            self.doc_chunks.setdefault(doc.metadata.get("doc_id"), []).append(chunk_id)
+        for doc_id, tokens in self._count_tokens(zip(ids, docs)).items():
+            self.doc_tokens[doc_id]=self.doc_tokens.get(doc_id, 0)+tokens
+        self._positions=None
+        if Config.RETRIEVAL_MODE=="hybrid":
+            if self.sparse_index is None:
+                self.sparse_index=BM25Index(k1=Config.BM25_K1, b=Config.BM25_B)
+            self.sparse_index.add(ids, texts) # keep the sparse index in step with the dense one
+
+    def dense_search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Search the FAISS index for the query. Returns (docstore id, distance) pairs, nearest first.
+        """
+        with span("embed_query"):
+            vector=np.asarray([self.embed_model.embed_query(query)], dtype=np.float32)
+        with span("faiss_search", k=k, chunks=self.vector_db.index.ntotal):
+            distances, indices=self.vector_db.index.search(vector, k)
+        return [(self.vector_db.index_to_docstore_id[i], float(d)) for i, d in zip(indices[0], distances[0]) if i!=-1]
+
+    def _hit(self, chunk_id: str, score: float) -> Document:
+        """
+        Copy of a stored chunk carrying its retrieval score and id (stored documents are shared between requests and must not be modified).
+        """
+        doc=self.vector_db.docstore.search(chunk_id)
+        return Document(page_content=doc.page_content, metadata={**doc.metadata, "chunk_id": chunk_id, "score": score})
+
+    def search(self, query: str, k: int) -> List[Document]:
+        """
+        Retrieve the k best chunks for the query, best first.
+        In dense mode the score is the FAISS distance (lower is better); in hybrid mode dense and BM25 results are fused with weighted reciprocal rank fusion and the score is the fused score (higher is better).
+        """
+        if Config.RETRIEVAL_MODE=="hybrid" and self.sparse_index is not None:
+            fetch_k=max(k, Config.HYBRID_FETCH_K) # both lists are deeper than k, so fusion can promote results ranked lower by one of them
+            dense=[chunk_id for chunk_id, _ in self.dense_search(query, fetch_k)]
+            sparse=[chunk_id for chunk_id, _ in self.sparse_index.search(query, fetch_k)]
+            fused=reciprocal_rank_fusion([dense, sparse], [Config.HYBRID_DENSE_WEIGHT, Config.HYBRID_SPARSE_WEIGHT], Config.HYBRID_RRF_K)
+            return [self._hit(chunk_id, score) for chunk_id, score in fused[:k]]
+        return [self._hit(chunk_id, distance) for chunk_id, distance in self.dense_search(query, k)]
+
+    def doc_ids(self) -> List[str]:
+        """
+        Return the ids of the documents (doc_id metadata) indexed in this session, in ingestion order.
+        """
+        return list(self.doc_chunks)
+
+    def chunk_ids(self, doc_id: Optional[str]=None) -> List[str]:
+        """
+        Return the docstore ids of the chunks of one document (or of all chunks), in index order.
+        """
+        if doc_id is None:
+            return list(self.vector_db.index_to_docstore_id.values())
+        return list(self.doc_chunks.get(doc_id, []))
+
+    def all_documents(self) -> List[Document]:
+        """
+        Return copies of all chunks of the session in index order, which is the reading order of ingestion (document, page, position).
+        """
+        return [self._hit(chunk_id, 0.0) for chunk_id in self.chunk_ids()]
+
+    def vectors(self, chunk_ids: List[str]) -> np.ndarray:
+        """
+        Return the stored vectors of the given chunks, reconstructed from the FAISS index (re-embedded through the embedding cache if the index cannot reconstruct vectors).
+        """
+        positions=self._position_map(chunk_ids)
+        try:
+            return np.vstack([self.vector_db.index.reconstruct(positions[chunk_id]) for chunk_id in chunk_ids])
+        except RuntimeError:
+            texts=[self.vector_db.docstore.search(chunk_id).page_content for chunk_id in chunk_ids]
+            return np.asarray(self.embed_texts(texts), dtype=np.float32)
+
+    def _position_map(self, chunk_ids: List[str]) -> Dict[str, int]:
+        """
+        Index positions of the given chunks: looked up in the chunk store for a persisted index, or in a reverse map of the in-memory index (built once, and rebuilt after the index changed).
+        """
+        id_map=self.vector_db.index_to_docstore_id
+        if isinstance(id_map, LazyIdMap):
+            return id_map.positions(chunk_ids)
+        if self._positions is None:
+            self._positions={chunk_id: position for position, chunk_id in id_map.items()}
+        return self._positions
+
+    def search_document(self, query: str, doc_id: str, k: int) -> List[Document]:
+        """
+        Dense search restricted to the chunks of one document, best first. Used when a document has to be represented in the result (e.g. comparisons) but none of its chunks made the global top results.
+        """
+        chunk_ids=self.chunk_ids(doc_id)
+        if not chunk_ids:
+            return []
+        query_vector=np.asarray(self.embed_model.embed_query(query), dtype=np.float32)
+        distances=((self.vectors(chunk_ids)-query_vector)**2).sum(axis=1) # squared L2, the same distance the FAISS index reports
+        return [self._hit(chunk_ids[i], float(distances[i])) for i in np.argsort(distances)[:k]]
+
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """
+        Remove all chunks of the given documents (vectors, docstore entries and sparse index postings). Returns the number of removed chunks.
+        Only the exact flat index removes vectors in place: the langchain store renumbers the remaining positions after a removal, which matches how the flat index compacts its vectors, but IVF keeps the old labels and HNSW cannot remove at all.
+        Any other index is rebuilt from the remaining chunks (their stored vectors are reused, nothing is re-embedded), and publish() builds the approximate index again if the session is still large enough.
+        """
         if self.vector_db is None:
-            self.vector_db=FAISS.from_documents(docs, self.embed_model) # If the vector database has not been initialized (i.e., it was not loaded from disk), create a new FAISS index from the provided documents and the embedding model
+            return 0
+        removed=[chunk_id for doc_id in dict.fromkeys(doc_ids) for chunk_id in self.doc_chunks.get(doc_id, [])]
+        if not removed:
+            return 0
+        if is_flat(self.vector_db.index):
+            self.vector_db.delete(removed)
         else:
-            self.vector_db.add_documents(docs) # If the vector database already exists, add the new documents to the existing FAISS index, which will generate embeddings for the new documents and update the index accordingly
-        self.vector_db.save_local(self.db_path) # Save the updated vector database to disk at the specified path, ensuring that the new documents and their embeddings are persisted for future retrieval
+            self._rebuild_without(set(removed))
+        for doc_id in doc_ids:
+            self.doc_chunks.pop(doc_id, None)
+            self.doc_tokens.pop(doc_id, None)
+        self._positions=None
+        if self.sparse_index is not None:
+            self.sparse_index.remove(removed)
+        return len(removed)
+
+    def _rebuild_without(self, removed: set):
+        """
+        Rebuild the FAISS index without the removed chunks, from the stored vectors of the remaining ones.
+        """
+        keep=[chunk_id for chunk_id in self.chunk_ids() if chunk_id not in removed]
+        if not keep:
+            self.vector_db=None
+            return
+        docs=[self.vector_db.docstore.search(chunk_id) for chunk_id in keep]
+        vectors=self.vectors(keep)
+        self.vector_db=FAISS.from_embeddings(list(zip([doc.page_content for doc in docs], vectors.tolist())), self.embed_model, metadatas=[doc.metadata for doc in docs], ids=keep)
+
+    def optimize_index(self):
+        """
+        Replace the exact flat index by the index type chosen for the corpus size (see app.db.ann_index.index_description), trained on the stored vectors.
+        Positions, and therefore the docstore mapping, are preserved. Indexes that are already approximate are kept as they are; vectors added later are assigned with the trained quantizers.
+        """
+        index=self.vector_db.index
+        if index.ntotal==0 or not is_flat(index):
+            return
+        description=index_description(index.ntotal, index.d)
+        if description is None:
+            return
+        vectors=np.ascontiguousarray(index.reconstruct_n(0, index.ntotal), dtype=np.float32)
+        with span("index_build", description=description, chunks=index.ntotal), metrics.timer("ingest_stage_seconds", stage="index_build"):
+            self.vector_db.index=build_index(vectors, description)
+        metrics.increment("vector_index_builds_total", description=description)
+
+    def save_db(self):
+        """
+        Save the vector database to disk at the session's database path: the raw faiss index, the chunk store and the manifest.
+        The files are written to a temporary directory that then replaces the previous version, so readers never see a partial write (open memory maps of the old version stay valid).
+        """
+        if self.vector_db is None:
+            return
+        with span("index_save", chunks=self.vector_db.index.ntotal):
+            start=time.perf_counter()
+            tmp_path=f"{self.db_path}.tmp-{uuid.uuid4().hex}"
+            os.makedirs(tmp_path)
+            index=self.vector_db.index
+            faiss.write_index(index, os.path.join(tmp_path, INDEX_FILE))
+            docstore=self.vector_db.docstore
+            write_chunks(os.path.join(tmp_path, CHUNKS_FILE), ((position, chunk_id, docstore.search(chunk_id)) for position, chunk_id in self.vector_db.index_to_docstore_id.items()))
+            manifest={"format": FORMAT_VERSION, "embed_model": self.embed_model_name, "dimension": index.d, "count": index.ntotal, "index": type(faiss.downcast_index(index)).__name__, "doc_tokens": self.doc_tokens}
+            with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            old_path=f"{self.db_path}.old-{uuid.uuid4().hex}"
+            if os.path.exists(self.db_path):
+                os.rename(self.db_path, old_path)
+            os.rename(tmp_path, self.db_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+            metrics.observe("ingest_stage_seconds", time.perf_counter()-start, stage="index_save")
+            metrics.observe("vector_index_disk_bytes", sum(entry.stat().st_size for entry in os.scandir(self.db_path)))
+
+    def nbytes(self) -> int:
+        """
+        Estimate the in-memory size of the vector database: the encoded vectors of the FAISS index plus the stored chunk texts (and the sparse index, if any).
+        """
+        if self.vector_db is None:
+            return 0
+        index=self.vector_db.index
+        vector_bytes=index.ntotal*bytes_per_vector(index)
+        docstore=self.vector_db.docstore
+        text_bytes=0 if isinstance(docstore, LazyDocstore) else sum(len(doc.page_content.encode("utf-8")) for _, doc in docstore_items(docstore)) # chunks of a persisted index stay on disk
+        sparse_bytes=self.sparse_index.nbytes() if self.sparse_index is not None else 0
+        return vector_bytes+text_bytes+sparse_bytes
+
+    def publish(self, persist: Optional[str]=None):
+        """
+        Publish the vector database to the in-process session index store and, depending on persist (default Config.VECTOR_DB_PERSIST), persist it to disk synchronously ("sync"), in the background ("async") or not at all ("none").
+        """
+        if self.vector_db is None:
+            session_index_store.discard(self.session_id) # nothing left to publish (e.g. all documents were removed)
+            return
+        persist=persist or Config.VECTOR_DB_PERSIST
+        self.optimize_index() # build time: the approximate index is trained once the corpus is complete
+        if not isinstance(self.vector_db.index_to_docstore_id, LazyIdMap):
+            self._position_map([]) # built once here, shared by the requests that read the published index
+        size=self.nbytes()
+        metrics.observe("vector_index_bytes", size)
+        metrics.observe("vector_index_chunks", self.vector_db.index.ntotal)
+        session_index_store.put(self.session_id, self, size)
+        if persist=="sync":
+            self.save_db()
+        elif persist=="async":
+            session_index_store.persist_async(self.session_id, self)
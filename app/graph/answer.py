@@ -0,0 +1,39 @@
+from typing import Optional
+from pydantic import ValidationError
+from app.graph.streaming import streams_answer
+from app.utils.concurrency import run_blocking
+
+ERROR_ANSWER="I encountered an error processing the documents." # answer of a node whose LLM call or response failed
+
+def _failed(error: Exception, label: str, fallback: Optional[dict]):
+    """
+    Report a failed LLM call or response of an answer node. A validation error of the structured output leaves the state unchanged; other errors are answered with fallback, or re-raised if the node has none.
+    """
+    if isinstance(error, ValidationError):
+        print(f"Resposne validation failed: {error}")
+        return None
+    if fallback is None:
+        raise error
+    print(f"{label} Error: {str(error)}")
+    return dict(fallback)
+
+def answer(state, prepare, parse, label: str, fallback: Optional[dict]=None):
+    """
+    Run an answer node (qna, compare, insight, summarize, extract): prepare(state, streaming) builds the LLM client and the prompt, the LLM is invoked and parse(response) turns its JSON answer into the state update.
+    """
+    llm, prompt=prepare(state)
+    try:
+        return parse(llm.invoke(prompt))
+    except Exception as e:
+        return _failed(e, label, fallback)
+
+async def aanswer(state, config, prepare, parse, label: str, fallback: Optional[dict]=None):
+    """
+    Async variant of answer, awaiting the LLM call instead of blocking a worker thread. Building the prompt tokenizes and packs the context, so it runs on the blocking executor instead of the event loop.
+    In streaming mode (see app.graph.streaming) the LLM output is streamed token by token to the graph's message stream.
+    """
+    llm, prompt=await run_blocking(prepare, state, streams_answer(config))
+    try:
+        return parse(await llm.ainvoke(prompt))
+    except Exception as e:
+        return _failed(e, label, fallback)
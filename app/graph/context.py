@@ -0,0 +1,149 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from app.config.config import Config
+from app.utils.metrics import metrics
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """
+    Return the tiktoken encoding used to measure the context, or None if it cannot be loaded (e.g. offline without a cached encoding file).
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(Config.CONTEXT_TOKEN_ENCODING)
+    except Exception as e:
+        print(f"Falling back to approximate token counts: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with tiktoken (approximated as 4 characters per token if tiktoken is unavailable).
+    """
+    encoding=_encoding()
+    if encoding is None:
+        return len(text)//4+1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text down to at most max_tokens tokens.
+    """
+    encoding=_encoding()
+    if encoding is None:
+        return text[:max_tokens*4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+def _shingles(text: str, size: int=5) -> set:
+    words=re.findall(r"\w+", text.lower())
+    if len(words)<=size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i+size]) for i in range(len(words)-size+1)}
+
+def merge_overlapping(documents: List[Document]) -> List[Document]:
+    """
+    Merge chunks of the same document and page that overlap or touch (the splitter uses an overlap, so neighbouring chunks share text).
+    Chunks are located through their start_index metadata; a merged passage keeps the best (lowest) rank of its chunks.
+    The input is expected in relevance order (best first), the rank of a chunk is its position in the list.
+    """
+    groups: Dict[tuple, List[tuple]]=defaultdict(list)
+    passages: List[tuple]=[]
+    for rank, doc in enumerate(documents):
+        start=doc.metadata.get("start_index")
+        if start is None:
+            passages.append((rank, doc)) # without offsets the chunk cannot be merged
+            continue
+        groups[(doc.metadata.get("doc_id"), doc.metadata.get("page"))].append((start, rank, doc))
+    for chunks in groups.values():
+        chunks.sort(key=lambda item: item[0])
+        start, rank, doc=chunks[0]
+        text, end, metadata=doc.page_content, start+len(doc.page_content), doc.metadata
+        for next_start, next_rank, next_doc in chunks[1:]:
+            if next_start<=end:
+                text+=next_doc.page_content[end-next_start:] # append only the part that is not already covered
+                end=max(end, next_start+len(next_doc.page_content))
+                rank=min(rank, next_rank)
+            else:
+                passages.append((rank, Document(page_content=text, metadata=metadata)))
+                text, end, rank, metadata=next_doc.page_content, next_start+len(next_doc.page_content), next_rank, next_doc.metadata
+        passages.append((rank, Document(page_content=text, metadata=metadata)))
+    passages.sort(key=lambda item: item[0])
+    return [doc for _, doc in passages]
+
+def deduplicate(passages: List[Document], threshold: float) -> List[Document]:
+    """
+    Drop passages that are near-identical (word 5-gram Jaccard similarity >= threshold) to a better ranked passage.
+    """
+    kept: List[Document]=[]
+    kept_shingles: List[set]=[]
+    for passage in passages:
+        shingles=_shingles(passage.page_content)
+        if any(len(shingles&other)/max(1, len(shingles|other))>=threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+def format_passage(doc: Document) -> str:
+    """
+    Format one passage the way the answer nodes present context to the LLM.
+    """
+    return f"Document: {doc.metadata['source']}, Page: {doc.metadata['page']}\n Content: {doc.page_content}\n"
+
+def build_context(documents: List[Document], token_budget: Optional[int]=None) -> List[Document]:
+    """
+    Turn the retrieved chunks (in relevance order) into the passages that go into an LLM prompt:
+    overlapping chunks of the same document and page are merged, near-identical passages are removed, and the best ranked passages are packed into the token budget (Config.CONTEXT_TOKEN_BUDGET, measured with tiktoken).
+    The selected passages are returned in reading order (by document, page and position).
+    """
+    token_budget=token_budget or Config.CONTEXT_TOKEN_BUDGET
+    passages=deduplicate(merge_overlapping(documents), Config.CONTEXT_DEDUP_THRESHOLD)
+    selected: List[Document]=[]
+    used=0
+    for passage in passages:
+        tokens=count_tokens(format_passage(passage))
+        if used+tokens<=token_budget:
+            selected.append(passage)
+            used+=tokens
+        elif not selected:
+            # even the best passage does not fit, keep a truncated version of it
+            passage=Document(page_content=truncate_tokens(passage.page_content, token_budget), metadata=passage.metadata)
+            selected.append(passage)
+            used+=count_tokens(format_passage(passage))
+    metrics.observe("context_tokens", used)
+    metrics.observe("context_passages", len(selected))
+    doc_order={}
+    for doc in documents:
+        doc_order.setdefault(doc.metadata.get("doc_id"), len(doc_order))
+    def reading_order(d):
+        page=d.metadata.get("page")
+        return (doc_order.get(d.metadata.get("doc_id"), 0), page if isinstance(page, int) else 0, d.metadata.get("start_index") or 0)
+    selected.sort(key=reading_order)
+    return selected
+
+def plan_token_budget(state) -> Optional[int]:
+    """
+    Context token budget chosen by the retrieval plan of the request, or None for the default budget.
+    """
+    return (state.get("retrieval_plan") or {}).get("token_budget")
+
+def format_context(documents: List[Document], token_budget: Optional[int]=None) -> str:
+    """
+    Build the context (see build_context) and render it as prompt text.
+    """
+    return "\n".join(format_passage(doc) for doc in build_context(documents, token_budget))
+
+def group_passages(passages: List[Document]) -> Dict[str, List[Dict]]:
+    """
+    Group passages by doc_id, in the shape the retrieve node uses for grouped_docs.
+    """
+    grouped=defaultdict(list)
+    for d in passages:
+        grouped[d.metadata["doc_id"]].append({
+            "content": d.page_content,
+            "doc_name": d.metadata["doc_name"],
+            "page_number": d.metadata.get("page", "N/A")
+        })
+    return grouped
@@ -1,32 +1,83 @@
+import functools
+import time
 from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableLambda
+from app.llms.groq import llm_task
+from app.utils.metrics import metrics
+from app.utils.tracing import span
 from app.graph.state import GraphState
-from app.graph.nodes.retrieve import retrieve_node
-from app.graph.nodes.tool_selector import tool_selector_node
-from app.graph.nodes.qna import qna_node
-from app.graph.nodes.compare import compare_node
-from app.graph.nodes.insight import insight_node
-from app.graph.nodes.summarize import summarize_node
-from app.graph.nodes.extract import extract_node
+from app.graph.nodes.retrieve import retrieve_node, aretrieve_node
+from app.graph.nodes.tool_selector import tool_selector_node, atool_selector_node
+from app.graph.nodes.plan import plan_node, aplan_node
+from app.graph.nodes.qna import qna_node, aqna_node
+from app.graph.nodes.compare import compare_node, acompare_node
+from app.graph.nodes.insight import insight_node, ainsight_node
+from app.graph.nodes.summarize import summarize_node, asummarize_node
+from app.graph.nodes.extract import extract_node, aextract_node
+
+def instrument(name: str, func, afunc):
+    """
+    Wrap the sync and async implementation of a node so every run is timed (graph_node_seconds, labelled with the node and whether it raised) and traced (a node.<name> span), and LLM calls made inside it are attributed to the node (llm_task).
+    The wrappers keep the signatures of the wrapped functions (functools.wraps), so the runnable still passes the config to nodes that accept one.
+    """
+    @functools.wraps(func)
+    def wrapper(state, **kwargs):
+        token=llm_task.set(name)
+        status="error"
+        start=time.perf_counter()
+        try:
+            with span(f"node.{name}", node=name):
+                result=func(state, **kwargs)
+            status="ok"
+            return result
+        finally:
+            metrics.observe("graph_node_seconds", time.perf_counter()-start, node=name, status=status)
+            llm_task.reset(token)
+
+    @functools.wraps(afunc)
+    async def awrapper(state, **kwargs):
+        token=llm_task.set(name)
+        status="error"
+        start=time.perf_counter()
+        try:
+            with span(f"node.{name}", node=name):
+                result=await afunc(state, **kwargs)
+            status="ok"
+            return result
+        finally:
+            metrics.observe("graph_node_seconds", time.perf_counter()-start, node=name, status=status)
+            llm_task.reset(token)
+
+    return wrapper, awrapper
+
+def node(name: str, func, afunc):
+    """
+    Combine the sync and async implementation of a node into one instrumented runnable: graph.invoke runs func, graph.ainvoke awaits afunc.
+    """
+    wrapper, awrapper=instrument(name, func, afunc)
+    return RunnableLambda(wrapper, afunc=awrapper, name=func.__name__)
 
 def build_graph():
     """
-    Build the LangGraph for the Content Research Agent. This graph defines the flow of operations based on the user query and the retrieved documents. It starts with the tool selector node to classify the user query into a specific task, followed by the retrieval node to fetch relevant documents from the vector database. Based on the classified task, it conditionally routes to one of the nodes: qna, compare, insight, summarize, or extract. Each of these nodes processes the retrieved documents according to their specific functionality and returns an answer or output that is then used to generate a response for the user. The graph is compiled and returned for execution.
+    Build the LangGraph for the Content Research Agent. This graph defines the flow of operations based on the user query and the retrieved documents. It starts with the tool selector node to classify the user query into a specific task and, in parallel, the retrieval node to fetch relevant documents from the vector database (retrieval of the candidate pool does not depend on the task), so that the latency is the maximum of both instead of their sum. Both branches meet in the plan node, which selects the documents for the classified task from the pool (per-document quotas for compare, MMR for summarize, a tight top k for qna). Based on the classified task, it conditionally routes to one of the nodes: qna, compare, insight, summarize, or extract. Each of these nodes processes the retrieved documents according to their specific functionality and returns an answer or output that is then used to generate a response for the user. Nodes come with sync and async implementations, so the compiled graph supports both invoke and ainvoke. The graph is compiled and returned for execution.
     """
     graph=StateGraph(GraphState) # initialize the graph with the defined state structure
 
     # Add nodes
-    graph.add_node("tool_selector", tool_selector_node)
-    graph.add_node("retrieve", retrieve_node)
-    graph.add_node("qna", qna_node)
-    graph.add_node("compare", compare_node)
-    graph.add_node("insight", insight_node)
-    graph.add_node("summarize", summarize_node)
-    graph.add_node("extract", extract_node)
+    graph.add_node("tool_selector", node("tool_selector", tool_selector_node, atool_selector_node))
+    graph.add_node("retrieve", node("retrieve", retrieve_node, aretrieve_node))
+    graph.add_node("plan", node("plan", plan_node, aplan_node))
+    graph.add_node("qna", node("qna", qna_node, aqna_node))
+    graph.add_node("compare", node("compare", compare_node, acompare_node))
+    graph.add_node("insight", node("insight", insight_node, ainsight_node))
+    graph.add_node("summarize", node("summarize", summarize_node, asummarize_node))
+    graph.add_node("extract", node("extract", extract_node, aextract_node))
 
     # Add edges
-    graph.add_edge(START, "tool_selector")
-    graph.add_edge("tool_selector", "retrieve")
-    graph.add_conditional_edges("retrieve", lambda state: state["task"], { # addidng a conditional edge from the retrieve node to route to the appropriate node based on the classified task in the state
+    graph.add_edge(START, "tool_selector") # fan out: classification and retrieval start together
+    graph.add_edge(START, "retrieve")
+    graph.add_edge(["tool_selector", "retrieve"], "plan") # fan in: the plan node runs once both branches have finished
+    graph.add_conditional_edges("plan", lambda state: state["task"], { # addidng a conditional edge from the plan node to route to the appropriate node based on the classified task in the state
         "qna": "qna",
         "compare": "compare",
         "insight": "insight",
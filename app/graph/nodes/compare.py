@@ -1,15 +1,12 @@
 from app.llms.groq import get_groq_llm
 from app.schemas import ComparisonSchema
-from pydantic import ValidationError, BaseModel
+from pydantic import BaseModel
 from typing import Dict
 import json
+from app.graph.answer import ERROR_ANSWER, aanswer, answer
+from app.graph.context import build_context, group_passages, plan_token_budget
 
-def compare_node(state):
-    """
-    Compare Node for the LangGraph. This node takes the grouped documents retrieved from the vector database and compares them based on the user query. It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference. The node then defines a comparison prompt that instructs the LLM to compare and contrast the documents in a structured tabular format, ensuring that each point of comparison is clearly identified along with its source. The LLM is invoked with this prompt, and the generated comparison is returned as the answer in the state for downstream processing or response generation.
-    """
-
-    COMPARISON_PROMPT = """
+COMPARISON_PROMPT = """
     ═══════════════════════════════════════════════════════════════════════════════
     SYSTEM ROLE
     ═══════════════════════════════════════════════════════════════════════════════
@@ -128,9 +125,14 @@ def compare_node(state):
     {query}
     """
 
-    llm=get_groq_llm(temperature=0.0, model_kwargs=ComparisonSchema) # initialize the GROQ LLM with a temperature of 0.0 for deterministic output.
+def _prepare(state, streaming=False):
+    """
+    Build the LLM client and the formatted prompt for the compare node from the state.
+    When streaming, the structured response_format is left out (Groq cannot stream structured outputs), the prompt still asks for JSON only.
+    """
+    llm=get_groq_llm(temperature=0.0, **({} if streaming else {"model_kwargs": ComparisonSchema})) # initialize the GROQ LLM with a temperature of 0.0 for deterministic output.
 
-    docs=state["grouped_docs"] # get the grouped docs from the sate
+    docs=group_passages(build_context(state["documents"], plan_token_budget(state))) # merged, de-duplicated passages packed into the context token budget, grouped by document
     context="" # initialize an empty string to build the context for the LLM prompt
     for doc_id, contents in docs.items():
         doc_name=contents[0]["doc_name"] # retrieve documant name
@@ -139,16 +141,25 @@ def compare_node(state):
         for content in contents:
             context+=f"- {content['content']}\n Page Number: {content['page_number']}\n" # add each content piece from the document to the context, along with its page number for reference
 
-    try:
-        response=llm.invoke(COMPARISON_PROMPT.format(context=context, query=state["query"])) # Invoke the LLM with the formatted prompt, passing in the constructed context and the user query to generate the comparison output based on the provided documents and the user's request
-        data = json.loads(response.content)
-        return {
-            "answer": data["answer"],
-        }
-    except ValidationError as e:
-        print(f"Resposne validation failed: {e}")
-    except Exception as e:
-        print(f"Comparison Error: {str(e)}")
-        return {
-            "answer": "I encountered an error processing the documents.",
-        }
\ No newline at end of file
+    return llm, COMPARISON_PROMPT.format(context=context, query=state["query"])
+
+def _parse(response):
+    """
+    Parse the JSON response of the LLM into the state update of the compare node.
+    """
+    data = json.loads(response.content)
+    return {
+        "answer": data["answer"],
+    }
+
+def compare_node(state):
+    """
+    Compare Node for the LangGraph. This node takes the documents retrieved from the vector database, packs them into the context budget, groups them by document and compares them based on the user query. It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference. The node then defines a comparison prompt that instructs the LLM to compare and contrast the documents in a structured tabular format, ensuring that each point of comparison is clearly identified along with its source. The LLM is invoked with this prompt, and the generated comparison is returned as the answer in the state for downstream processing or response generation.
+    """
+    return answer(state, _prepare, _parse, "Comparison", {"answer": ERROR_ANSWER})
+
+async def acompare_node(state, config=None):
+    """
+    Async variant of compare_node (see app.graph.answer.aanswer).
+    """
+    return await aanswer(state, config, _prepare, _parse, "Comparison", {"answer": ERROR_ANSWER})
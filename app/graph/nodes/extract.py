@@ -1,10 +1,10 @@
 from app.llms.groq import get_groq_llm
 from app.schemas import ExtractionSchema
 import json
-from pydantic import ValidationError
+from app.graph.answer import ERROR_ANSWER, aanswer, answer
+from app.graph.context import format_context
 
-def extract_node(state):
-    EXTRACTION_PROMPT = """
+EXTRACTION_PROMPT = """
     ═══════════════════════════════════════════════════════════════════════════════
     SYSTEM INSTRUCTION
     ═══════════════════════════════════════════════════════════════════════════════
@@ -125,25 +125,35 @@ def extract_node(state):
     {query}    
     """
 
-    llm=get_groq_llm(temperature=0.0, model_kwargs=ExtractionSchema)
-    
-    context = "\n".join(
-        f"Document: {d.metadata['source']}, Page: {d.metadata['page']}\n Content: {d.page_content}\n" 
-        for d in state["documents"]
-    )
-    
-    try:
-        response=llm.invoke(EXTRACTION_PROMPT.format(context=context, query=state["query"]))
-        data = json.loads(response.content)
-        return {
-            "answer": data["answer"],
-            "report_md": data["report"]
-        }
-    except ValidationError as e:
-        print(f"Resposne validation failed: {e}")
-    except Exception as e:
-        print(f"Extraction Error: {str(e)}")
-        return {
-            "answer": "I encountered an error processing the documents.",
-            "report_md": None
-        }
\ No newline at end of file
+def _prepare(state, streaming=False):
+    """
+    Build the LLM client and the formatted prompt for the extract node from the state.
+    When streaming, the structured response_format is left out (Groq cannot stream structured outputs), the prompt still asks for JSON only.
+    """
+    llm=get_groq_llm(temperature=0.0, **({} if streaming else {"model_kwargs": ExtractionSchema}))
+
+    context=format_context(state["documents"]) # merged, de-duplicated passages packed into the context token budget
+
+    return llm, EXTRACTION_PROMPT.format(context=context, query=state["query"])
+
+def _parse(response):
+    """
+    Parse the JSON response of the LLM into the state update of the extract node.
+    """
+    data = json.loads(response.content)
+    return {
+        "answer": data["answer"],
+        "report_md": data["report"]
+    }
+
+def extract_node(state):
+    """
+    Extraction Node for the LangGraph. This node takes the retrieved documents from the vector database and extracts the details requested in the user query, optionally generating a markdown report that is returned in the state as report_md.
+    """
+    return answer(state, _prepare, _parse, "Extraction", {"answer": ERROR_ANSWER, "report_md": None})
+
+async def aextract_node(state, config=None):
+    """
+    Async variant of extract_node (see app.graph.answer.aanswer).
+    """
+    return await aanswer(state, config, _prepare, _parse, "Extraction", {"answer": ERROR_ANSWER, "report_md": None})
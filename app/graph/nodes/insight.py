@@ -1,14 +1,10 @@
 from app.llms.groq import get_groq_llm
 from app.schemas import InsightSchema
-from pydantic import ValidationError
 import json
+from app.graph.answer import ERROR_ANSWER, aanswer, answer
+from app.graph.context import format_context
 
-def insight_node(state):
-    """
-    Insight Node for the LangGraph. This node takes the retrieved documents from the vector database and generates insights and recommendations based on the user query. It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference. 
-    The node then defines an insight generation prompt that instructs the LLM to analyze the retrieved content in relation to the user query and generate relevant, concise, and clear insights and recommendations. The LLM is invoked with this prompt, and the generated insights are returned in the state for downstream processing or response generation.
-    """
-    INSIGHT_PROMPT="""
+INSIGHT_PROMPT="""
         ═══════════════════════════════════════════════════════════════════════════════
         SYSTEM INSTRUCTION
         ═══════════════════════════════════════════════════════════════════════════════
@@ -110,23 +106,36 @@ def insight_node(state):
         **USER QUERY:**
         {query}
     """
-    llm=get_groq_llm(temperature=0.3, model_kwargs=InsightSchema)
-    
-    context = "\n".join(
-        f"Document: {d.metadata['source']}, Page: {d.metadata['page']}\n Content: {d.page_content}\n" 
-        for d in state["documents"]
-    )
-    
-    try:
-        response=llm.invoke(INSIGHT_PROMPT.format(context=context, query=state["query"]))
-        data = json.loads(response.content)
-        return {
-            "answer": data["answer"],
-        }
-    except ValidationError as e:
-        print(f"Resposne validation failed: {e}")
-    except Exception as e:
-        print(f"Insight Error: {str(e)}")
-        return {
-            "answer": "I encountered an error processing the documents.",
-        }
\ No newline at end of file
+
+def _prepare(state, streaming=False):
+    """
+    Build the LLM client and the formatted prompt for the insight node from the state.
+    When streaming, the structured response_format is left out (Groq cannot stream structured outputs), the prompt still asks for JSON only.
+    """
+    llm=get_groq_llm(temperature=0.3, **({} if streaming else {"model_kwargs": InsightSchema}))
+
+    context=format_context(state["documents"]) # merged, de-duplicated passages packed into the context token budget
+
+    return llm, INSIGHT_PROMPT.format(context=context, query=state["query"])
+
+def _parse(response):
+    """
+    Parse the JSON response of the LLM into the state update of the insight node.
+    """
+    data = json.loads(response.content)
+    return {
+        "answer": data["answer"],
+    }
+
+def insight_node(state):
+    """
+    Insight Node for the LangGraph. This node takes the retrieved documents from the vector database and generates insights and recommendations based on the user query. It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference. 
+    The node then defines an insight generation prompt that instructs the LLM to analyze the retrieved content in relation to the user query and generate relevant, concise, and clear insights and recommendations. The LLM is invoked with this prompt, and the generated insights are returned in the state for downstream processing or response generation.
+    """
+    return answer(state, _prepare, _parse, "Insight", {"answer": ERROR_ANSWER})
+
+async def ainsight_node(state, config=None):
+    """
+    Async variant of insight_node (see app.graph.answer.aanswer).
+    """
+    return await aanswer(state, config, _prepare, _parse, "Insight", {"answer": ERROR_ANSWER})
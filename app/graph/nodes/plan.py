@@ -0,0 +1,121 @@
+import numpy as np
+from typing import Dict, List, Tuple
+from langchain_core.documents import Document
+from app.db.vector_db import VectorDB
+from app.config.config import Config
+from app.graph.context import group_passages
+from app.utils.metrics import metrics
+from app.utils.concurrency import run_blocking
+
+def mmr(query_vector: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Maximal marginal relevance: pick k rows of vectors that are relevant to the query but not redundant with each other.
+    lambda_mult weighs relevance (1.0) against diversity (0.0). Returns the selected row indices in selection order.
+    """
+    vectors=vectors/np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query_vector=query_vector/max(float(np.linalg.norm(query_vector)), 1e-12)
+    relevance=vectors@query_vector
+    redundancy=np.zeros(len(vectors)) # highest similarity of each candidate to an already selected one
+    available=np.ones(len(vectors), dtype=bool)
+    selected: List[int]=[]
+    for _ in range(min(k, len(vectors))):
+        scores=np.where(available, lambda_mult*relevance-(1-lambda_mult)*redundancy, -np.inf)
+        best=int(np.argmax(scores))
+        selected.append(best)
+        available[best]=False
+        redundancy=np.maximum(redundancy, vectors@vectors[best])
+    return selected
+
+def _top_k(pool: List[Document], k: int) -> Tuple[List[Document], Dict]:
+    return pool[:k], {"strategy": "top_k", "k": k}
+
+def _per_document(vector_db: VectorDB, query: str, pool: List[Document], quota: int, max_docs: int) -> Tuple[List[Document], Dict]:
+    """
+    Take up to quota chunks per document from the pool, so one long document cannot fill the context on its own.
+    Documents without any chunk in the pool are searched on their own (dense search restricted to the document).
+    The chunks are interleaved round-robin across documents, so the context token budget is shared between them.
+    """
+    by_doc: Dict[str, List[Document]]={}
+    for doc in pool:
+        hits=by_doc.setdefault(doc.metadata["doc_id"], [])
+        if len(hits)<quota:
+            hits.append(doc)
+    fallback=[]
+    for doc_id in vector_db.doc_ids():
+        if len(by_doc)>=max_docs:
+            break
+        if doc_id not in by_doc:
+            by_doc[doc_id]=vector_db.search_document(query, doc_id, quota)
+            fallback.append(doc_id)
+    if fallback:
+        metrics.increment("retrieval_document_fallbacks_total", len(fallback))
+    per_doc=list(by_doc.values())[:max_docs]
+    docs=[hits[i] for i in range(quota) for hits in per_doc if i<len(hits)]
+    return docs, {"strategy": "per_document", "quota": quota, "max_docs": max_docs, "fallback_docs": fallback}
+
+def _diversified(vector_db: VectorDB, query: str, pool: List[Document], k: int, lambda_mult: float) -> Tuple[List[Document], Dict]:
+    """
+    Select k chunks from the pool with maximal marginal relevance, so the context covers different parts of the documents instead of near-duplicates of the best match.
+    """
+    if len(pool)<=k:
+        return pool, {"strategy": "mmr", "k": k, "lambda": lambda_mult}
+    query_vector=np.asarray(vector_db.embed_model.embed_query(query), dtype=np.float32)
+    vectors=vector_db.vectors([doc.metadata["chunk_id"] for doc in pool])
+    return [pool[i] for i in mmr(query_vector, vectors, k, lambda_mult)], {"strategy": "mmr", "k": k, "lambda": lambda_mult}
+
+def _summary(vector_db: VectorDB, query: str, pool: List[Document]) -> Tuple[List[Document], Dict]:
+    """
+    Summaries cover the whole session when it is larger than Config.SUMMARIZE_MAP_REDUCE_MIN_TOKENS (the token total recorded at ingestion): all chunks are selected, in reading order, and summarized with map-reduce by the summarize node.
+    Smaller sessions use an MMR selection from the pool that fits into a single prompt.
+    """
+    tokens=vector_db.token_count()
+    if tokens>Config.SUMMARIZE_MAP_REDUCE_MIN_TOKENS:
+        return vector_db.all_documents(), {"strategy": "map_reduce", "tokens": tokens, "group_tokens": Config.SUMMARIZE_MAP_GROUP_TOKENS}
+    docs, plan=_diversified(vector_db, query, pool, Config.SUMMARIZE_TOP_K, Config.SUMMARIZE_MMR_LAMBDA)
+    plan["token_budget"]=Config.SUMMARIZE_TOKEN_BUDGET
+    return docs, plan
+
+def plan_retrieval(state) -> Tuple[List[Document], Dict]:
+    """
+    Select the documents for the classified task from the candidate pool fetched by the retrieve node:
+    qna gets a tight top k, compare gets per-document quotas, summarize a larger, diversified (MMR) selection or, for large sessions, every chunk (map-reduce), insight and extract the default top k.
+    Returns the selected documents and the plan that describes the selection.
+    """
+    task=state["task"]
+    pool=state["documents"]
+    if task in ("compare", "summarize"):
+        vector_db=VectorDB(embed_model_name=Config.EMBED_MODEL, session_id=state["session_id"])
+        vector_db.load_db()
+    if task=="qna":
+        docs, plan=_top_k(pool, Config.QNA_TOP_K)
+    elif task=="compare":
+        docs, plan=_per_document(vector_db, state["query"], pool, Config.COMPARE_PER_DOC_K, Config.COMPARE_MAX_DOCS)
+        plan["token_budget"]=Config.COMPARE_TOKEN_BUDGET
+    elif task=="summarize":
+        docs, plan=_summary(vector_db, state["query"], pool)
+    else:
+        docs, plan=_top_k(pool, Config.RETRIEVAL_TOP_K)
+    documents: Dict[str, int]={}
+    for doc in docs:
+        documents[doc.metadata["doc_id"]]=documents.get(doc.metadata["doc_id"], 0)+1
+    plan.update({"task": task, "pool": len(pool), "selected": len(docs), "documents": documents})
+    return docs, plan
+
+def plan_node(state):
+    """
+    Plan Node for the LangGraph. Runs once the task is classified and the candidate pool is retrieved (both in parallel), and narrows the pool down with the retrieval plan of the task (see plan_retrieval).
+    The selected documents replace the pool in the state, are grouped by document ID for downstream nodes, and the plan is recorded in the state so it is visible what was retrieved and why.
+    """
+    docs, plan=plan_retrieval(state)
+    metrics.observe("retrieval_selected_chunks", len(docs), task=state["task"])
+    return {
+        "documents": docs,
+        "grouped_docs": group_passages(docs),
+        "retrieval_plan": plan
+    }
+
+async def aplan_node(state):
+    """
+    Async variant of plan_node. Per-document searches and MMR are CPU-bound, so they run on the bounded blocking executor.
+    """
+    return await run_blocking(plan_node, state)
@@ -1,14 +1,10 @@
 from app.llms.groq import get_groq_llm
 from app.schemas import QnASchema
-from pydantic import ValidationError
 import json
+from app.graph.answer import aanswer, answer
+from app.graph.context import format_context
 
-def qna_node(state):
-    """
-    QnA Node for the LangGraph. This node takes the retrieved documents from the vector database and answers the user query based on the retrieved context. 
-    It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference. The node then defines a QnA prompt that instructs the LLM to answer the user query using only the information from the retrieved context, and to provide citations for each piece of information used in the answer. The LLM is invoked with this prompt, and the generated answer is returned in the state for downstream processing or response generation.
-    """
-    QnA_PROMPT = """
+QnA_PROMPT = """
     
     # SYSTEM ROLE:
     You are a **precise Q&A assistant**.
@@ -120,24 +116,36 @@ def qna_node(state):
     **USER QUERY:**
     {query}
     """
-    llm=get_groq_llm(temperature=0.0, model_kwargs=QnASchema)
-    
-    context = "\n".join(
-        f"Document: {d.metadata['source']}, Page: {d.metadata['page']}\n Content: {d.page_content}\n" 
-        for d in state["documents"]
-    )
-    
-    try:
-        response=llm.invoke(QnA_PROMPT.format(context=context, query=state["query"]))
-        data = json.loads(response.content)
-        return {
-            "answer": data["answer"],
-        }
-    except ValidationError as e:
-        print(f"Resposne validation failed: {e}")
-    except Exception as e:
-        raise e
-        print(f"QnA Error: {str(e)}")
-        return {
-            "answer": "I encountered an error processing the documents.",
-        }
\ No newline at end of file
+
+def _prepare(state, streaming=False):
+    """
+    Build the LLM client and the formatted prompt for the qna node from the state.
+    When streaming, the structured response_format is left out (Groq cannot stream structured outputs), the prompt still asks for JSON only.
+    """
+    llm=get_groq_llm(temperature=0.0, **({} if streaming else {"model_kwargs": QnASchema}))
+
+    context=format_context(state["documents"]) # merged, de-duplicated passages packed into the context token budget
+
+    return llm, QnA_PROMPT.format(context=context, query=state["query"])
+
+def _parse(response):
+    """
+    Parse the JSON response of the LLM into the state update of the qna node.
+    """
+    data = json.loads(response.content)
+    return {
+        "answer": data["answer"],
+    }
+
+def qna_node(state):
+    """
+    QnA Node for the LangGraph. This node takes the retrieved documents from the vector database and answers the user query based on the retrieved context. 
+    It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference. The node then defines a QnA prompt that instructs the LLM to answer the user query using only the information from the retrieved context, and to provide citations for each piece of information used in the answer. The LLM is invoked with this prompt, and the generated answer is returned in the state for downstream processing or response generation.
+    """
+    return answer(state, _prepare, _parse, "QnA")
+
+async def aqna_node(state, config=None):
+    """
+    Async variant of qna_node (see app.graph.answer.aanswer).
+    """
+    return await aanswer(state, config, _prepare, _parse, "QnA")
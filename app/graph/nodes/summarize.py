@@ -1,14 +1,17 @@
 from app.llms.groq import get_groq_llm
 from app.schemas import SummarizationSchema
-from pydantic import ValidationError
+import asyncio
+import contextvars
 import json
-
-def summarize_node(state):
-    """
-    Summarization Node for the LangGraph. This node takes the retrieved documents from the vector database and generates a concise summary based on the user query. 
-    It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference.
-    """
-    SUMMARY_PROMPT="""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from app.config.config import Config
+from app.graph.answer import ERROR_ANSWER, aanswer, answer
+from app.graph.streaming import streams_answer, NO_STREAM_CONFIG
+from app.graph.context import count_tokens, format_context, format_passage, merge_overlapping, plan_token_budget, truncate_tokens
+from app.utils.concurrency import run_blocking
+
+SUMMARY_PROMPT="""
     ═══════════════════════════════════════════════════════════════════════════════
     SYSTEM INSTRUCTION
     ═══════════════════════════════════════════════════════════════════════════════
@@ -183,18 +186,224 @@ def summarize_node(state):
     **USER QUERY:**
     {query}
     """
-    llm=get_groq_llm(temperature=0.0, model_kwargs=SummarizationSchema)
+
+REDUCE_PROMPT="""
+    ═══════════════════════════════════════════════════════════════════════════════
+    SYSTEM INSTRUCTION
+    ═══════════════════════════════════════════════════════════════════════════════
+
+    You are a **summarization assistant** .
+
+    ═══════════════════════════════════════════════════════════════════════════════
+    CORE TASK
+    ═══════════════════════════════════════════════════════════════════════════════
+
+    **COMBINE** the partial summaries below into **one** list of **concise bullet points**.
+    The partial summaries were written for consecutive parts of the same documents, in reading order.
+
+    Your summary should:
+    - Capture the **MAIN IDEAS** and **KEY DETAILS** across all partial summaries
+    - **MERGE** points that say the same thing, and drop minor details if needed
+    - Keep the reading order of the documents
+
+    ═══════════════════════════════════════════════════════════════════════════════
+    OUTPUT FORMAT REQUIREMENTS
+    ═══════════════════════════════════════════════════════════════════════════════
+
+    You **MUST** return a VALID JSON OBJECT ONLY:
+
+    {{
+        "answer": "Answer: - [summary_point_1] [source: [doc_name], page: [N]] \\n - [summary_point_2] [source: [doc_name], page: [N]]"
+    }}
+
+    ───────────────────────────────────────────────────────────────────────────────
+    Citation Rules
+    ───────────────────────────────────────────────────────────────────────────────
+
+    MUST:
+
+    1. **COPY** the citations of the partial summaries **EXACTLY** ("[source: ..., page: ...]")
+
+    2. Keep **EVERY** citation of the points you merge, placed right after the merged point
+
+    3. Include **CITATION** for EVERY bullet point
+
+    DO NOT:
+
+    1. Invent, change or drop citations
+
+    2. **HALLUCINATE** or add information not in the partial summaries
+
+    3. Add extra text outside the specified format
+
+    ═══════════════════════════════════════════════════════════════════════════════
+    INPUT VARIABLES
+    ═══════════════════════════════════════════════════════════════════════════════
+
+    **PARTIAL SUMMARIES:**
+    {summaries}
+
+    **USER QUERY:**
+    {query}
+    """
+
+FALLBACK_ANSWER="Couldn't generate summary from the provided docs..."
+
+def _prepare(state, streaming=False):
+    """
+    Build the LLM client and the formatted prompt for the summarize node from the state.
+    When streaming, the structured response_format is left out (Groq cannot stream structured outputs), the prompt still asks for JSON only.
+    """
+    llm=get_groq_llm(temperature=0.0, **({} if streaming else {"model_kwargs": SummarizationSchema}))
+
     # prepare context
-    context="\n".join(f"Document: {d.metadata['source']}, Page: {d.metadata['page']}\n Page Content: {d.page_content}\n" for d in state["documents"])
-    #invoke llm
+    context=format_context(state["documents"], plan_token_budget(state)) # merged, de-duplicated passages packed into the context token budget
+
+    return llm, SUMMARY_PROMPT.format(context=context, query=state["query"])
+
+def _parse(response):
+    """
+    Parse the JSON response of the LLM into the state update of the summarize node.
+    """
+    data = json.loads(response.content)
+    return {
+        "answer": data["answer"],
+    }
+
+def _pack(texts: List[str], max_tokens: int) -> List[str]:
+    """
+    Pack consecutive texts into groups of at most max_tokens tokens (a text larger than that forms its own group), keeping their order.
+    """
+    groups: List[str]=[]
+    current: List[str]=[]
+    used=0
+    for text in texts:
+        tokens=count_tokens(text)
+        if current and used+tokens>max_tokens:
+            groups.append("\n".join(current))
+            current, used=[], 0
+        current.append(text)
+        used+=tokens
+    if current:
+        groups.append("\n".join(current))
+    return groups
+
+def _fit(partials: List[str], max_tokens: int) -> List[str]:
+    """
+    Cut every partial summary down to an equal share of max_tokens, for when reducing cannot combine them any further (no two neighbours fit into one group), so the final reduce prompt still fits.
+    """
+    share=max(1, max_tokens//len(partials))
+    return [truncate_tokens(p, share) if count_tokens(p)>share else p for p in partials]
+
+def _map_contexts(state) -> List[str]:
+    """
+    Split all chunks of the session (in reading order, overlapping chunks merged) into map contexts of Config.SUMMARIZE_MAP_GROUP_TOKENS tokens.
+    """
+    return _pack([format_passage(doc) for doc in merge_overlapping(state["documents"])], Config.SUMMARIZE_MAP_GROUP_TOKENS)
+
+def _partial(response) -> Optional[str]:
+    """
+    Bullet points of a map or intermediate reduce response, without the "Answer:" prefix, or None if the model found nothing to summarize.
+    """
+    answer=_parse(response)["answer"].strip()
+    if answer.startswith(FALLBACK_ANSWER[:20]):
+        return None
+    return answer[len("Answer:"):].strip() if answer.startswith("Answer:") else answer
+
+def _is_map_reduce(state) -> bool:
+    return (state.get("retrieval_plan") or {}).get("strategy")=="map_reduce"
+
+def _summarize_part(llm, prompt) -> Optional[str]:
+    try:
+        return _partial(llm.invoke(prompt))
+    except Exception as e:
+        print(f"Summarization Error (map/reduce step): {str(e)}")
+        return None
+
+def _map_in_context(pool: ThreadPoolExecutor, func, items) -> List:
+    """
+    pool.map that runs every call in a copy of the caller's context, so the llm_task of the node and the open tracing span reach the LLM calls on the pool threads.
+    """
+    futures=[pool.submit(contextvars.copy_context().run, func, item) for item in items]
+    return [future.result() for future in futures]
+
+async def _asummarize_part(llm, prompt) -> Optional[str]:
     try:
-        response=llm.invoke(SUMMARY_PROMPT.format(context=context, query=state["query"]))
-        data = json.loads(response.content)
-        return {
-            "answer": data["answer"],
-        }
-    except ValidationError as e:
-        print(f"Resposne validation failed: {e}")
+        return _partial(await llm.ainvoke(prompt, config=NO_STREAM_CONFIG))
     except Exception as e:
-        print(f"Summarization Error: {str(e)}")
-        return {"answer": "I encountered an error processing the documents."}   
\ No newline at end of file
+        print(f"Summarization Error (map/reduce step): {str(e)}")
+        return None
+
+def map_reduce_summarize(state):
+    """
+    Hierarchical map-reduce summary of all chunks of the session, used when they do not fit into one prompt (see the summarize retrieval plan).
+    Map: every group of chunks is summarized into cited bullet points, concurrently (the rate limiter bounds the in-flight LLM calls).
+    Reduce: partial summaries are combined group by group until they fit into one prompt, and a final reduce produces the answer. The reduce prompt copies the [source, page] citations of the partial summaries.
+    """
+    llm=get_groq_llm(temperature=0.0, model_kwargs=SummarizationSchema)
+    query=state["query"]
+    with ThreadPoolExecutor(max_workers=Config.LLM_MAX_CONCURRENCY) as pool:
+        partials=_map_in_context(pool, lambda context: _summarize_part(llm, SUMMARY_PROMPT.format(context=context, query=query)), _map_contexts(state))
+        partials=[p for p in partials if p]
+        while len(partials)>1:
+            groups=_pack(partials, Config.SUMMARIZE_MAP_GROUP_TOKENS)
+            if len(groups)==1:
+                break # fits into the final reduce
+            if len(groups)==len(partials):
+                partials=_fit(partials, Config.SUMMARIZE_MAP_GROUP_TOKENS) # cannot be combined any further
+                break
+            partials=[p for p in _map_in_context(pool, lambda group: _summarize_part(llm, REDUCE_PROMPT.format(summaries=group, query=query)), groups) if p]
+    if not partials:
+        return {"answer": FALLBACK_ANSWER}
+    response=llm.invoke(REDUCE_PROMPT.format(summaries="\n".join(partials), query=query))
+    return _parse(response)
+
+async def amap_reduce_summarize(state, streaming=False):
+    """
+    Async variant of map_reduce_summarize. Map and intermediate reduce calls are kept out of the answer stream; in streaming mode only the final reduce is streamed.
+    Building the map contexts tokenizes the whole session, so it runs on the blocking executor instead of the event loop.
+    """
+    llm=get_groq_llm(temperature=0.0, model_kwargs=SummarizationSchema)
+    query=state["query"]
+    contexts=await run_blocking(_map_contexts, state)
+    partials=await asyncio.gather(*(_asummarize_part(llm, SUMMARY_PROMPT.format(context=context, query=query)) for context in contexts))
+    partials=[p for p in partials if p]
+    while len(partials)>1:
+        groups=_pack(partials, Config.SUMMARIZE_MAP_GROUP_TOKENS)
+        if len(groups)==1:
+            break
+        if len(groups)==len(partials):
+            partials=_fit(partials, Config.SUMMARIZE_MAP_GROUP_TOKENS)
+            break
+        partials=[p for p in await asyncio.gather(*(_asummarize_part(llm, REDUCE_PROMPT.format(summaries=group, query=query)) for group in groups)) if p]
+    if not partials:
+        return {"answer": FALLBACK_ANSWER}
+    final_llm=get_groq_llm(temperature=0.0, **({} if streaming else {"model_kwargs": SummarizationSchema}))
+    response=await final_llm.ainvoke(REDUCE_PROMPT.format(summaries="\n".join(partials), query=query))
+    return _parse(response)
+
+def summarize_node(state):
+    """
+    Summarization Node for the LangGraph. This node takes the retrieved documents from the vector database and generates a concise summary based on the user query. 
+    It constructs a context for the LLM prompt by aggregating the content from the retrieved documents, including their names and page numbers for reference.
+    When the retrieval plan selected the whole session (too large for one prompt), the summary is built with map-reduce (see map_reduce_summarize).
+    """
+    if _is_map_reduce(state):
+        try:
+            return map_reduce_summarize(state)
+        except Exception as e:
+            print(f"Summarization Error: {str(e)}")
+            return {"answer": ERROR_ANSWER}
+    return answer(state, _prepare, _parse, "Summarization", {"answer": ERROR_ANSWER})
+
+async def asummarize_node(state, config=None):
+    """
+    Async variant of summarize_node (see app.graph.answer.aanswer).
+    """
+    if _is_map_reduce(state):
+        try:
+            return await amap_reduce_summarize(state, streams_answer(config))
+        except Exception as e:
+            print(f"Summarization Error: {str(e)}")
+            return {"answer": ERROR_ANSWER}
+    return await aanswer(state, config, _prepare, _parse, "Summarization", {"answer": ERROR_ANSWER})
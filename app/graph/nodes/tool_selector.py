@@ -1,11 +1,16 @@
+import re
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
 from app.llms.groq import get_groq_llm
+from app.llms.embeddings import get_embedding_model
+from app.config.config import Config
+from app.utils.metrics import metrics
+from app.utils.concurrency import run_blocking
 
-def tool_selector_node(state):
-    """
-    Tool Selector Node for the LangGraph. This node is responsible for classifying the user query into one of the predefined tasks: summarize, qna, compare, extract, or insight. 
-    It defines a prompt that instructs the LLM to analyze the user query and determine which task it corresponds to based on the definitions provided for each task. The LLM is invoked with this prompt, and the resulting classification is returned in the state for downstream processing in the graph.
-    """
-    TOOL_SELECTOR_PROMPT="""
+TASKS=["summarize", "qna", "compare", "extract", "insight"] # tasks the graph can route to
+
+TOOL_SELECTOR_PROMPT="""
 
     ═══════════════════════════════════════════════════════════════════════════════
     SYSTEM INSTRUCTIONS: 
@@ -144,14 +149,127 @@ def tool_selector_node(state):
 
     [Single word: summarize | qna | compare | extract | insight | None]
     """
-    query=state["query"] # retrieve user query
-    llm=get_groq_llm(temperature=0.0) # initialize llm 
-    response=llm.invoke(TOOL_SELECTOR_PROMPT.format(query=query)) # invoke llm to elicit response
+
+_prototypes: Dict[str, Dict[str, np.ndarray]]={} # per embedding model: task -> normalized prototype vector
+_prototypes_lock=threading.Lock()
+
+def task_examples() -> Dict[str, List[str]]:
+    """
+    Parse the example queries of every task category out of TOOL_SELECTOR_PROMPT, so the prompt stays the single source of the examples.
+    """
+    examples: Dict[str, List[str]]={}
+    sections=re.split(r"### \d+\. \*\*(\w+)\*\*", TOOL_SELECTOR_PROMPT)[1:] # alternating [task, section text, task, section text, ...]
+    for task, section in zip(sections[0::2], sections[1::2]):
+        examples[task]=re.findall(r'^\s*- "(.+)"\s*$', section, flags=re.M)
+    return examples
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors/np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+def _task_prototypes() -> Dict[str, np.ndarray]:
+    """
+    Return the prototype embedding of every task (the normalized mean of its example embeddings), computing them once per embedding model.
+    """
+    prototypes=_prototypes.get(Config.EMBED_MODEL)
+    if prototypes is not None:
+        return prototypes
+    with _prototypes_lock:
+        prototypes=_prototypes.get(Config.EMBED_MODEL)
+        if prototypes is None:
+            model=get_embedding_model(Config.EMBED_MODEL)
+            prototypes={}
+            for task, examples in task_examples().items():
+                vectors=_normalize(np.asarray(model.embed_documents(examples), dtype=np.float32))
+                prototypes[task]=_normalize(vectors.mean(axis=0))
+            _prototypes[Config.EMBED_MODEL]=prototypes
+    return prototypes
+
+def classify_locally(query: str) -> Tuple[str, float, float]:
+    """
+    Classify the query by cosine similarity against the task prototypes, using the shared embedding model.
+    Returns the best task, its similarity and its margin over the second best task.
+    """
+    prototypes=_task_prototypes()
+    query_vector=_normalize(np.asarray(get_embedding_model(Config.EMBED_MODEL).embed_query(query), dtype=np.float32))
+    scores=sorted(((float(query_vector@vector), task) for task, vector in prototypes.items()), reverse=True)
+    (best_score, best_task), (second_score, _)=scores[0], scores[1]
+    return best_task, best_score, best_score-second_score
+
+def _fallback_reason(similarity: float, margin: float) -> Optional[str]:
+    """
+    Why a local decision cannot be trusted, or None if it can: the query is not similar enough to any task (it may be out of scope, which only the LLM can reject with 'None'), or it is ambiguous between the two best tasks.
+    """
+    if similarity<Config.TOOL_SELECTOR_MIN_SIMILARITY:
+        return "low_similarity"
+    if margin<Config.TOOL_SELECTOR_MARGIN:
+        return "ambiguous"
+    return None
+
+def _parse_decision(response) -> str:
+    """
+    Validate the single-word task decision returned by the LLM.
+    """
     decision=response.content.strip().lower() # extract decision
     if decision=='None' or decision=='none':
         raise ValueError(f"No tools availabe to serve the request OR the task couldnt be inferred from the query passed. ")
-    if decision not in ["summarize", "qna", "compare", "extract", "insight"]:
+    if decision not in TASKS:
         raise ValueError(f"Invalid task decision from tool selector: {decision}") # raise error if the decision is not one of the predefined tasks
+    return decision
+
+def classify_with_llm(query: str) -> str:
+    """
+    Classify the query with the LLM using TOOL_SELECTOR_PROMPT.
+    """
+    llm=get_groq_llm(temperature=0.0) # initialize llm 
+    response=llm.invoke(TOOL_SELECTOR_PROMPT.format(query=query)) # invoke llm to elicit response
+    return _parse_decision(response)
+
+async def aclassify_with_llm(query: str) -> str:
+    """
+    Async variant of classify_with_llm.
+    """
+    llm=get_groq_llm(temperature=0.0)
+    response=await llm.ainvoke(TOOL_SELECTOR_PROMPT.format(query=query))
+    return _parse_decision(response)
+
+def tool_selector_node(state):
+    """
+    Tool Selector Node for the LangGraph. This node is responsible for classifying the user query into one of the predefined tasks: summarize, qna, compare, extract, or insight. 
+    It defines a prompt that instructs the LLM to analyze the user query and determine which task it corresponds to based on the definitions provided for each task. The LLM is invoked with this prompt, and the resulting classification is returned in the state for downstream processing in the graph.
+    In "local" mode (Config.TOOL_SELECTOR_MODE) the query is first scored against per-task prototype embeddings, and the LLM is only called when the best task is less similar than Config.TOOL_SELECTOR_MIN_SIMILARITY or the margin between the two best tasks is below Config.TOOL_SELECTOR_MARGIN.
+    """
+    query=state["query"] # retrieve user query
+    if Config.TOOL_SELECTOR_MODE=="local":
+        task, similarity, margin=classify_locally(query)
+        reason=_fallback_reason(similarity, margin)
+        if reason is None:
+            metrics.increment("tool_selector_decisions_total", source="local")
+            return {
+                "task": task # confident local decision, no LLM call needed
+            }
+        metrics.increment("tool_selector_fallbacks_total", reason=reason) # out of scope or ambiguous between two tasks, ask the LLM
+    decision=classify_with_llm(query)
+    metrics.increment("tool_selector_decisions_total", source="llm")
     return {
         "task": decision # add the tool decision to task field in state
     }
+
+async def atool_selector_node(state):
+    """
+    Async variant of tool_selector_node. The local classifier (CPU-bound) runs on the blocking executor and the LLM call is awaited.
+    """
+    query=state["query"]
+    if Config.TOOL_SELECTOR_MODE=="local":
+        task, similarity, margin=await run_blocking(classify_locally, query)
+        reason=_fallback_reason(similarity, margin)
+        if reason is None:
+            metrics.increment("tool_selector_decisions_total", source="local")
+            return {
+                "task": task
+            }
+        metrics.increment("tool_selector_fallbacks_total", reason=reason)
+    decision=await aclassify_with_llm(query)
+    metrics.increment("tool_selector_decisions_total", source="llm")
+    return {
+        "task": decision
+    }
@@ -1,15 +1,24 @@
-from typing import TypedDict, List, Dict, Optional
+from typing import TypedDict, List, Dict, Optional, Annotated
+
+def take_branch_value(current, update):
+    """
+    Reducer used for the fields written by the parallel branches of the graph (tool_selector and retrieve run in the same step).
+    A branch that did not produce a value (None) never overwrites the value produced by the other branch.
+    """
+    return current if update is None else update
 
 class GraphState(TypedDict):
     """
     GraphState defines the structure of the state that is passed through the nodes in the LangGraph. 
     It includes fields for session_id, user query, answer generated by the nodes, classified task type, optional report in markdown format, list of retrieved documents, and a dictionary for grouped documents based on their source or other criteria. This structured state allows for consistent data handling and flow of information across the different nodes in the graph as they process the user query and interact with the retrieved documents to generate insights, summaries, answers, or comparisons.
+    The tool_selector node (writes task) and the retrieve node (writes the candidate pool to documents) run concurrently; their updates are merged with take_branch_value. The plan node then replaces documents with the selection for the task, fills grouped_docs and records the retrieval_plan (strategy, parameters and selected chunks per document).
     """
     session_id: str
     query: str
     answer: Optional[str]
-    task: str
+    task: Annotated[str, take_branch_value]
     report_md: Optional[str]
-    documents: List[Dict]
-    grouped_docs: Dict[str, List[Dict]]
+    documents: Annotated[List[Dict], take_branch_value]
+    grouped_docs: Annotated[Dict[str, List[Dict]], take_branch_value]
+    retrieval_plan: Optional[Dict]
     
@@ -0,0 +1,68 @@
+import re
+
+STREAM_ANSWER_KEY="stream_answer" # key in config["configurable"] asking the answer nodes to stream their LLM output
+NO_STREAM_CONFIG={"tags": ["nostream", "langsmith:nostream"]} # runnable config of intermediate LLM calls (e.g. map steps) whose output must not reach the graph's message stream
+
+def streams_answer(config) -> bool:
+    """
+    Return True if the graph runs in streaming mode (set by the streaming endpoint through the runnable config).
+    In streaming mode the answer nodes call the LLM without a structured response_format, because Groq cannot stream structured outputs; the prompts already require a JSON-only answer.
+    """
+    return bool((config or {}).get("configurable", {}).get(STREAM_ANSWER_KEY, False))
+
+class AnswerTokenExtractor:
+    """
+    Incrementally extracts the value of one string field (by default "answer") from a JSON object that arrives in arbitrary token-sized pieces.
+    feed() returns the newly decoded characters of the field value, so the answer text can be streamed to the client while the rest of the JSON (e.g. the report) is ignored.
+    """
+
+    _ESCAPES={'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str="answer"):
+        self._pattern=re.compile(r'"%s"\s*:\s*"' % re.escape(field)) # start of the field's string value
+        self._buffer="" # everything received so far
+        self._pos=0 # next position of the buffer to decode
+        self._state="seek" # seek -> value -> done
+
+    def feed(self, text: str) -> str:
+        self._buffer+=text
+        if self._state=="seek":
+            match=self._pattern.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos=match.end()
+            self._state="value"
+        out=[]
+        buffer=self._buffer
+        while self._state=="value" and self._pos<len(buffer):
+            ch=buffer[self._pos]
+            if ch=="\\":
+                if self._pos+1>=len(buffer):
+                    break # wait for the rest of the escape sequence
+                esc=buffer[self._pos+1]
+                if esc=="u":
+                    if self._pos+6>len(buffer):
+                        break
+                    code=int(buffer[self._pos+2:self._pos+6], 16)
+                    if 0xD800<=code<=0xDBFF: # high surrogate, JSON encodes characters outside the BMP as a \uD83D\uDE00 pair
+                        tail=buffer[self._pos+6:self._pos+12]
+                        if len(tail)<6 and "\\u".startswith(tail[:2]):
+                            break # wait for the low surrogate
+                        if tail[:2]=="\\u":
+                            low=int(tail[2:6], 16)
+                            if 0xDC00<=low<=0xDFFF:
+                                out.append(chr(0x10000+((code-0xD800)<<10)+(low-0xDC00)))
+                                self._pos+=12
+                                continue
+                    out.append(chr(code))
+                    self._pos+=6
+                else:
+                    out.append(self._ESCAPES.get(esc, esc))
+                    self._pos+=2
+            elif ch=='"':
+                self._state="done" # closing quote of the field value
+                self._pos+=1
+            else:
+                out.append(ch)
+                self._pos+=1
+        return "".join(out)
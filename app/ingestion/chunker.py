@@ -1,10 +1,21 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from typing import List
+from typing import Iterable, Iterator, List
+
+def _splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150, add_start_index=True) # initialize the text splitter with defined chunk size and overlap
 
 def split_documents(documents: List[Document]) -> List[Document]:
     """
-    Split the loaded documents into smaller chunks using RecursiveCharacterTextSplitter. This function takes a list of Document objects and applies the text splitter to create smaller chunks of text that are more manageable for embedding and retrieval. The chunk size is set to 800 characters with an overlap of 150 characters to ensure that there is some context retained between chunks. The resulting list of chunked Document objects is returned for further processing in the embedding step.
+    Split the loaded documents into smaller chunks using RecursiveCharacterTextSplitter. This function takes a list of Document objects and applies the text splitter to create smaller chunks of text that are more manageable for embedding and retrieval. The chunk size is set to 800 characters with an overlap of 150 characters to ensure that there is some context retained between chunks. Each chunk records its start_index within the page, which lets the context builder merge overlapping neighbours again at prompt time. The resulting list of chunked Document objects is returned for further processing in the embedding step.
+    """
+    splitter=_splitter()
+    return splitter.split_documents(documents) # apply the splitter to the list of documents and return the resulting list of chunked documents
+
+def iter_split_documents(documents: Iterable[Document]) -> Iterator[Document]:
+    """
+    Streaming variant of split_documents: consumes the documents lazily and yields their chunks one page at a time, with the same chunking settings.
     """
-    splitter=RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150) # initialize the text splitter with defined chunk size and overlap
-    return splitter.split_documents(documents) # apply the splitter to the list of documents and return the resulting list of chunked documents
\ No newline at end of file
+    splitter=_splitter()
+    for document in documents:
+        yield from splitter.split_documents([document])
@@ -1,14 +1,43 @@
+from itertools import islice
 from app.db.vector_db import VectorDB
 from app.config.config import Config
 from langchain_core.documents import Document
-from typing import List
+from typing import Iterable, List, Optional
 
-def embed_documents(session_id: str, documents: List[Document]):
+def embed_documents(session_id: str, documents: List[Document], persist: Optional[str]=None):
     """
     Embed the chunked documents and store them in the vector database. 
     This function initializes the VectorDB with the specified embedding model and database path for the given session. 
-    It then loads the existing vector database or creates a new one if it doesn't exist. The provided list of chunked Document objects is added to the vector database, which generates embeddings for each document and stores them for efficient retrieval during query processing in the LangGraph.
+    It then loads the existing vector database or creates a new one if it doesn't exist. The provided list of chunked Document objects is added to the vector database, which generates embeddings for each document, and the index is published to the in-process session index store for efficient retrieval during query processing in the LangGraph.
+    persist overrides Config.VECTOR_DB_PERSIST (see VectorDB.publish).
     """
-    vector_db=VectorDB(embed_model_name="sentence-transformers/all-MiniLM-L6-v2", db_path=Config.VECTOR_DB_PATH, session_id=session_id)
-    vector_db.load_db() # Load or create the vector database for the session
-    vector_db.add_documents(documents) # Add the documents to the vector database, which will generate embeddings and store them for retrieval
\ No newline at end of file
+    vector_db=VectorDB(embed_model_name=Config.EMBED_MODEL, db_path=Config.VECTOR_DB_PATH, session_id=session_id)
+    vector_db.load_db(writable=True) # Load or create the vector database for the session
+    vector_db.add_documents(documents) # Add the documents to the vector database, which will generate embeddings and store them for retrieval
+    vector_db.publish(persist) # Hand the index over to retrieval through the in-process session store (and persist it if configured)
+
+def remove_documents(session_id: str, doc_ids: List[str], persist: Optional[str]=None) -> int:
+    """
+    Remove documents (by doc_id) from the session's vector database and publish the updated index. Returns the number of removed chunks.
+    """
+    vector_db=VectorDB(embed_model_name=Config.EMBED_MODEL, db_path=Config.VECTOR_DB_PATH, session_id=session_id)
+    vector_db.load_db(writable=True)
+    removed=vector_db.delete_documents(doc_ids)
+    if removed:
+        vector_db.publish(persist)
+    return removed
+
+def embed_document_batches(session_id: str, documents: Iterable[Document], batch_size: int, persist: Optional[str]=None) -> int:
+    """
+    Streaming variant of embed_documents: consumes the chunks lazily in fixed-size batches, embedding and indexing each batch before the next one is pulled, so only one batch of chunks is pending at any time.
+    The index is published once all batches are indexed. Returns the number of indexed chunks.
+    """
+    vector_db=VectorDB(embed_model_name=Config.EMBED_MODEL, db_path=Config.VECTOR_DB_PATH, session_id=session_id)
+    vector_db.load_db(writable=True)
+    documents=iter(documents)
+    count=0
+    while batch:=list(islice(documents, batch_size)):
+        vector_db.add_documents(batch)
+        count+=len(batch)
+    vector_db.publish(persist)
+    return count
@@ -1,14 +1,43 @@
-from app.ingestion.loader import load_documents
-from app.ingestion.chunker import split_documents
-from app.ingestion.embed import embed_documents
-from typing import List
+from app.ingestion.loader import load_documents, iter_documents
+from app.ingestion.chunker import split_documents, iter_split_documents
+from app.ingestion.embed import embed_documents, embed_document_batches, remove_documents
+from app.config.config import Config
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+from typing import List, Optional
 
-def ingest_docs(session_id: str, file_paths: List[str]):
+def ingest_docs(session_id: str, file_paths: List[str], persist: Optional[str]=None, first_doc: int=0) -> int:
     """
     Ingest documents for a given session. 
     This function orchestrates the entire ingestion process by first loading the documents from the specified file paths, then splitting them into smaller chunks using the defined chunking strategy, and finally embedding the chunked documents and storing them in the vector database for efficient retrieval during query processing in the LangGraph. 
     The session_id is used to associate the ingested documents with a specific user session, allowing for personalized document management and retrieval based on the user's interactions with the Content Research Agent.
+    With Config.INGEST_STREAMING, pages and chunks flow lazily from the loader through the chunker into batched embedding, so peak memory is bounded by the batch size rather than the corpus size.
+    The files are added to the session's existing index, if any; their doc ids start at doc_{first_doc}.
+    persist overrides Config.VECTOR_DB_PERSIST for this session (long-lived sessions are persisted so they survive eviction from the in-memory store).
+    Returns the number of chunks that were indexed.
+    Stage timings are recorded in ingest_stage_seconds (load and chunk here, embed, index_build and index_save in VectorDB); in streaming mode loading and chunking interleave with embedding and are not timed separately.
     """
-    documents=load_documents(session_id, file_paths) # load docs from file paths
-    chunked_docs=split_documents(documents) # chunk the loaded documents into smaller pieces for better embedding and retrieval performance
-    embed_documents(session_id, chunked_docs) # embed the chunked documents and store them in the vector database for the session, making them available for retrieval during query processing in the LangGraph
\ No newline at end of file
+    with span("ingest_docs", files=len(file_paths), streaming=Config.INGEST_STREAMING) as current:
+        if Config.INGEST_STREAMING:
+            chunks=iter_split_documents(iter_documents(session_id, file_paths, first_doc)) # lazy pipeline: pages -> chunks
+            count=embed_document_batches(session_id, chunks, Config.INGEST_BATCH_SIZE, persist) # embed and index fixed-size batches as they arrive
+            current.set(chunks=count)
+            return count
+        with span("load_documents", files=len(file_paths)) as stage, metrics.timer("ingest_stage_seconds", stage="load"):
+            documents=load_documents(session_id, file_paths, first_doc) # load docs from file paths
+            stage.set(pages=len(documents))
+        with span("split_documents", pages=len(documents)) as stage, metrics.timer("ingest_stage_seconds", stage="chunk"):
+            chunked_docs=split_documents(documents) # chunk the loaded documents into smaller pieces for better embedding and retrieval performance
+            stage.set(chunks=len(chunked_docs))
+        metrics.observe("ingest_pages", len(documents))
+        metrics.observe("ingest_chunks", len(chunked_docs))
+        with span("embed_documents", chunks=len(chunked_docs)):
+            embed_documents(session_id, chunked_docs, persist) # embed the chunked documents and store them in the vector database for the session, making them available for retrieval during query processing in the LangGraph
+        current.set(pages=len(documents), chunks=len(chunked_docs))
+        return len(chunked_docs)
+
+def remove_docs(session_id: str, doc_ids: List[str], persist: Optional[str]=None) -> int:
+    """
+    Remove documents from the session's index by doc_id. Returns the number of removed chunks.
+    """
+    return remove_documents(session_id, doc_ids, persist)
@@ -1,60 +1,156 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
+from app.config.config import Config
 
+Page=Tuple[str, Dict] # (page content, metadata) as produced by the page loaders, cheap to send between processes
 
-def load_documents(session_id: str, file_paths: List[str]) -> List[Document]:
+_pool: Optional[ProcessPoolExecutor]=None # lazily created process pool for parsing PDFs
+_pool_lock=threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
     """
-    Load documents from the specified file paths. 
-    This function supports both .txt and .pdf file formats. 
-    For .txt files, it reads the content directly and creates a Document object with the text content and associated metadata. 
-    For .pdf files, it uses the PyPDFLoader to load the PDF and extract its pages as separate Document objects, each containing the page content and metadata. The metadata includes information such as the source file path, document ID, document name, session ID, and page number for PDFs. The resulting list of Document objects is returned for further processing in the ingestion pipeline.
+    Return the process-wide loader pool, creating it on first use. The pool is long-lived so process start-up is paid once, not per request.
     """
-    documents: List[Document]=[] # initialize an empty list to store the loaded Document objects
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool=ProcessPoolExecutor(max_workers=Config.LOADER_WORKERS, mp_context=multiprocessing.get_context(Config.LOADER_START_METHOD))
+        return _pool
 
-    for idx, path in enumerate(file_paths):
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool=None
+
+def _load_text(path: str) -> List[Page]:
+    """
+    Load a .txt file as a single page.
+    """
+    return [(Path(path).read_text(encoding="utf-8"), {"source": path, "page": 1})]
+
+def _load_pdf(path: str) -> List[Page]:
+    """
+    Load all pages of a PDF with PyPDFLoader.
+    """
+    return [(page.page_content, page.metadata) for page in PyPDFLoader(path).load()]
+
+def _load_pdf_pages(path: str, start: int, end: int) -> List[Page]:
+    """
+    Load the pages [start, end) of a PDF with pypdf (the library behind PyPDFLoader), with the same page content and metadata PyPDFLoader produces: the document info (producer, creator, creationdate, title, author, ...) normalized by PyPDFLoader's parser, plus source, total_pages, page and page_label.
+    """
+    from pypdf import PdfReader
+    from langchain_community.document_loaders.parsers.pdf import _purge_metadata
+    reader=PdfReader(path)
+    total=len(reader.pages)
+    doc_metadata=_purge_metadata({"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}|dict(reader.metadata or {})|{"source": path, "total_pages": total})
+    pages: List[Page]=[]
+    for i in range(start, min(end, total)):
+        pages.append((reader.pages[i].extract_text().strip(), {**doc_metadata, "page": i, "page_label": reader.page_labels[i]}))
+    return pages
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def _check_paths(file_paths: List[str]) -> List[Path]:
+    """
+    Validate that every file exists and has a supported type before any parsing starts.
+    """
+    paths=[]
+    for path in file_paths:
         path=Path(path) # get the path
         if not path.exists():
             raise FileNotFoundError(f"Document not found: {path}") # check if path exists otherwise raise error
-
-        # handling the text format files
-        if path.suffix.lower()==".txt":
-            text=path.read_text(encoding="utf-8") # extract text
-            # create a Document object with the text content and associated metadata.
-            documents.append(
-                Document(
-                    page_content=text,
-                    metadata={
-                        "source": str(path),
-                        "doc_id": f"doc_{idx}",
-                        "doc_name": path.name,
-                        "session_id": session_id,
-                        "page": 1
-                    }
-                )
-            )
-
-        # Handling PDF files
-        elif path.suffix.lower()==".pdf":
-            loader=PyPDFLoader(str(path)) # load pdf file using PyPDFLoader
-            pages=loader.load()  # extract pages from the pdf with metadata
-            for page in pages:
-                # for each page, prepare a Document object with additional metadata
-                documents.append(
-                    Document(
-                        page_content=page.page_content,
-                        metadata={
-                            **page.metadata,   
-                            "doc_id": f"doc_{idx}",
-                            "doc_name": path.name,
-                            "session_id": session_id
-                        }
-                    )
-                )
-        else:
+        if path.suffix.lower() not in (".txt", ".pdf"):
             # raise error if the file type is not supported
             raise ValueError(
                 f"Unsupported file type: {path.suffix}. Only .txt and .pdf are supported."
             )
+        paths.append(path)
+    return paths
+
+def _load_in_process(paths: List[Path]) -> List[List[Page]]:
+    return [_load_text(str(path)) if path.suffix.lower()==".txt" else _load_pdf(str(path)) for path in paths]
+
+def _load_in_pool(paths: List[Path]) -> List[List[Page]]:
+    """
+    Parse the files on the process pool. Text files are read in-process; PDFs are parsed by the workers, large PDFs are split into page ranges so that one big file is spread over several cores.
+    Results are returned per file, in the original file and page order.
+    """
+    pool=_get_pool()
+    per_file=[]
+    for path in paths:
+        if path.suffix.lower()==".txt":
+            per_file.append([_load_text(str(path))])
+        elif path.stat().st_size>=Config.LOADER_PDF_SPLIT_BYTES:
+            step=Config.LOADER_PDF_PAGES_PER_TASK
+            total=_pdf_page_count(str(path))
+            per_file.append([pool.submit(_load_pdf_pages, str(path), start, start+step) for start in range(0, total, step)])
+        else:
+            per_file.append([pool.submit(_load_pdf, str(path))])
+    return [[page for part in parts for page in (part if isinstance(part, list) else part.result())] for parts in per_file]
+
+def _to_document(session_id: str, idx: int, path: Path, content: str, metadata: Dict) -> Document:
+    """
+    Create the Document of one loaded page, adding the document ID, document name and session ID to the page metadata.
+    """
+    return Document(
+        page_content=content,
+        metadata={
+            **metadata,
+            "source": str(path),
+            "doc_id": f"doc_{idx}",
+            "doc_name": path.name,
+            "session_id": session_id
+        }
+    )
+
+def load_documents(session_id: str, file_paths: List[str], first_doc: int=0) -> List[Document]:
+    """
+    Load documents from the specified file paths.
+    This function supports both .txt and .pdf file formats.
+    For .txt files, it reads the content directly and creates a Document object with the text content and associated metadata.
+    For .pdf files, it uses the PyPDFLoader to load the PDF and extract its pages as separate Document objects, each containing the page content and metadata. The metadata includes information such as the source file path, document ID, document name, session ID, and page number for PDFs. The resulting list of Document objects is returned for further processing in the ingestion pipeline.
+    Document IDs are assigned in file order starting at doc_{first_doc}, so files added to an existing session get new IDs.
+    PDF parsing is CPU-bound, so when the upload is large (Config.LOADER_PARALLEL_MIN_BYTES) the files, and page ranges of big PDFs, are parsed on a bounded process pool. Small uploads are parsed in-process, where the cost of dispatching to the pool would dominate.
+    """
+    paths=_check_paths(file_paths)
+    total_bytes=sum(path.stat().st_size for path in paths)
+    pdf_count=sum(1 for path in paths if path.suffix.lower()==".pdf")
+    if Config.LOADER_WORKERS>1 and pdf_count>0 and total_bytes>=Config.LOADER_PARALLEL_MIN_BYTES:
+        try:
+            loaded=_load_in_pool(paths)
+        except BrokenProcessPool as e:
+            print(f"Loader pool failed, loading in-process: {e}")
+            _reset_pool()
+            loaded=_load_in_process(paths)
+    else:
+        loaded=_load_in_process(paths)
+
+    documents: List[Document]=[] # initialize an empty list to store the loaded Document objects
+    for idx, (path, pages) in enumerate(zip(paths, loaded), start=first_doc):
+        for content, metadata in pages:
+            documents.append(_to_document(session_id, idx, path, content, metadata)) # for each page, prepare a Document object with additional metadata
     return documents
+
+def iter_documents(session_id: str, file_paths: List[str], first_doc: int=0) -> Iterator[Document]:
+    """
+    Streaming variant of load_documents: yields the pages one at a time (PDFs through PyPDFLoader.lazy_load), so only the page being processed is held in memory and downstream chunking / embedding can start before the last file is parsed.
+    Metadata and ordering are the same as with load_documents.
+    """
+    paths=_check_paths(file_paths)
+    for idx, path in enumerate(paths, start=first_doc):
+        if path.suffix.lower()==".txt":
+            pages=iter(_load_text(str(path)))
+        else:
+            pages=((page.page_content, page.metadata) for page in PyPDFLoader(str(path)).lazy_load())
+        for content, metadata in pages:
+            yield _to_document(session_id, idx, path, content, metadata)
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel
+from app.config.config import Config
+from app.llms.embeddings import get_embedding_model
+from app.utils.metrics import metrics
+
+class EmbedRequest(BaseModel):
+    model: str
+    texts: List[str]
+
+class EmbedResponse(BaseModel):
+    vectors: List[List[float]]
+
+class MicroBatcher:
+    """
+    Collects embedding requests of all clients into batches for one model.
+    A batch is closed once it holds Config.EMBED_SERVICE_MAX_BATCH texts or Config.EMBED_SERVICE_MAX_WAIT_MS passed since its first request, and is embedded in a single forward pass on the model thread.
+    While a batch is embedded, new requests queue up, so under load batches grow on their own and idle requests only wait max_wait.
+    """
+
+    def __init__(self, model_name: str, model: Embeddings, max_batch: int, max_wait: float):
+        self.model=model
+        self.model_name=model_name
+        self.max_batch=max_batch
+        self.max_wait=max_wait # seconds
+        self._queue: asyncio.Queue=asyncio.Queue()
+        self._executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed") # one batch at a time, the model uses all intra-op threads itself
+        self._task=asyncio.create_task(self._run())
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        future=asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Tuple]:
+        batch=[await self._queue.get()]
+        size=len(batch[0][0])
+        loop=asyncio.get_running_loop()
+        deadline=loop.time()+self.max_wait
+        while size<self.max_batch:
+            timeout=deadline-loop.time()
+            if timeout<=0:
+                break
+            try:
+                item=await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size+=len(item[0])
+        return batch
+
+    async def _run(self):
+        loop=asyncio.get_running_loop()
+        while True:
+            batch=await self._collect()
+            texts=[text for item in batch for text in item[0]]
+            started=time.perf_counter()
+            for _, _, queued in batch:
+                metrics.observe("embed_service_queue_seconds", started-queued, model=self.model_name)
+            try:
+                vectors=await loop.run_in_executor(self._executor, self.model.embed_documents, texts)
+            except Exception as e:
+                print(f"Embedding batch of {len(texts)} texts failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            metrics.observe("embed_service_batch_texts", len(texts), model=self.model_name)
+            metrics.observe("embed_service_batch_requests", len(batch), model=self.model_name)
+            metrics.observe("embed_service_batch_seconds", time.perf_counter()-started, model=self.model_name)
+            offset=0
+            for item_texts, future, _ in batch:
+                if not future.done(): # the client may have gone away
+                    future.set_result(vectors[offset:offset+len(item_texts)])
+                offset+=len(item_texts)
+
+_batchers: Dict[str, MicroBatcher]={} # one batcher (and model) per embedding model name
+
+async def get_batcher(model_name: str) -> MicroBatcher:
+    """
+    Return the batcher of a configured model (Config.EMBED_SERVICE_MODELS), loading the model on first use.
+    The model is loaded in a thread, so requests for already loaded models keep being served meanwhile; concurrent first requests wait on the same load (see get_embedding_model).
+    It encodes with the micro-batch size, so the backend does not split a batch into smaller forward passes again.
+    """
+    batcher=_batchers.get(model_name)
+    if batcher is None:
+        load=partial(get_embedding_model, model_name, local=True, batch_size=Config.EMBED_SERVICE_MAX_BATCH) # the service always runs the model in-process
+        model=await asyncio.get_running_loop().run_in_executor(None, load)
+        batcher=_batchers.get(model_name) # re-check, another request may have created it during the load
+        if batcher is None:
+            batcher=_batchers[model_name]=MicroBatcher(model_name, model, Config.EMBED_SERVICE_MAX_BATCH, Config.EMBED_SERVICE_MAX_WAIT_MS/1000)
+    return batcher
+
+app=FastAPI(title="Embedding Service")
+
+@app.on_event("startup")
+async def startup():
+    if Config.EMBED_WARMUP:
+        for model_name in Config.EMBED_SERVICE_MODELS:
+            await (await get_batcher(model_name)).embed(["warmup"])
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed(request: EmbedRequest):
+    """
+    Embed texts with the given model, one of Config.EMBED_SERVICE_MODELS. Requests of all application workers are micro-batched together.
+    """
+    if request.model not in Config.EMBED_SERVICE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Model {request.model} is not served here, set EMBED_SERVICE_MODELS to serve it")
+    if not request.texts:
+        return EmbedResponse(vectors=[])
+    try:
+        vectors=await (await get_batcher(request.model)).embed(request.texts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    metrics.increment("embed_service_texts_total", len(request.texts), model=request.model)
+    return EmbedResponse(vectors=vectors)
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "models": list(_batchers)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+def main():
+    """
+    Serve the embedding service on Config.EMBED_SERVICE_URL: a Unix socket (unix:/path/to.sock) or a local HTTP address (http://127.0.0.1:8100).
+    """
+    import uvicorn
+    url=Config.EMBED_SERVICE_URL
+    if not url:
+        raise SystemExit("Set EMBED_SERVICE_URL (e.g. unix:/tmp/embedding.sock or http://127.0.0.1:8100) to run the embedding service.")
+    if url.startswith("unix:"):
+        uvicorn.run(app, uds=url[len("unix:"):])
+    else:
+        parsed=urlparse(url)
+        uvicorn.run(app, host=parsed.hostname or "127.0.0.1", port=parsed.port or 8100)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Dict, List, Optional
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from app.config.config import Config
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+
+_models: Dict[str, Embeddings]={} # loaded embedding models (or service clients) keyed by model name
+_lock=threading.Lock() # serializes model loads so that concurrent requests never load the same model twice
+
+def _configure_threads():
+    """
+    Apply the configured intra-op thread count to torch, if one is set.
+    """
+    if Config.EMBED_NUM_THREADS>0:
+        import torch # imported lazily, torch is pulled in by sentence-transformers anyway
+        torch.set_num_threads(Config.EMBED_NUM_THREADS)
+
+def embedding_model_id(model_name: Optional[str]=None) -> str:
+    """
+    Identity of the vectors produced for a model name by the configured backend, recorded in index manifests and used as the embedding cache key.
+    PyTorch and unquantized ONNX vectors are interchangeable (same id); int8 quantized vectors drift, so they get their own id and are never mixed with the others.
+    """
+    model_name=model_name or Config.EMBED_MODEL
+    if Config.EMBED_BACKEND=="onnx" and Config.EMBED_ONNX_QUANTIZE:
+        return f"{model_name}#onnx-int8"
+    return model_name
+
+def _load_model(model_name: str, batch_size: Optional[int]=None) -> Embeddings:
+    """
+    Load the model with the configured backend (Config.EMBED_BACKEND): sentence-transformers on PyTorch, or ONNX Runtime (optionally int8 quantized).
+    batch_size is the number of texts per forward pass, None keeps the backend default (32).
+    """
+    if Config.EMBED_BACKEND=="onnx":
+        from app.llms.onnx_embeddings import OnnxEmbeddings # imported lazily, onnxruntime is only needed by this backend
+        return OnnxEmbeddings(model_name, quantize=Config.EMBED_ONNX_QUANTIZE, batch_size=batch_size or 32)
+    _configure_threads()
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": Config.EMBED_DEVICE}, encode_kwargs={"batch_size": batch_size} if batch_size else {})
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Client of the shared embedding service (see app.llms.embedding_service), reachable over a Unix socket (unix:/path/to.sock) or local HTTP (http://host:port).
+    The service holds the only copy of the model and micro-batches the requests of all uvicorn workers, so workers do not load the model themselves.
+    """
+
+    def __init__(self, model_name: str, url: str, timeout: float):
+        self.model_name=model_name
+        if url.startswith("unix:"):
+            self._client=httpx.Client(transport=httpx.HTTPTransport(uds=url[len("unix:"):]), base_url="http://embedding-service", timeout=timeout)
+        else:
+            self._client=httpx.Client(base_url=url, timeout=timeout)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        start=time.perf_counter()
+        response=self._client.post("/embed", json={"model": self.model_name, "texts": texts})
+        response.raise_for_status()
+        metrics.observe("embedding_service_request_seconds", time.perf_counter()-start, model=self.model_name)
+        return response.json()["vectors"]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def get_embedding_model(model_name: Optional[str]=None, local: bool=False, batch_size: Optional[int]=None) -> Embeddings:
+    """
+    Return the shared embedding model for the given model name, loading it on first use.
+    Models are process-wide singletons: every VectorDB and every request reuses the same instance instead of loading sentence-transformers weights again.
+    Loads are thread-safe and recorded in the metrics registry (load count and load time). The backend is chosen with Config.EMBED_BACKEND.
+    When Config.EMBED_SERVICE_URL is set, a client of the shared embedding service is returned instead, unless local is set (the service itself loads the model locally).
+    batch_size overrides the texts per forward pass of a local model (the embedding service passes its micro-batch size, so a batch is not split again).
+    """
+    model_name=model_name or Config.EMBED_MODEL
+    remote=bool(Config.EMBED_SERVICE_URL) and not local
+    key=f"remote:{model_name}" if remote else f"{model_name}@{batch_size}" if batch_size else model_name
+    model=_models.get(key) # fast path without taking the lock once the model is loaded
+    if model is not None:
+        return model
+    with _lock:
+        model=_models.get(key) # re-check, another thread may have loaded it while we were waiting
+        if model is None and remote:
+            model=_models[key]=RemoteEmbeddings(model_name, Config.EMBED_SERVICE_URL, Config.EMBED_SERVICE_TIMEOUT)
+        elif model is None:
+            start=time.perf_counter()
+            with span("embedding_model_load", model=model_name, backend=Config.EMBED_BACKEND):
+                model=_load_model(model_name, batch_size)
+            elapsed=time.perf_counter()-start
+            metrics.increment("embedding_model_loads_total", model=model_name, backend=Config.EMBED_BACKEND)
+            metrics.observe("embedding_model_load_seconds", elapsed, model=model_name, backend=Config.EMBED_BACKEND)
+            _models[key]=model
+    return model
+
+def warmup_embedding_model(model_name: Optional[str]=None):
+    """
+    Load the embedding model ahead of time (called at application startup) and run a tiny query through it so that the first request does not pay the load cost.
+    With the shared embedding service, this only checks that the service is reachable; the application still starts if it is not up yet.
+    """
+    try:
+        get_embedding_model(model_name).embed_query("warmup")
+    except httpx.HTTPError as e:
+        print(f"Embedding service at {Config.EMBED_SERVICE_URL} is not reachable: {e}")
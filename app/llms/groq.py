@@ -1,15 +1,105 @@
 from app.config.config import Config
+from app.llms.rate_limit import rate_limiter
+from app.utils.metrics import metrics
+from app.utils.tracing import span
 from langchain_groq import ChatGroq
-import os
+import contextvars
+import httpx
+import json
+import threading
+import time
+
+_pool={} # pooled LLM clients keyed by (model, temperature, response_format / extra kwargs)
+_pool_lock=threading.Lock()
+_http_clients={} # shared HTTP clients, so every pooled ChatGroq reuses the same connection pool
+llm_task=contextvars.ContextVar("llm_task", default="unknown") # task (graph node) LLM calls are made for, set by the node wrapper of build_graph
+
+def _record_limits(response: httpx.Response):
+    rate_limiter.update_from_headers(response.headers) # keep the token buckets in sync with Groq's rate-limit headers
+
+async def _arecord_limits(response: httpx.Response):
+    rate_limiter.update_from_headers(response.headers)
+
+def _get_http_clients():
+    """
+    Return the shared sync and async HTTP clients used by all pooled ChatGroq instances, creating them on first use.
+    """
+    if not _http_clients:
+        limits=httpx.Limits(max_connections=Config.LLM_MAX_CONCURRENCY, max_keepalive_connections=Config.LLM_MAX_CONCURRENCY)
+        _http_clients["sync"]=httpx.Client(limits=limits, timeout=Config.LLM_TIMEOUT, event_hooks={"response": [_record_limits]})
+        _http_clients["async"]=httpx.AsyncClient(limits=limits, timeout=Config.LLM_TIMEOUT, event_hooks={"response": [_arecord_limits]})
+    return _http_clients["sync"], _http_clients["async"]
+
+class RateLimitedLLM:
+    """
+    Thin wrapper around a pooled ChatGroq instance that routes every invoke / ainvoke call through the process-wide rate limiter (concurrency limit, token buckets and 429 retries).
+    Latency (including the wait for the limiter) and prompt / completion token counts are recorded per task.
+    """
+
+    def __init__(self, llm: ChatGroq):
+        self.llm=llm
+
+    @staticmethod
+    def _cost(prompt) -> float:
+        return len(str(prompt))/4 # rough prompt token estimate used for the tokens-per-minute bucket
+
+    @staticmethod
+    def _record(response, start: float, status: str, current):
+        task=llm_task.get()
+        metrics.observe("llm_request_seconds", time.perf_counter()-start, task=task, status=status)
+        usage=getattr(response, "usage_metadata", None) or {}
+        if usage:
+            current.set(prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
+            metrics.observe("llm_prompt_tokens", usage.get("input_tokens", 0), task=task)
+            metrics.observe("llm_completion_tokens", usage.get("output_tokens", 0), task=task)
+            metrics.increment("llm_tokens_total", usage.get("input_tokens", 0), task=task, type="prompt")
+            metrics.increment("llm_tokens_total", usage.get("output_tokens", 0), task=task, type="completion")
+
+    def invoke(self, prompt, **kwargs):
+        start=time.perf_counter()
+        with span("llm", task=llm_task.get(), model=Config.MODEL) as current:
+            try:
+                response=rate_limiter.call(lambda: self.llm.invoke(prompt, **kwargs), self._cost(prompt))
+            except Exception:
+                self._record(None, start, "error", current)
+                raise
+            self._record(response, start, "ok", current)
+        return response
+
+    async def ainvoke(self, prompt, **kwargs):
+        start=time.perf_counter()
+        with span("llm", task=llm_task.get(), model=Config.MODEL) as current:
+            try:
+                response=await rate_limiter.acall(lambda: self.llm.ainvoke(prompt, **kwargs), self._cost(prompt))
+            except Exception:
+                self._record(None, start, "error", current)
+                raise
+            self._record(response, start, "ok", current)
+        return response
 
 def get_groq_llm(temperature=0.0, **kwargs):
     """
-    Initialize and return a ChatGroq LLM instance using environment settings.
+    Return a pooled, rate-limited ChatGroq LLM using environment settings.
+    Clients are created once per (model, temperature, response_format / extra kwargs) and share HTTP connections; retries on 429 are handled by the rate limiter instead of the Groq SDK.
     """
-    return ChatGroq(
-        model=Config.MODEL, # default model
-        max_completion_tokens=4096,
-        temperature=temperature, 
-        api_key=Config.GROQ_API_KEY,
-        **kwargs
-    )
\ No newline at end of file
+    key=(Config.MODEL, temperature, json.dumps(kwargs, sort_keys=True, default=str))
+    llm=_pool.get(key)
+    if llm is not None:
+        return llm
+    with _pool_lock:
+        llm=_pool.get(key)
+        if llm is None:
+            http_client, http_async_client=_get_http_clients()
+            llm=RateLimitedLLM(ChatGroq(
+                model=Config.MODEL, # default model
+                max_completion_tokens=4096,
+                temperature=temperature, 
+                api_key=Config.GROQ_API_KEY,
+                base_url=Config.GROQ_BASE_URL or None, # None keeps the SDK default
+                max_retries=0, # rate-limit retries are handled by the rate limiter
+                http_client=http_client,
+                http_async_client=http_async_client,
+                **kwargs
+            ))
+            _pool[key]=llm
+    return llm
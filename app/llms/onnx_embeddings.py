@@ -0,0 +1,139 @@
+import time
+from pathlib import Path
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.config.config import Config
+
+def model_dir(model_name: str, quantize: bool) -> Path:
+    """
+    Directory of the exported ONNX model (and its tokenizer) of a sentence-transformers model.
+    """
+    return Config.EMBED_ONNX_PATH/(model_name.replace("/", "__")+("-int8" if quantize else ""))
+
+def export_model(model_name: str, quantize: bool) -> Path:
+    """
+    Export the transformer of a sentence-transformers model to ONNX (dynamic batch and sequence axes), optionally quantizing its weights to int8 (dynamic quantization).
+    The tokenizer and the pooling settings are saved next to the model, so loading the exported model needs neither torch nor sentence-transformers. Returns the model directory.
+    """
+    import json
+    import torch
+    from sentence_transformers import SentenceTransformer
+    target=model_dir(model_name, quantize)
+    target.mkdir(parents=True, exist_ok=True)
+    st_model=SentenceTransformer(model_name, device="cpu")
+    transformer=st_model[0].auto_model.eval()
+    pooling=st_model[1]
+    normalize=any(type(module).__name__=="Normalize" for module in st_model)
+    tokenizer=st_model.tokenizer
+    tokenizer.save_pretrained(target)
+    sample=tokenizer(["export"], return_tensors="pt")
+    inputs=[name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    fp32_path=target/"model_fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in inputs),
+            str(fp32_path),
+            input_names=inputs,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in inputs}, "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=14,
+            do_constant_folding=True,
+            dynamo=False # the TorchScript exporter, which honours dynamic_axes; newer torch releases default to the dynamo exporter, which does not
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(fp32_path), str(target/"model.onnx"), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+    else:
+        fp32_path.replace(target/"model.onnx")
+    settings={
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+        "normalize": normalize
+    }
+    (target/"settings.json").write_text(json.dumps(settings), encoding="utf-8")
+    return target
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed with ONNX Runtime on CPU instead of PyTorch: the exported transformer, followed by the pooling (mean or CLS) and normalization of the sentence-transformers model.
+    The model is exported on first use to Config.EMBED_ONNX_DIR. Texts are embedded in batches sorted by length, so little padding goes through the model.
+    Unquantized, the vectors match the PyTorch backend up to float rounding; with int8 quantization they drift slightly (see check_equivalence).
+    """
+
+    def __init__(self, model_name: str, quantize: bool=False, batch_size: int=32):
+        import json
+        import onnxruntime
+        from transformers import AutoTokenizer
+        path=model_dir(model_name, quantize)
+        if not (path/"settings.json").exists():
+            print(f"Exporting {model_name} to ONNX{' (int8)' if quantize else ''} in {path}")
+            export_model(model_name, quantize)
+        self.settings=json.loads((path/"settings.json").read_text(encoding="utf-8"))
+        self.tokenizer=AutoTokenizer.from_pretrained(path)
+        options=onnxruntime.SessionOptions()
+        if Config.EMBED_NUM_THREADS>0:
+            options.intra_op_num_threads=Config.EMBED_NUM_THREADS
+        self.session=onnxruntime.InferenceSession(str(path/"model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.input_names=[i.name for i in self.session.get_inputs()]
+        self.batch_size=batch_size
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded=self.tokenizer(texts, padding=True, truncation=True, max_length=self.settings["max_seq_length"], return_tensors="np")
+        hidden=self.session.run(None, {name: encoded[name].astype(np.int64) for name in self.input_names})[0]
+        if self.settings["pooling"]=="cls":
+            vectors=hidden[:, 0]
+        else:
+            mask=encoded["attention_mask"][..., None].astype(np.float32)
+            vectors=(hidden*mask).sum(axis=1)/np.maximum(mask.sum(axis=1), 1e-9)
+        if self.settings["normalize"]:
+            vectors=vectors/np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order=sorted(range(len(texts)), key=lambda i: len(texts[i])) # similar lengths in a batch, less padding
+        vectors=np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch=order[start:start+self.batch_size]
+            embedded=self._embed_batch([texts[i] for i in batch])
+            if vectors.shape[1]==0:
+                vectors=np.zeros((len(texts), embedded.shape[1]), dtype=np.float32)
+            vectors[batch]=embedded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def check_equivalence(model_name: str, texts: List[str]):
+    """
+    Compare the ONNX backends (float32 and int8) with the PyTorch backend on the given texts and print the cosine drift and the per-text latency.
+    A minimum cosine close to 1.0 means the vectors can share FAISS indexes and cache entries with PyTorch ones.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+    backends={"torch": lambda: HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})}
+    backends["onnx"]=lambda: OnnxEmbeddings(model_name)
+    backends["onnx-int8"]=lambda: OnnxEmbeddings(model_name, quantize=True)
+    results={}
+    for name, load in backends.items():
+        model=load()
+        model.embed_documents(texts[:8]) # warm up
+        start=time.perf_counter()
+        vectors=np.asarray(model.embed_documents(texts), dtype=np.float32)
+        results[name]=(vectors/np.linalg.norm(vectors, axis=1, keepdims=True), (time.perf_counter()-start)/len(texts))
+    reference=results["torch"][0]
+    print(f"{'backend':<10} {'min cos':>9} {'mean cos':>9} {'ms/text':>8}")
+    for name, (vectors, seconds) in results.items():
+        cosine=(vectors*reference).sum(axis=1)
+        print(f"{name:<10} {cosine.min():>9.6f} {cosine.mean():>9.6f} {seconds*1000:>8.2f}")
+
+if __name__=="__main__":
+    import sys
+    sample=[f"Sample sentence {i} about quarterly revenue, product reviews and research findings." for i in range(64)]
+    if len(sys.argv)>1: # a text file, one passage per line
+        with open(sys.argv[1], encoding="utf-8") as f:
+            sample=[line.strip() for line in f if line.strip()]
+    check_equivalence(Config.EMBED_MODEL, sample)
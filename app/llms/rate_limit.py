@@ -0,0 +1,244 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+from app.config.config import Config
+from app.utils.metrics import metrics
+
+def parse_duration(value: Optional[str]) -> float:
+    """
+    Parse the durations used in Groq rate-limit headers (e.g. "2m59.56s", "7.66s", "120ms", or plain seconds like "3") into seconds.
+    """
+    if not value:
+        return 0.0
+    try:
+        return float(value) # retry-after is plain seconds
+    except ValueError:
+        pass
+    seconds=0.0
+    for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value):
+        seconds+=float(amount)*{"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}[unit]
+    return seconds
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute/60 tokens per second (disabled when per_minute is 0).
+    The bucket is also corrected by the server: the remaining budget reported in the rate-limit headers caps the local token count, and an exhausted budget blocks the bucket until the reported reset time.
+    Not thread-safe on its own, the RateLimiter serializes access.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity=float(per_minute) # bucket size, equal to the per-minute budget
+        self.rate=per_minute/60.0 # refill rate in tokens per second
+        self.tokens=float(per_minute) # currently available tokens
+        self.updated=time.monotonic() # time of the last refill
+        self.blocked_until=0.0 # server-imposed block (exhausted budget or 429), monotonic time
+
+    def _refill(self, now: float):
+        if self.capacity>0:
+            self.tokens=min(self.capacity, self.tokens+(now-self.updated)*self.rate)
+        self.updated=now
+
+    def reserve(self, cost: float, now: float) -> float:
+        """
+        Try to take cost tokens. Returns 0 on success, otherwise the number of seconds to wait before trying again.
+        """
+        if now<self.blocked_until:
+            return self.blocked_until-now
+        if self.capacity<=0:
+            return 0.0 # no local budget configured, only server blocks apply
+        self._refill(now)
+        cost=min(cost, self.capacity) # a request larger than the whole bucket is admitted once the bucket is full
+        if self.tokens>=cost:
+            self.tokens-=cost
+            return 0.0
+        return (cost-self.tokens)/self.rate
+
+    def sync(self, remaining: Optional[float], reset_seconds: float, now: float):
+        """
+        Align the bucket with the budget reported by the server.
+        """
+        if remaining is None:
+            return
+        self._refill(now)
+        if self.capacity>0:
+            self.tokens=min(self.tokens, remaining)
+        if remaining<=0:
+            self.blocked_until=max(self.blocked_until, now+reset_seconds)
+
+    def block(self, seconds: float, now: float):
+        self.blocked_until=max(self.blocked_until, now+seconds)
+
+class Slots:
+    """
+    Counting semaphore shared by threads and event loops, handing out free slots first come, first served.
+    Threads block on an event, coroutines await a future resolved on their own loop, so waiting never polls or blocks an event loop.
+    """
+
+    def __init__(self, value: int):
+        self._free=value # slots not held by any caller
+        self._waiters=deque() # threading.Event of a waiting thread or (loop, future) of a waiting coroutine, oldest first
+        self._lock=threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free>0 and not self._waiters:
+                self._free-=1
+                return
+            event=threading.Event()
+            self._waiters.append(event)
+        event.wait() # the releasing caller hands its slot over
+
+    async def aacquire(self):
+        loop=asyncio.get_running_loop()
+        with self._lock:
+            if self._free>0 and not self._waiters:
+                self._free-=1
+                return
+            waiter=(loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters: # not handed a slot yet
+                    self._waiters.remove(waiter)
+                    raise
+            if not waiter[1].cancelled():
+                self.release() # the slot arrived just before the cancellation, pass it on (a cancelled future returns it in _hand_over)
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._free+=1
+                return
+            waiter=self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+            return
+        loop, future=waiter
+        try:
+            loop.call_soon_threadsafe(self._hand_over, future)
+        except RuntimeError: # the waiter's loop is closed
+            self.release()
+
+    def _hand_over(self, future: asyncio.Future):
+        if future.done(): # the waiting coroutine was cancelled meanwhile
+            self.release()
+        else:
+            future.set_result(None)
+
+class RateLimiter:
+    """
+    Process-wide limiter for LLM calls. It combines:
+    - a global, first-come-first-served semaphore bounding the number of in-flight LLM calls (shared by sync and async callers),
+    - token-bucket throttling for requests and tokens per minute, kept in sync with Groq's x-ratelimit-* response headers,
+    - retries with jittered exponential backoff (or the server's retry-after) on 429 responses.
+    The time a call waits for a slot and for budget is recorded as llm_queue_wait_seconds.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int, max_retries: int):
+        self._slots=Slots(max_concurrency) # bounds in-flight calls across threads and event loops
+        self._lock=threading.Lock() # guards both buckets
+        self.requests=TokenBucket(requests_per_minute)
+        self.tokens=TokenBucket(tokens_per_minute)
+        self.max_retries=max_retries
+
+    def _reserve(self, cost: float) -> float:
+        with self._lock:
+            now=time.monotonic()
+            wait=max(self.requests.blocked_until, self.tokens.blocked_until)-now
+            if wait>0:
+                return wait
+            wait=self.requests.reserve(1, now)
+            if wait>0:
+                return wait
+            wait=self.tokens.reserve(cost, now)
+            if wait>0:
+                self.requests.tokens+=1 # give the request slot back, the call is not sent yet
+            return wait
+
+    def update_from_headers(self, headers):
+        """
+        Update the buckets from Groq's rate-limit response headers.
+        """
+        def number(name):
+            value=headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+        with self._lock:
+            now=time.monotonic()
+            self.requests.sync(number("x-ratelimit-remaining-requests"), parse_duration(headers.get("x-ratelimit-reset-requests")), now)
+            self.tokens.sync(number("x-ratelimit-remaining-tokens"), parse_duration(headers.get("x-ratelimit-reset-tokens")), now)
+
+    def _backoff(self, attempt: int, error) -> float:
+        """
+        Delay before retrying a rate-limited call: the server's retry-after (plus jitter) when available, otherwise full-jitter exponential backoff.
+        """
+        response=getattr(error, "response", None)
+        retry_after=parse_duration(response.headers.get("retry-after")) if response is not None else 0.0
+        if retry_after>0:
+            with self._lock:
+                now=time.monotonic()
+                self.requests.block(retry_after, now) # every caller waits, not only the one that hit the limit
+            return retry_after+random.uniform(0, retry_after*0.25)
+        return random.uniform(0, min(Config.LLM_BACKOFF_MAX, Config.LLM_BACKOFF_BASE*(2**attempt)))
+
+    @staticmethod
+    def _is_rate_limited(error) -> bool:
+        return getattr(error, "status_code", None)==429 or getattr(getattr(error, "response", None), "status_code", None)==429
+
+    def call(self, func, cost: float):
+        """
+        Run a blocking LLM call under the limiter.
+        """
+        for attempt in range(self.max_retries+1):
+            start=time.perf_counter()
+            self._slots.acquire()
+            try:
+                while (wait:=self._reserve(cost))>0:
+                    time.sleep(wait)
+                metrics.observe("llm_queue_wait_seconds", time.perf_counter()-start)
+                return func()
+            except Exception as e:
+                if not self._is_rate_limited(e) or attempt==self.max_retries:
+                    raise
+                metrics.increment("llm_rate_limited_total")
+                delay=self._backoff(attempt, e)
+            finally:
+                self._slots.release()
+            time.sleep(delay) # back off without holding a slot
+
+    async def acall(self, func, cost: float):
+        """
+        Await an async LLM call (func returns a coroutine) under the limiter, without blocking the event loop while waiting.
+        """
+        for attempt in range(self.max_retries+1):
+            start=time.perf_counter()
+            await self._slots.aacquire()
+            try:
+                while (wait:=self._reserve(cost))>0:
+                    await asyncio.sleep(wait)
+                metrics.observe("llm_queue_wait_seconds", time.perf_counter()-start)
+                return await func()
+            except Exception as e:
+                if not self._is_rate_limited(e) or attempt==self.max_retries:
+                    raise
+                metrics.increment("llm_rate_limited_total")
+                delay=self._backoff(attempt, e)
+            finally:
+                self._slots.release()
+            await asyncio.sleep(delay)
+
+rate_limiter=RateLimiter(
+    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+    requests_per_minute=Config.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=Config.LLM_TOKENS_PER_MINUTE,
+    max_retries=Config.LLM_MAX_RETRIES
+) # process-wide limiter shared by every LLM client
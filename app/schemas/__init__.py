@@ -3,6 +3,6 @@ from app.schemas.json_schema import ExtractionSchema
 from app.schemas.json_schema import QnASchema
 from app.schemas.json_schema import SummarizationSchema
 from app.schemas.json_schema import InsightSchema
-from app.schemas.schemas import AgentResponse
+from app.schemas.schemas import AgentResponse, SessionResponse
 
-__all__ = ["ComparisonSchema", "ExtractionSchema", "QnASchema", "SummarizationSchema", "InsightSchema", "AgentResponse"]
+__all__ = ["ComparisonSchema", "ExtractionSchema", "QnASchema", "SummarizationSchema", "InsightSchema", "AgentResponse", "SessionResponse"]
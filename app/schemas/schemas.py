@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 class BaseSchema(BaseModel):
     answer: str
@@ -23,3 +23,13 @@ class AgentResponse(BaseModel):
     status: int
     message: str
     data: Dict
+
+class SessionResponse(BaseModel):
+    session_id: str
+    status: str
+    files: List[str]
+    documents: List[Dict]
+    chunks: int
+    error: Optional[str]
+    created_at: float
+    expires_at: float
@@ -0,0 +1,17 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from app.config.config import Config
+
+# Bounded executor for CPU-bound or blocking work (PDF parsing, embedding, FAISS, file I/O) issued from async code paths.
+blocking_executor=ThreadPoolExecutor(max_workers=Config.BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking function on the bounded executor and await its result, so the event loop stays free to serve other requests.
+    The current context (contextvars) is propagated to the worker thread.
+    """
+    loop=asyncio.get_running_loop()
+    context=contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, functools.partial(context.run, func, *args, **kwargs))
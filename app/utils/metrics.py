@@ -0,0 +1,126 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+LATENCY_BUCKETS=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0) # histogram bounds of *_seconds metrics
+SIZE_BUCKETS=tuple(m*10**e for e in range(0, 10) for m in (1, 2, 5)) # histogram bounds of counts, tokens and bytes (1 to 5e9)
+
+def buckets_for(name: str) -> Tuple[float, ...]:
+    return LATENCY_BUCKETS if name.endswith("_seconds") else SIZE_BUCKETS
+
+class Metrics:
+    """
+    A small thread-safe, in-process metrics registry.
+    Counters accumulate monotonically increasing values (e.g. number of model loads), gauges hold the last set value (e.g. bytes held by the session index store), and observations keep a count, sum, max and histogram of measured values (e.g. seconds spent loading a model).
+    Metrics can carry labels, which are passed as keyword arguments and become part of the metric key. prometheus() renders everything in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock=threading.Lock() # guards all the metric dictionaries below
+        self._counters: Dict[Tuple, float]=defaultdict(float) # counter values keyed by (name, labels)
+        self._gauges: Dict[Tuple, float]={} # gauge values keyed by (name, labels)
+        self._observations: Dict[Tuple, Dict[str, float]]={} # count/sum/max of observations keyed by (name, labels)
+        self._histograms: Dict[Tuple, list]={} # per-bucket observation counts keyed by (name, labels), the last slot counts values above the largest bound
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items()))) # labels are sorted so that the same label set always maps to the same key
+
+    @staticmethod
+    def _format(key: Tuple) -> str:
+        name, labels=key
+        if not labels:
+            return name
+        return name+"{"+",".join(f'{k}="{v}"' for k, v in labels)+"}" # render as name{label="value"} for readability
+
+    def increment(self, name: str, value: float=1.0, **labels):
+        """
+        Increase the counter with the given name (and labels) by value.
+        """
+        with self._lock:
+            self._counters[self._key(name, labels)]+=value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Record a single observation (e.g. a latency in seconds) for the given name (and labels).
+        """
+        key=self._key(name, labels)
+        buckets=buckets_for(name)
+        with self._lock:
+            obs=self._observations.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+            obs["count"]+=1
+            obs["sum"]+=value
+            obs["max"]=max(obs["max"], value)
+            self._histograms.setdefault(key, [0]*(len(buckets)+1))[bisect.bisect_left(buckets, value)]+=1
+
+    def set(self, name: str, value: float, **labels):
+        """
+        Set the gauge with the given name (and labels) to value.
+        """
+        with self._lock:
+            self._gauges[self._key(name, labels)]=value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Observe the seconds spent in the with block under name (and labels), also when the block raises.
+        """
+        start=time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter()-start, **labels)
+
+    def snapshot(self) -> Dict:
+        """
+        Return a copy of the current counters and observations, keyed by their rendered names.
+        """
+        with self._lock:
+            return {
+                "counters": {self._format(k): v for k, v in self._counters.items()},
+                "gauges": {self._format(k): v for k, v in self._gauges.items()},
+                "observations": {self._format(k): dict(v) for k, v in self._observations.items()}
+            }
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: str="") -> str:
+        rendered=[f'{k}="{v}"' for k, v in labels]+([extra] if extra else [])
+        return "{"+",".join(rendered)+"}" if rendered else ""
+
+    def prometheus(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format (version 0.0.4): counters, gauges, and observations as histograms (cumulative buckets, _sum and _count).
+        """
+        with self._lock:
+            counters=dict(self._counters)
+            gauges=dict(self._gauges)
+            observations={k: dict(v) for k, v in self._observations.items()}
+            histograms={k: list(v) for k, v in self._histograms.items()}
+        lines=[]
+        typed=set()
+        def header(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), obs in sorted(observations.items()):
+            header(name, "histogram")
+            cumulative=0
+            for bound, count in zip(buckets_for(name)+(float("inf"),), histograms[(name, labels)]):
+                cumulative+=count
+                le="+Inf" if bound==float("inf") else f"{bound:g}"
+                bucket_labels=self._labels(labels, f'le="{le}"')
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {obs['sum']}")
+            lines.append(f"{name}_count{self._labels(labels)} {obs['count']}")
+        return "\n".join(lines)+"\n"
+
+metrics=Metrics() # process-wide metrics registry shared by all modules
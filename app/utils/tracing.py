@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from app.config.config import Config
+from app.utils.metrics import metrics
+
+_current: contextvars.ContextVar=contextvars.ContextVar("current_span", default=None) # innermost open span of the running request
+_exporter=ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export") # single background writer, exporting never delays a request
+
+class Trace:
+    """
+    The spans of one request (or background job), collected while they end and exported together once the root span ends.
+    """
+
+    def __init__(self):
+        self.trace_id=uuid.uuid4().hex
+        self.spans: List[Dict]=[]
+        self._lock=threading.Lock() # spans end on the event loop and on executor threads
+
+    def add(self, span: Dict):
+        with self._lock:
+            self.spans.append(span)
+
+class Span:
+    """
+    A timed stage of a request with attributes (e.g. file, page and chunk counts, prompt tokens, task). Child spans share the trace of their parent.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict):
+        self.name=name
+        self.trace=parent.trace if parent is not None else Trace()
+        self.parent_id=parent.span_id if parent is not None else None
+        self.span_id=uuid.uuid4().hex[:16]
+        self.attributes=dict(attributes)
+        self.status="ok"
+        self.start=time.time()
+        self._started=time.perf_counter()
+        self.duration=0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Open a span for the with block, as a child of the current span (the context is propagated to the blocking executor by run_blocking, and to graph nodes by LangGraph).
+    A span without a parent starts a new trace; when it ends, the trace is exported (Config.TRACE_EXPORT) and logged as a slow request if it took at least Config.SLOW_REQUEST_SECONDS.
+    """
+    parent=_current.get()
+    current=Span(name, parent, attributes)
+    token=_current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status="error"
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            pass # closed from another context, e.g. an abandoned streaming response
+        current.duration=time.perf_counter()-current._started
+        current.trace.add(current.to_dict())
+        if parent is None:
+            _finish(current)
+
+def traced(name: Optional[str]=None, **attributes):
+    """
+    Decorator running a sync or async function (or async generator) in a span (named after the function by default). The wrapper keeps the signature, so it can decorate FastAPI endpoints.
+    """
+    def decorate(func):
+        span_name=name or func.__name__
+        if inspect.isasyncgenfunction(func): # e.g. the event stream of a streaming response, traced until it is exhausted
+            @functools.wraps(func)
+            async def agenwrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return agenwrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def awrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def set_attributes(**attributes):
+    """
+    Add attributes to the current span, if any.
+    """
+    current=_current.get()
+    if current is not None:
+        current.set(**attributes)
+
+def current_trace_id() -> Optional[str]:
+    current=_current.get()
+    return current.trace.trace_id if current is not None else None
+
+def _finish(root: Span):
+    metrics.observe("request_seconds", root.duration, request=root.name, status=root.status)
+    record={**root.to_dict(), "spans": sorted(root.trace.spans, key=lambda s: s["start"])}
+    if Config.TRACE_EXPORT!="none":
+        _exporter.submit(_export, record)
+    if Config.SLOW_REQUEST_SECONDS>0 and root.duration>=Config.SLOW_REQUEST_SECONDS:
+        metrics.increment("slow_requests_total", request=root.name)
+        _exporter.submit(_log_slow, record)
+
+def _append(path, record: Dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, default=str)+"\n")
+
+def _export(record: Dict):
+    """
+    Export a finished trace: append it to Config.TRACE_FILE ("file") or post it to Config.TRACE_COLLECTOR_URL ("http").
+    """
+    try:
+        if Config.TRACE_EXPORT=="http":
+            import httpx
+            httpx.post(Config.TRACE_COLLECTOR_URL, json=json.loads(json.dumps(record, default=str)), timeout=5).raise_for_status()
+        else:
+            _append(Config.TRACE_PATH, record)
+    except Exception as e:
+        print(f"Exporting trace {record['trace_id']} failed: {e}")
+
+def _log_slow(record: Dict):
+    """
+    Write a structured slow-request entry: the request, its total duration and attributes, and the duration of every stage, to stdout and Config.SLOW_REQUEST_LOG_FILE.
+    """
+    entry={
+        "event": "slow_request",
+        "trace_id": record["trace_id"],
+        "name": record["name"],
+        "duration": round(record["duration"], 3),
+        "status": record["status"],
+        "attributes": record["attributes"],
+        "stages": [{"name": s["name"], "duration": round(s["duration"], 3), "attributes": s["attributes"]} for s in record["spans"] if s["span_id"]!=record["span_id"]]
+    }
+    print(json.dumps(entry, default=str))
+    try:
+        _append(Config.SLOW_REQUEST_LOG_PATH, entry)
+    except OSError as e:
+        print(f"Writing the slow request log failed: {e}")
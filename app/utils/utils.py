@@ -1,19 +1,47 @@
 import shutil
 import os
+import hashlib
+from typing import Iterable, List
 from app.config.config import Config
+from app.db.session_store import session_index_store
 
 def cleanup_session(session_id: str):
     """
-    Deletes uploaded files and vector DB for a session.
+    Deletes uploaded files and vector DB for a session, both from memory and from disk.
     """
-    uploads_path=os.path.join(Config.UPLOAD_DIR, session_id) # get he upload dir path
+    session_index_store.discard(session_id) # drop the in-memory index of the session
+    session_index_store.wait_for_persist(session_id) # let a pending background write finish, so it does not recreate the directory after removal
+
+    uploads_path=os.path.join(Config.UPLOAD_PATH, session_id) # get he upload dir path
     if os.path.exists(uploads_path):
         shutil.rmtree(uploads_path) # remove the uploaded files for the session to free up space
 
     # get vector DB path
     vector_db_path=os.path.join(
-        Config.VECTOR_DB_DIR,
+        Config.VECTOR_DB_PATH,
         f"{session_id}_vector_db"
     )
     if os.path.exists(vector_db_path):
         shutil.rmtree(vector_db_path) # remove the vector database for the session to free up space
+
+def file_hash(path: str) -> str:
+    """
+    Return the sha256 hash of a file's contents, read in 1 MB blocks.
+    """
+    digest=hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024*1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_hashes(file_paths: List[str]) -> List[str]:
+    """
+    Return the sha256 hashes of the given files, in order.
+    """
+    return [file_hash(path) for path in file_paths]
+
+def fingerprint_hashes(hashes: Iterable[str]) -> str:
+    """
+    Fingerprint of a set of files given their content hashes: the hash of the sorted content hashes, independent of file names and upload order.
+    """
+    return hashlib.sha256("".join(sorted(hashes)).encode("utf-8")).hexdigest()
@@ -0,0 +1,101 @@
+import argparse
+import random
+from pathlib import Path
+from typing import Dict, List
+
+CORPUS_DIR=Path(__file__).resolve().parent/"corpus"
+
+SIZES: Dict[str, Dict[str, int]]={ # files per format and pages per file of each corpus size
+    "small": {"txt": 2, "pdf": 1, "pages": 5},
+    "medium": {"txt": 3, "pdf": 3, "pages": 40},
+    "large": {"txt": 4, "pdf": 4, "pages": 200}
+}
+
+TOPICS=["revenue", "latency", "customer churn", "supply chain", "compliance", "hiring", "pricing", "infrastructure", "marketing", "research"]
+VERBS=["increased", "decreased", "stabilized", "doubled", "was reviewed", "was audited", "improved", "declined"]
+WORDS=("the of and to in for on with as by at from that this these report quarter region team policy product "
+       "analysis result metric plan budget review growth risk customer market system process data model").split()
+
+def paragraph(rng: random.Random, doc: int, page: int) -> str:
+    """
+    A paragraph with a fact sentence (topic, figure, period) followed by filler text, so retrieval has something specific to find.
+    """
+    topic=rng.choice(TOPICS)
+    fact=f"In document {doc}, page {page}, {topic} {rng.choice(VERBS)} by {rng.randint(1, 90)} percent in Q{rng.randint(1, 4)} {rng.randint(2015, 2025)} (ref ID-{doc:02d}-{page:04d})."
+    filler=" ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 110)))
+    return f"{fact} {filler.capitalize()}."
+
+def page_text(rng: random.Random, doc: int, page: int) -> List[str]:
+    return [paragraph(rng, doc, page) for _ in range(4)] # about 400 words per page
+
+def write_txt(path: Path, pages: List[List[str]]):
+    path.write_text("\n\n".join("\n\n".join(paragraphs) for paragraphs in pages), encoding="utf-8")
+
+def _wrap(text: str, width: int=95) -> List[str]:
+    lines, line=[], ""
+    for word in text.split():
+        if len(line)+len(word)+1>width:
+            lines.append(line)
+            line=word
+        else:
+            line=f"{line} {word}".strip()
+    return lines+[line] if line else lines
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """
+    Write a minimal text PDF (Helvetica, one content stream per page) without a PDF library, readable by pypdf.
+    """
+    objects: List[bytes]=[]
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+    catalog=add(b"") # placeholders, filled in once the page ids are known
+    page_tree=add(b"")
+    font=add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids=[]
+    for paragraphs in pages:
+        lines=[line for text in paragraphs for line in _wrap(text)+[""]]
+        escaped=[line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream=("BT /F1 9 Tf 11 TL 40 800 Td "+" ".join(f"({line}) '" for line in escaped)+" ET").encode("latin-1")
+        content=add(b"<< /Length %d >>\nstream\n" % len(stream)+stream+b"\nendstream")
+        page_ids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (page_tree, font, content)))
+    objects[catalog-1]=b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+    objects[page_tree-1]=b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids))
+    out=bytearray(b"%PDF-1.4\n")
+    offsets=[]
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out+=b"%d 0 obj\n" % number+body+b"\nendobj\n"
+    xref=len(out)
+    out+=b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects)+1)
+    out+=b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out+=b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects)+1, catalog, xref)
+    path.write_bytes(bytes(out))
+
+def generate(size: str, seed: int=0) -> List[Path]:
+    """
+    Generate the corpus of the given size (deterministic for a seed) into benchmarks/corpus/<size>, reusing it if it already exists. Returns the file paths.
+    """
+    spec=SIZES[size]
+    target=CORPUS_DIR/size
+    expected=[target/f"doc_{i}.txt" for i in range(spec["txt"])]+[target/f"doc_{spec['txt']+i}.pdf" for i in range(spec["pdf"])]
+    if all(path.exists() for path in expected):
+        return expected
+    target.mkdir(parents=True, exist_ok=True)
+    rng=random.Random(f"{seed}-{size}")
+    for doc, path in enumerate(expected):
+        pages=[page_text(rng, doc, page) for page in range(1, spec["pages"]+1)]
+        if path.suffix==".pdf":
+            write_pdf(path, pages)
+        else:
+            write_txt(path, pages)
+    return expected
+
+if __name__=="__main__":
+    parser=argparse.ArgumentParser(description="Generate the synthetic benchmark corpus.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma separated corpus sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    args=parser.parse_args()
+    for size in args.sizes.split(","):
+        paths=generate(size, args.seed)
+        print(f"{size}: {len(paths)} files, {sum(p.stat().st_size for p in paths)/1e3:.0f} kB in {CORPUS_DIR/size}")
@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TASK_KEYWORDS=[("summarize", ("summar", "overview", "brief")), ("compare", ("compare", "difference", "versus")), ("extract", ("extract", "list all", "pull out")), ("insight", ("insight", "trend", "implication"))] # checked in order, qna otherwise
+
+class Settings:
+    """
+    Simulated LLM timing: a fixed latency until the first token, then tokens at a fixed rate.
+    """
+    latency=0.3 # seconds until the first token
+    tokens_per_second=250.0 # completion throughput
+    answer_words=120 # length of generated answers
+
+app=FastAPI(title="Fake Groq")
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text)//4) # the usual 4 characters per token estimate
+
+def classify(prompt: str) -> str:
+    """
+    Answer of the tool selector prompt: the task is picked from keywords of the user query, so benchmarks control the routing with their queries.
+    """
+    query=prompt.rsplit("USER_QUERY:", 1)[-1].lower()
+    for task, keywords in TASK_KEYWORDS:
+        if any(keyword in query for keyword in keywords):
+            return task
+    return "qna"
+
+def sample(schema: Dict, definitions: Dict, name: str="") -> object:
+    """
+    Build an instance of a JSON schema (the response_format of structured calls): objects get all their properties, strings a filler answer with a citation.
+    """
+    if "$ref" in schema:
+        return sample(definitions[schema["$ref"].rsplit("/", 1)[-1]], definitions, name)
+    if "anyOf" in schema:
+        return sample(next(s for s in schema["anyOf"] if s.get("type")!="null"), definitions, name)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind=schema.get("type", "string")
+    if kind=="object":
+        return {key: sample(value, definitions, key) for key, value in schema.get("properties", {}).items()}
+    if kind=="array":
+        return [sample(schema.get("items", {}), definitions, name)]
+    if kind in ("integer", "number"):
+        return 1
+    if kind=="boolean":
+        return True
+    return filler(name)
+
+def filler(name: str) -> str:
+    words=" ".join(f"finding{i}" for i in range(Settings.answer_words))
+    if name=="report":
+        return f"# Extraction Report\n\n| Field | Value |\n|---|---|\n| summary | {words} |\n"
+    return f"Answer: {words}. \n Citations: [source: doc_0.txt, page: 1]"
+
+def completion_text(body: Dict) -> str:
+    prompt="\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+    if "task classification (tool-selection) router" in prompt:
+        return classify(prompt)
+    response_format=body.get("response_format") or {}
+    if response_format.get("type")=="json_schema":
+        schema=response_format["json_schema"]["schema"]
+        return json.dumps(sample(schema, schema.get("$defs", {})))
+    return json.dumps({"answer": filler("answer"), "report": filler("report")}) # unstructured (streaming) calls: valid for every answer node
+
+def usage(body: Dict, text: str) -> Dict:
+    prompt_tokens=sum(count_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+    completion_tokens=count_tokens(text)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens+completion_tokens}
+
+def pieces(text: str) -> List[str]:
+    return re.findall(r".{1,4}", text, flags=re.S) # one piece per (estimated) token
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    """
+    OpenAI / Groq compatible chat completions, streaming (server-sent events) or not.
+    """
+    body=await request.json()
+    text=completion_text(body)
+    completion_id=f"chatcmpl-{uuid.uuid4().hex}"
+    created=int(time.time())
+    model=body.get("model", "fake")
+    await asyncio.sleep(Settings.latency)
+    if not body.get("stream"):
+        await asyncio.sleep(count_tokens(text)/Settings.tokens_per_second)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop", "logprobs": None}],
+            "usage": usage(body, text)
+        })
+
+    async def events():
+        chunk={"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}]})}\n\n"
+        for piece in pieces(text):
+            await asyncio.sleep(1/Settings.tokens_per_second)
+            yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]})}\n\n"
+        yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'x_groq': {'id': completion_id, 'usage': usage(body, text)}})}\n\n"
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+def main():
+    import uvicorn
+    parser=argparse.ArgumentParser(description="Local stand-in for the Groq API, for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=Settings.latency, help="seconds until the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=Settings.tokens_per_second, help="completion token throughput")
+    parser.add_argument("--answer-words", type=int, default=Settings.answer_words, help="length of generated answers")
+    args=parser.parse_args()
+    Settings.latency, Settings.tokens_per_second, Settings.answer_words=args.latency, args.tokens_per_second, args.answer_words
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,316 @@
+import argparse
+import gc
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from app.config.config import Config
+from app.db import embedding_cache
+from app.db.ann_index import build_index, configure_search, index_description
+from app.db.session_store import session_index_store
+from app.db.vector_db import VectorDB
+from app.graph.nodes.retrieve import retrieve_node
+from app.llms import embeddings
+from benchmarks.corpus import TOPICS, VERBS, WORDS
+
+RESULTS_DIR=Path(__file__).resolve().parent/"results"
+DEFAULTS={name: getattr(Config, name) for name in ("VECTOR_INDEX", "VECTOR_INDEX_STORAGE", "IVF_NPROBE", "HNSW_EF_SEARCH")} # configured settings, the benchmark overrides them per configuration
+
+CONFIGS: Dict[str, Tuple[str, str]]={ # name -> (Config.VECTOR_INDEX, Config.VECTOR_INDEX_STORAGE), the index types VectorDB can build
+    "flat": ("flat", "flat"),
+    "flat-sq8": ("flat", "sq8"),
+    "ivf": ("ivf", "flat"),
+    "ivf-sq8": ("ivf", "sq8"),
+    "ivf-pq": ("ivf", "pq"),
+    "hnsw": ("hnsw", "flat"),
+    "hnsw-sqfp16": ("hnsw", "sqfp16"),
+    "hnsw-sq8": ("hnsw", "sq8")
+}
+BACKENDS: Dict[str, Tuple[str, bool]]={ # name -> (Config.EMBED_BACKEND, Config.EMBED_ONNX_QUANTIZE)
+    "torch": ("torch", False),
+    "onnx": ("onnx", False),
+    "onnx-int8": ("onnx", True)
+}
+MODES=("dense", "hybrid") # Config.RETRIEVAL_MODE
+SWEEPS={"ivf": ("IVF_NPROBE", [1, 4, 16, 64]), "hnsw": ("HNSW_EF_SEARCH", [16, 64, 256])} # recall / latency knob of each approximate index type
+PARTS=("scaling", "comparison")
+
+def corpus(n: int, d: int, seed: int=0, clusters: int=256) -> np.ndarray:
+    """
+    Synthetic, normalized embedding-like vectors for the index scaling sweep: a mixture of gaussian clusters (documents on related topics are close), generated in blocks to bound memory.
+    """
+    rng=np.random.default_rng(seed)
+    centers=rng.standard_normal((clusters, d)).astype(np.float32)
+    vectors=np.empty((n, d), dtype=np.float32)
+    for start in range(0, n, 100000):
+        end=min(n, start+100000)
+        block=centers[rng.integers(0, clusters, end-start)]+0.6*rng.standard_normal((end-start, d)).astype(np.float32)
+        vectors[start:end]=block/np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+def queries(vectors: np.ndarray, count: int, seed: int=1) -> np.ndarray:
+    """
+    Queries near stored chunks (a chunk plus noise), like real questions about the documents.
+    """
+    rng=np.random.default_rng(seed)
+    d=vectors.shape[1]
+    picked=vectors[rng.integers(0, len(vectors), count)]+(0.5/np.sqrt(d))*rng.standard_normal((count, d)).astype(np.float32) # noise of norm about 0.5
+    return (picked/np.linalg.norm(picked, axis=1, keepdims=True)).astype(np.float32)
+
+def chunks(n: int, seed: int=0) -> Tuple[List[Document], List[str]]:
+    """
+    Synthetic chunks like the ingested ones (see benchmarks.corpus): a fact sentence (topic, change, period and a reference id unique to the chunk) followed by filler text, about 100 words each, 4 per page and 200 pages per document.
+    Returns the chunks and, per chunk, a question about its fact.
+    """
+    rng=random.Random(seed)
+    docs, questions=[], []
+    for i in range(n):
+        doc, page=i//800, i%800//4
+        topic, period, ref=rng.choice(TOPICS), f"Q{rng.randint(1, 4)} {rng.randint(2015, 2025)}", f"ID-{doc:02d}-{page:04d}-{i%4}"
+        fact=f"In {period}, {topic} {rng.choice(VERBS)} by {rng.randint(1, 90)} percent (ref {ref})."
+        filler=" ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 110)))
+        docs.append(Document(page_content=f"{fact} {filler.capitalize()}.", metadata={"doc_id": f"doc-{doc}", "source": f"doc-{doc}.txt", "page": page}))
+        questions.append(f"What happened to {topic} in {period} according to {ref}?")
+    return docs, questions
+
+def rss_mb() -> Optional[float]:
+    """
+    Resident memory of this process (VmRSS) from /proc, None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))/1024
+    except (OSError, StopIteration):
+        return None
+
+def use_backend(backend: str, cache_file: Path):
+    """
+    Switch the embedding backend, with an embedding cache of its own: the corpus is embedded once, the indexes built from it read the vectors from the cache.
+    """
+    Config.EMBED_BACKEND, Config.EMBED_ONNX_QUANTIZE=BACKENDS[backend]
+    Config.EMBED_CACHE_ENABLED=True
+    Config.EMBED_CACHE_PATH=cache_file
+    Config.EMBED_CACHE_MAX_MB=max(Config.EMBED_CACHE_MAX_MB, 8192)
+    embeddings._models.clear() # the model registry is keyed by model name only, drop the model of the previous backend
+    embedding_cache._cache=None # torch and unquantized onnx vectors share a cache key, so each backend gets a fresh cache
+
+def build(session_id: str, docs: List[Document]) -> Tuple[VectorDB, float, Optional[float]]:
+    """
+    Ingest the chunks into a VectorDB and publish it (in memory only) like ingestion does. Returns the published VectorDB, the build seconds and the resident memory it added.
+    """
+    gc.collect()
+    before=rss_mb()
+    started=time.perf_counter()
+    vector_db=VectorDB(embed_model_name=Config.EMBED_MODEL, session_id=session_id)
+    vector_db.add_documents(docs)
+    vector_db.publish(persist="none")
+    build_seconds=time.perf_counter()-started
+    gc.collect()
+    after=rss_mb()
+    return vector_db, build_seconds, after-before if before is not None and after is not None else None
+
+def retrieve(session_id: str, questions: List[str]) -> Tuple[List[List[str]], np.ndarray]:
+    """
+    Run the questions through the retrieve node of the graph (session lookup, query embedding, dense or hybrid search), one at a time like requests do. Returns the chunk ids found per question and the latencies in ms.
+    """
+    retrieve_node({"session_id": session_id, "query": questions[0]}) # warm up
+    found, latencies=[], []
+    for question in questions:
+        started=time.perf_counter()
+        docs=retrieve_node({"session_id": session_id, "query": question})["documents"]
+        latencies.append(time.perf_counter()-started)
+        found.append([doc.metadata["chunk_id"] for doc in docs])
+    return found, np.asarray(latencies)*1000
+
+def recall_at_k(found, truth, k: int) -> float:
+    return float(np.mean([len(set(f[:k])&set(t[:k]))/k for f, t in zip(found, truth)]))
+
+def measure(index, xq: np.ndarray, truth: np.ndarray, k: int, single: int) -> Dict:
+    """
+    Recall@k against exact search, batched throughput and single query latency percentiles (retrieval issues one query at a time).
+    """
+    started=time.perf_counter()
+    _, found=index.search(xq, k)
+    batch_seconds=time.perf_counter()-started
+    latencies=[]
+    for q in xq[:single]:
+        started=time.perf_counter()
+        index.search(q[None, :], k)
+        latencies.append(time.perf_counter()-started)
+    latencies=np.asarray(latencies)*1000
+    return {
+        "recall": recall_at_k(found, truth, k),
+        "qps": len(xq)/batch_seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99))
+    }
+
+def scale_size(n: int, d: int, k: int, nq: int, single: int, names: List[str]) -> List[Dict]:
+    """
+    Index scaling sweep for one corpus size: every index configuration is built with build_index (as VectorDB does) from synthetic vectors, so sizes up to a million chunks can be measured without embedding them.
+    """
+    vectors=corpus(n, d)
+    xq=queries(vectors, nq)
+    exact=faiss.IndexFlatL2(d)
+    exact.add(vectors)
+    _, truth=exact.search(xq, k)
+    del exact
+    for name, value in DEFAULTS.items():
+        setattr(Config, name, value)
+    auto=index_description(n, d) or "Flat" # what VectorDB builds for this size with the configured settings
+    rows=[]
+    for name in names:
+        kind, storage=CONFIGS[name]
+        Config.VECTOR_INDEX, Config.VECTOR_INDEX_STORAGE=kind, storage
+        description=index_description(n, d)
+        gc.collect()
+        before=rss_mb()
+        started=time.perf_counter()
+        if description is None:
+            index=faiss.IndexFlatL2(d) # the exact index of the langchain FAISS store
+            index.add(vectors)
+        else:
+            index=build_index(vectors, description)
+        build_seconds=time.perf_counter()-started
+        gc.collect()
+        after=rss_mb()
+        memory_mb=len(faiss.serialize_index(index))/1e6
+        setting, values=SWEEPS.get(kind, (None, [None]))
+        for value in values:
+            if setting is not None:
+                setattr(Config, setting, value)
+                configure_search(index)
+            row={
+                "chunks": n, "config": name, "description": description or "Flat", "auto": (description or "Flat")==auto, "build_s": build_seconds,
+                "index_mb": memory_mb, "rss_mb": after-before if before is not None and after is not None else None, "param": f"{setting.lower()}={value}" if setting else "-"
+            }
+            row.update(measure(index, xq, truth, k, single))
+            rows.append(row)
+            print(f"{n:>8} {name:<12} {row['param']:<18} recall@{k}={row['recall']:.3f} p50={row['p50_ms']:.2f}ms build={build_seconds:.1f}s index={memory_mb:.1f}MB")
+        del index
+    return rows
+
+def scaling_table(rows: List[Dict], k: int) -> str:
+    """
+    Markdown table of the scaling sweep, one row per (corpus size, index configuration, search parameter). Rows marked * are what Config.VECTOR_INDEX=auto builds for the size.
+    """
+    lines=[f"| chunks | config | index | param | recall@{k} | p50 ms | p99 ms | QPS (batch) | build s | RSS MB | index MB |", "|---:|---|---|---|---:|---:|---:|---:|---:|---:|---:|"]
+    for r in rows:
+        rss="-" if r["rss_mb"] is None else f"{r['rss_mb']:.1f}"
+        lines.append(f"| {r['chunks']} | {r['config']}{' *' if r['auto'] else ''} | {r['description']} | {r['param']} | {r['recall']:.3f} | {r['p50_ms']:.2f} | {r['p99_ms']:.2f} | {r['qps']:.0f} | {r['build_s']:.1f} | {rss} | {r['index_mb']:.1f} |")
+    return "\n".join(lines)
+
+def compare_size(n: int, k: int, nq: int, names: List[str], backends: List[str], modes: List[str], cache_dir: Path) -> Tuple[List[Dict], List[Dict]]:
+    """
+    End-to-end comparison for one corpus size: the chunks are embedded with every backend and ingested into a VectorDB per retrieval mode and index configuration, and the questions go through the retrieve node.
+    """
+    docs, questions=chunks(n)
+    picked=random.Random(1).sample(range(n), min(nq, n))
+    xq=[questions[i] for i in picked]
+    Config.RETRIEVAL_POOL_K=k
+    rows, embedding=[], []
+    for backend in backends:
+        use_backend(backend, cache_dir/f"{backend}-{n}.sqlite3") # corpora share their first chunks, a cache per size keeps the embedding time complete
+        vector_db=VectorDB(embed_model_name=Config.EMBED_MODEL, session_id=f"bench-embed-{backend}") # loads the model
+        started=time.perf_counter()
+        vector_db.embed_texts([doc.page_content for doc in docs]) # fills the cache of the backend
+        seconds=time.perf_counter()-started
+        embedding.append({"chunks": n, "backend": backend, "embed_s": seconds, "chunks_per_s": n/seconds})
+        print(f"{n:>8} {backend:<10} embedded in {seconds:.1f}s ({n/seconds:.0f} chunks/s)")
+        d=len(vector_db.embed_model.embed_query("dimension"))
+        for mode in modes:
+            Config.RETRIEVAL_MODE=mode
+            for name, value in DEFAULTS.items():
+                setattr(Config, name, value)
+            auto=index_description(n, d) or "Flat" # what VectorDB builds for this size with the configured settings
+            truth=None
+            for name in ["flat"]+[name for name in names if name!="flat"]: # the exact index is the recall reference
+                kind, storage=CONFIGS[name]
+                Config.VECTOR_INDEX, Config.VECTOR_INDEX_STORAGE=kind, storage
+                description=index_description(n, d) or "Flat"
+                session_id=f"bench-{backend}-{mode}-{name}-{n}"
+                published, build_seconds, memory_mb=build(session_id, docs)
+                ids=published.chunk_ids() # index order is ingestion order
+                targets=[ids[i] for i in picked] # the chunk each question was written about
+                setting, values=SWEEPS.get(kind, (None, [None]))
+                for value in values:
+                    if setting is not None:
+                        setattr(Config, setting, value)
+                        configure_search(published.vector_db.index)
+                    found, latencies=retrieve(session_id, xq)
+                    truth=truth or found
+                    if name not in names:
+                        continue
+                    row={
+                        "chunks": n, "backend": backend, "mode": mode, "config": name, "description": description, "auto": description==auto,
+                        "param": f"{setting.lower()}={value}" if setting else "-",
+                        "recall": recall_at_k(found, truth, k),
+                        "hit": float(np.mean([target in f for target, f in zip(targets, found)])),
+                        "p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99)), "qps": 1000/float(np.mean(latencies)),
+                        "build_s": build_seconds, "index_mb": published.nbytes()/1e6, "rss_mb": memory_mb
+                    }
+                    rows.append(row)
+                    print(f"{n:>8} {backend:<10} {mode:<7} {name:<12} {row['param']:<18} recall@{k}={row['recall']:.3f} hit@{k}={row['hit']:.3f} p50={row['p50_ms']:.2f}ms build={build_seconds:.1f}s rss={memory_mb or 0:.1f}MB")
+                session_index_store.discard(session_id)
+                del published
+    return rows, embedding
+
+def comparison_table(rows: List[Dict], embedding: List[Dict], k: int) -> str:
+    """
+    Markdown tables of the end-to-end comparison: the embedding throughput of each backend, and one row per (corpus size, backend, retrieval mode, index configuration, search parameter). Rows marked * are what Config.VECTOR_INDEX=auto builds for the size.
+    Recall is measured against the exact index with the same backend and mode; hit is the share of questions whose chunk is retrieved. RSS MB is the resident memory the session added, index MB the estimate the session index store budgets with.
+    """
+    lines=["| chunks | backend | embed s | chunks/s |", "|---:|---|---:|---:|"]
+    for r in embedding:
+        lines.append(f"| {r['chunks']} | {r['backend']} | {r['embed_s']:.1f} | {r['chunks_per_s']:.0f} |")
+    lines+=["", f"| chunks | backend | mode | config | index | param | recall@{k} | hit@{k} | p50 ms | p99 ms | QPS | build s | RSS MB | index MB |", "|---:|---|---|---|---|---|---:|---:|---:|---:|---:|---:|---:|---:|"]
+    for r in rows:
+        rss="-" if r["rss_mb"] is None else f"{r['rss_mb']:.1f}"
+        lines.append(f"| {r['chunks']} | {r['backend']} | {r['mode']} | {r['config']}{' *' if r['auto'] else ''} | {r['description']} | {r['param']} | {r['recall']:.3f} | {r['hit']:.3f} | {r['p50_ms']:.2f} | {r['p99_ms']:.2f} | {r['qps']:.0f} | {r['build_s']:.1f} | {rss} | {r['index_mb']:.1f} |")
+    return "\n".join(lines)
+
+def main():
+    parser=argparse.ArgumentParser(description="Retrieval benchmark in two parts. scaling: build time, memory, query latency and recall@k of the vector index configurations VectorDB supports, on synthetic vectors up to a million chunks. comparison: the same for embedding backends and retrieval modes, with real embeddings measured through VectorDB and the retrieve node on smaller synthetic corpora.")
+    parser.add_argument("--parts", default=",".join(PARTS), help=f"comma separated parts to run ({', '.join(PARTS)})")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="scaling: comma separated corpus sizes in chunks (up to 1000000)")
+    parser.add_argument("--dim", type=int, default=384, help="scaling: vector dimension (384 for all-MiniLM-L6-v2)")
+    parser.add_argument("--batch-queries", type=int, default=1000, help="scaling: queries for recall and batched throughput")
+    parser.add_argument("--compare-sizes", default="1000,10000", help="comparison: comma separated corpus sizes in chunks (every chunk is embedded once per backend)")
+    parser.add_argument("--backends", default=Config.EMBED_BACKEND+("-int8" if Config.EMBED_BACKEND=="onnx" and Config.EMBED_ONNX_QUANTIZE else ""), help=f"comparison: comma separated embedding backends ({', '.join(BACKENDS)}), defaults to the configured one")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comparison: comma separated retrieval modes ({', '.join(MODES)})")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"comma separated index configurations ({', '.join(CONFIGS)})")
+    parser.add_argument("--k", type=int, default=Config.RETRIEVAL_POOL_K, help="chunks per query, defaults to the retrieve node's pool size")
+    parser.add_argument("--queries", type=int, default=200, help="questions timed one at a time for latency percentiles")
+    parser.add_argument("--threads", type=int, default=0, help="faiss threads, 0 keeps the default")
+    args=parser.parse_args()
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    parts, names=args.parts.split(","), args.configs.split(",")
+    scaling, rows, embedding, reports=[], [], [], []
+    if "scaling" in parts:
+        for n in (int(size) for size in args.sizes.split(",")):
+            scaling+=scale_size(n, args.dim, args.k, args.batch_queries, args.queries, names)
+        reports.append("Index scaling (synthetic vectors):\n\n"+scaling_table(scaling, args.k))
+    if "comparison" in parts:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for n in (int(size) for size in args.compare_sizes.split(",")):
+                size_rows, size_embedding=compare_size(n, args.k, args.queries, names, args.backends.split(","), args.modes.split(","), Path(cache_dir))
+                rows+=size_rows
+                embedding+=size_embedding
+        reports.append("Backends and retrieval modes (real embeddings, through VectorDB and the retrieve node):\n\n"+comparison_table(rows, embedding, args.k))
+    report="\n\n".join(reports)
+    print("\n"+report)
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp=datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    (RESULTS_DIR/f"retrieval_{stamp}.json").write_text(json.dumps({"settings": vars(args), "scaling": scaling, "embedding": embedding, "rows": rows}, indent=2), encoding="utf-8")
+    (RESULTS_DIR/f"retrieval_{stamp}.md").write_text(report+"\n", encoding="utf-8")
+    print(f"\nResults saved to {RESULTS_DIR}/retrieval_{stamp}.json and .md")
+
+if __name__=="__main__":
+    main()
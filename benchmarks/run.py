@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import httpx
+from benchmarks.corpus import SIZES, generate
+
+REPO_ROOT=Path(__file__).resolve().parents[1]
+RESULTS_DIR=Path(__file__).resolve().parent/"results"
+QUERIES=[ # one query per task, the fake LLM server routes on these keywords
+    "What happened to revenue in Q3?",
+    "Summarize the main findings of the documents",
+    "Compare the documents on customer churn",
+    "Extract all reference IDs mentioned for pricing",
+    "What insights can be drawn about latency trends?"
+]
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values=sorted(values)
+    pick=lambda q: values[min(len(values)-1, int(round(q*(len(values)-1))))]
+    return {"count": len(values), "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": values[-1]}
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """
+    Peak resident memory (VmHWM) of a process and its children (e.g. the PDF loader pool), from /proc. None where /proc is not available.
+    """
+    total=0.0
+    pids=[pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids+=[int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for process in pids:
+        try:
+            with open(f"/proc/{process}/status") as f:
+                total+=next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))/1024
+        except (OSError, StopIteration):
+            if process==pid:
+                return None
+    return total
+
+def wait_until_up(url: str, timeout: float=120):
+    deadline=time.time()+timeout
+    while time.time()<deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code==200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout} seconds")
+
+def start(command: List[str], env: Dict[str, str], health_url: str) -> subprocess.Popen:
+    process=subprocess.Popen(command, cwd=REPO_ROOT, env={**os.environ, **env})
+    try:
+        wait_until_up(health_url)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process
+
+async def run_load(app_url: str, files: List[Path], clients: int, requests: int) -> Dict:
+    """
+    Send requests to /ai/ai-research from a number of concurrent clients, each uploading the whole corpus with a query (cycling through the tasks).
+    """
+    latencies: List[float]=[]
+    errors=0
+    counter=iter(range(requests))
+    async with httpx.AsyncClient(base_url=app_url, timeout=600) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                upload=[("files", (path.name, path.read_bytes())) for path in files]
+                start_time=time.perf_counter()
+                response=await client.post("/ai/ai-research", params={"query": QUERIES[i%len(QUERIES)], "no_cache": "true"}, files=upload)
+                latencies.append(time.perf_counter()-start_time)
+                if response.status_code!=200:
+                    errors+=1
+                    print(f"Request {i} failed ({response.status_code}): {response.text[:200]}")
+        started=time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed=time.perf_counter()-started
+    return {"requests": requests, "errors": errors, "seconds": elapsed, "throughput_rps": requests/elapsed, "latency": percentiles(latencies)}
+
+def stage_percentiles(trace_file: Path, since: float, until: float) -> Dict[str, Dict[str, float]]:
+    """
+    Per-stage latency percentiles from the exported request traces (see app.utils.tracing): every span name, e.g. load_documents, embed, node.qna, llm.
+    """
+    durations: Dict[str, List[float]]={}
+    if not trace_file.exists():
+        return {}
+    with open(trace_file, encoding="utf-8") as f:
+        for line in f:
+            trace=json.loads(line)
+            if not since<=trace["start"]<=until:
+                continue
+            for span in trace["spans"]:
+                durations.setdefault(span["name"], []).append(span["duration"])
+    return {name: percentiles(values) for name, values in sorted(durations.items())}
+
+def print_report(results: Dict):
+    print(f"\n{'corpus':<8} {'clients':>7} {'req':>5} {'err':>4} {'rps':>7} {'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'peak MB':>8}")
+    for run in results["runs"]:
+        latency=run["latency"]
+        print(f"{run['corpus']:<8} {run['clients']:>7} {run['requests']:>5} {run['errors']:>4} {run['throughput_rps']:>7.2f} {latency.get('p50', 0):>7.2f} {latency.get('p90', 0):>7.2f} {latency.get('p99', 0):>7.2f} {run['peak_rss_mb'] or 0:>8.0f}")
+    for run in results["runs"]:
+        print(f"\nStages, {run['corpus']} corpus, {run['clients']} clients (seconds):")
+        for name, stats in run["stages"].items():
+            print(f"  {name:<24} n={stats['count']:<5} p50={stats['p50']:.3f} p90={stats['p90']:.3f} p99={stats['p99']:.3f}")
+
+def compare(old_path: Path, new_path: Path):
+    """
+    Print the change of throughput, latency and peak memory between two saved runs, for the (corpus, clients) pairs they have in common.
+    """
+    old, new=(json.loads(path.read_text(encoding="utf-8")) for path in (old_path, new_path))
+    previous={(run["corpus"], run["clients"]): run for run in old["runs"]}
+    print(f"{'corpus':<8} {'clients':>7} {'rps':>16} {'p50 s':>16} {'p99 s':>16} {'peak MB':>14}")
+    change=lambda a, b: f"{b:.2f} ({(b-a)/a*100:+.0f}%)" if a else f"{b:.2f}"
+    for run in new["runs"]:
+        before=previous.get((run["corpus"], run["clients"]))
+        if before is None:
+            continue
+        print(f"{run['corpus']:<8} {run['clients']:>7} {change(before['throughput_rps'], run['throughput_rps']):>16} "
+              f"{change(before['latency']['p50'], run['latency']['p50']):>16} {change(before['latency']['p99'], run['latency']['p99']):>16} "
+              f"{change(before['peak_rss_mb'] or 0, run['peak_rss_mb'] or 0):>14}")
+
+def main():
+    parser=argparse.ArgumentParser(description="Offline benchmark of /ai/ai-research against a local fake Groq server.")
+    parser.add_argument("--sizes", default="small,medium", help=f"comma separated corpus sizes ({', '.join(SIZES)})")
+    parser.add_argument("--clients", default="1,4", help="comma separated numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=10, help="requests per (corpus, clients) run")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds until the first token of the fake LLM")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=250.0, help="completion throughput of the fake LLM")
+    parser.add_argument("--port", type=int, default=8765, help="port of the app, the fake LLM listens on port+1")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the app")
+    parser.add_argument("--env", action="append", default=[], help="extra app setting as NAME=value, e.g. --env RETRIEVAL_MODE=hybrid (repeatable)")
+    parser.add_argument("--label", default="", help="label stored with the results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved result files instead of running")
+    args=parser.parse_args()
+    if args.compare:
+        compare(Path(args.compare[0]), Path(args.compare[1]))
+        return
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp=datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    trace_file=RESULTS_DIR/f"traces_{stamp}.jsonl"
+    llm_port=args.port+1
+    app_env={
+        "GROQ_API_KEY": "benchmark",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{llm_port}",
+        "LLM_REQUESTS_PER_MINUTE": "0", # the fake server has no rate limit, do not throttle locally
+        "LLM_TOKENS_PER_MINUTE": "0",
+        "TRACE_EXPORT": "file",
+        "TRACE_FILE": str(trace_file),
+        **dict(setting.split("=", 1) for setting in args.env)
+    }
+    fake_llm=start([sys.executable, "-m", "benchmarks.fake_groq", "--port", str(llm_port), "--latency", str(args.llm_latency), "--tokens-per-second", str(args.llm_tokens_per_second)], {}, f"http://127.0.0.1:{llm_port}/health")
+    results={"label": args.label, "started": stamp, "python": platform.python_version(), "settings": {**vars(args), "env": app_env}, "runs": []}
+    try:
+        for size in args.sizes.split(","):
+            files=generate(size)
+            for clients in (int(c) for c in args.clients.split(",")):
+                app=start([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"], app_env, f"http://127.0.0.1:{args.port}/") # a fresh app per run, so peak memory is per run
+                try:
+                    print(f"Running {args.requests} requests, {size} corpus, {clients} clients")
+                    since=time.time()
+                    run=asyncio.run(run_load(f"http://127.0.0.1:{args.port}", files, clients, args.requests))
+                    time.sleep(1) # let the last traces be exported
+                    run.update({"corpus": size, "files": len(files), "clients": clients, "peak_rss_mb": peak_rss_mb(app.pid), "stages": stage_percentiles(trace_file, since, time.time())})
+                    results["runs"].append(run)
+                finally:
+                    app.terminate()
+                    app.wait()
+    finally:
+        fake_llm.terminate()
+        fake_llm.wait()
+    output=RESULTS_DIR/f"{stamp}{'_'+args.label if args.label else ''}.json"
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print_report(results)
+    print(f"\nResults saved to {output} (compare runs with --compare OLD NEW)")
+
+if __name__=="__main__":
+    main()
@@ -1,13 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api.ai_route import router as ai_router
+from app.api.session_route import router as session_router
+from app.config.config import Config
+from app.llms.embeddings import warmup_embedding_model
+from app.utils.metrics import metrics
+from app.db.answer_cache import answer_cache
+from app.db.session_registry import session_registry
+from app.utils.concurrency import run_blocking
+
+async def sweep_sessions():
+    """
+    Periodically remove expired sessions (uploads and indexes), see Config.SESSION_TTL.
+    """
+    while True:
+        try:
+            await run_blocking(session_registry.sweep)
+        except Exception as e:
+            print(f"Session sweep failed: {e}")
+        await asyncio.sleep(Config.SESSION_SWEEP_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan hook. Warms up the shared embedding model at startup so that the first request does not pay the model load, and runs the expired session sweeper while the application is up.
+    """
+    if Config.EMBED_WARMUP:
+        warmup_embedding_model()
+    sweeper=asyncio.create_task(sweep_sessions())
+    yield
+    sweeper.cancel()
 
 # Instantiate the FastAPI application.
-app=FastAPI(title="Content Research Agent")
+app=FastAPI(title="Content Research Agent", lifespan=lifespan)
 
 # adding the AI research router. 
 app.include_router(ai_router)
+app.include_router(session_router)
 
 # A simple health check endpoint at rooot url.
 @app.get("/")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+def record_answer_cache():
+    for name, value in answer_cache.stats().items():
+        metrics.set(f"answer_cache_{name}", value)
+
+# Expose the in-process metrics in the Prometheus text format (per-node latency histograms, ingestion stages, LLM tokens, cache hit rates, index sizes).
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    record_answer_cache()
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+# The same metrics as JSON (count, sum and max of every observation), for a quick look without a Prometheus server.
+@app.get("/metrics/json")
+def get_metrics_json():
+    return {**metrics.snapshot(), "answer_cache": answer_cache.stats()}
@@ -0,0 +1,48 @@
+import pytest
+from app.db import answer_cache as answer_cache_module
+from app.db.answer_cache import AnswerCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now=[1000.0]
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now[0])
+    return now
+
+def test_similar_query_over_the_same_corpus_hits():
+    cache=AnswerCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.put("corpus", "what is the refund policy?", [1.0, 0.0], {"answer": "14 days"})
+    assert cache.get("corpus", [10.0, 1.0])=={"answer": "14 days"} # cosine ~0.995, vectors are normalized
+    assert cache.get("other corpus", [1.0, 0.0]) is None
+    assert cache.stats()=={"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+def test_threshold_separates_hits_from_misses():
+    cache=AnswerCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.put("corpus", "q", [1.0, 0.0], {"answer": "a"})
+    assert cache.get("corpus", [1.0, 1.0]) is None # cosine ~0.707
+    cache.put("corpus", "q2", [0.0, 1.0], {"answer": "b"})
+    assert cache.get("corpus", [0.1, 1.0])=={"answer": "b"} # best match wins
+
+def test_entries_expire_after_ttl(clock):
+    cache=AnswerCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.put("corpus", "q", [1.0, 0.0], {"answer": "a"})
+    clock[0]+=59
+    assert cache.get("corpus", [1.0, 0.0])=={"answer": "a"}
+    clock[0]+=2
+    assert cache.get("corpus", [1.0, 0.0]) is None
+    assert cache.stats()["entries"]==0 # expired entries are dropped on lookup
+
+def test_least_recently_used_answer_is_evicted():
+    cache=AnswerCache(threshold=0.9, ttl=60, max_entries=2)
+    cache.put("corpus", "a", [1.0, 0.0, 0.0], {"answer": "a"})
+    cache.put("corpus", "b", [0.0, 1.0, 0.0], {"answer": "b"})
+    assert cache.get("corpus", [1.0, 0.0, 0.0])=={"answer": "a"} # a is now more recent than b
+    cache.put("corpus", "c", [0.0, 0.0, 1.0], {"answer": "c"})
+    assert cache.get("corpus", [0.0, 1.0, 0.0]) is None
+    assert cache.get("corpus", [1.0, 0.0, 0.0])=={"answer": "a"}
+    assert cache.get("corpus", [0.0, 0.0, 1.0])=={"answer": "c"}
+
+def test_returned_responses_are_copies():
+    cache=AnswerCache(threshold=0.9, ttl=60, max_entries=2)
+    cache.put("corpus", "q", [1.0], {"answer": "a"})
+    cache.get("corpus", [1.0])["answer"]="changed"
+    assert cache.get("corpus", [1.0])=={"answer": "a"}
@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+from app.config.config import Config
+from app.graph.context import build_context, count_tokens, deduplicate, format_passage, merge_overlapping
+
+def chunk(text, start, doc_id="d1", page=0, source="a.pdf"):
+    return Document(page_content=text, metadata={"doc_id": doc_id, "page": page, "start_index": start, "source": source, "doc_name": source})
+
+def test_merge_overlapping_joins_overlapping_and_touching_chunks():
+    text="The quick brown fox jumps over the lazy dog."
+    docs=[chunk(text[10:30], 10), chunk(text[0:15], 0), chunk(text[30:], 30)] # overlapping, then touching
+    merged=merge_overlapping(docs)
+    assert [d.page_content for d in merged]==[text]
+
+def test_merge_overlapping_keeps_gaps_and_best_rank_order():
+    docs=[chunk("far away text", 500), chunk("opening words", 0), chunk("other page", 0, page=1), Document(page_content="no offsets", metadata={"doc_id": "d1", "page": 0})]
+    merged=merge_overlapping(docs)
+    assert [d.page_content for d in merged]==["far away text", "opening words", "other page", "no offsets"]
+
+def test_merge_overlapping_takes_the_best_rank_of_merged_chunks():
+    docs=[chunk("beta gamma", 6), chunk("separate passage", 900), chunk("other document", 0, doc_id="d2"), chunk("alpha beta", 0)]
+    merged=merge_overlapping(docs)
+    assert [d.page_content for d in merged]==["alpha beta gamma", "separate passage", "other document"]
+
+def test_deduplicate_drops_near_identical_passages_of_lower_rank():
+    base="one two three four five six seven eight nine ten eleven twelve"
+    passages=[Document(page_content=base), Document(page_content=base+" thirteen"), Document(page_content="completely different words in this passage here now")]
+    kept=deduplicate(passages, 0.8)
+    assert [p.page_content for p in kept]==[base, "completely different words in this passage here now"]
+    assert len(deduplicate(passages, 1.0))==3 # only exact shingle sets are duplicates at 1.0
+
+def test_build_context_packs_best_passages_into_the_budget(monkeypatch):
+    monkeypatch.setattr(Config, "CONTEXT_DEDUP_THRESHOLD", 0.9)
+    docs=[chunk(f"passage {i} "+"word "*40, i*1000, page=i) for i in range(5)] # ranked 0..4, no overlaps
+    budget=count_tokens(format_passage(docs[0]))*2+1
+    selected=build_context(list(reversed(docs)), budget) # best ranked first: pages 4, 3
+    assert [d.metadata["page"] for d in selected]==[3, 4] # returned in reading order
+    assert sum(count_tokens(format_passage(d)) for d in selected)<=budget
+
+def test_build_context_skips_large_passages_and_keeps_packing(monkeypatch):
+    monkeypatch.setattr(Config, "CONTEXT_DEDUP_THRESHOLD", 0.9)
+    small=chunk("short passage", 0, page=1)
+    budget=count_tokens(format_passage(small))+5
+    docs=[small, chunk("long "*500, 0, page=2), chunk("another short one", 0, page=3)]
+    selected=build_context(docs, budget)
+    assert [d.metadata["page"] for d in selected]==[1]
+
+def test_build_context_truncates_a_best_passage_that_does_not_fit(monkeypatch):
+    monkeypatch.setattr(Config, "CONTEXT_DEDUP_THRESHOLD", 0.9)
+    selected=build_context([chunk("word "*2000, 0)], 50)
+    assert len(selected)==1
+    assert count_tokens(selected[0].page_content)<=51
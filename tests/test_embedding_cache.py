@@ -0,0 +1,36 @@
+import itertools
+from app.db import embedding_cache
+from app.db.embedding_cache import EmbeddingCache, text_hash
+
+VECTOR=[0.5]*4 # 16 bytes as float32
+
+def clock(monkeypatch):
+    ticks=itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+def test_hit_and_miss(tmp_path):
+    cache=EmbeddingCache(str(tmp_path/"cache.sqlite3"), max_bytes=1024)
+    cache.put_many("model", {text_hash("a"): VECTOR})
+    found=cache.get_many("model", [text_hash("a"), text_hash("b"), text_hash("a")])
+    assert found=={text_hash("a"): VECTOR}
+    assert cache.get_many("other-model", [text_hash("a")])=={} # keyed by model too
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock(monkeypatch)
+    cache=EmbeddingCache(str(tmp_path/"cache.sqlite3"), max_bytes=48) # three vectors
+    for name in "abc":
+        cache.put_many("model", {name: VECTOR})
+    cache.get_many("model", ["a"]) # a is now more recently used than b and c
+    cache.put_many("model", {"d": VECTOR}) # 64 bytes > 48, evicted down to 90% of the cap: two vectors remain
+    assert set(cache.get_many("model", list("abcd")))=={"a", "d"}
+    assert cache.stats()=={"entries": 2, "bytes": 32, "max_bytes": 48}
+
+def test_size_is_shared_between_connections(tmp_path, monkeypatch):
+    clock(monkeypatch)
+    path=str(tmp_path/"cache.sqlite3")
+    first, second=EmbeddingCache(path, max_bytes=48), EmbeddingCache(path, max_bytes=48) # two workers sharing the file
+    first.put_many("model", {"a": VECTOR, "b": VECTOR})
+    second.put_many("model", {"c": VECTOR, "d": VECTOR})
+    assert second.stats()["bytes"]<=48
+    assert first.stats()==second.stats()
+    assert set(first.get_many("model", list("abcd")))=={"c", "d"}
@@ -0,0 +1,13 @@
+from pypdf import PdfWriter
+from app.ingestion.loader import _load_pdf, _load_pdf_pages
+
+def test_page_ranges_match_pypdfloader(tmp_path):
+    writer=PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(200, 200)
+    writer.add_metadata({"/Title": " Report ", "/Author": "Ann", "/CreationDate": "D:20240102030405+00'00'"})
+    path=str(tmp_path/"report.pdf")
+    writer.write(path)
+    pages=_load_pdf_pages(path, 0, 2)+_load_pdf_pages(path, 2, 4)
+    assert pages==_load_pdf(path)
+    assert pages[0][1]["title"]=="Report" and pages[0][1]["creationdate"]=="2024-01-02T03:04:05+00:00"
@@ -0,0 +1,49 @@
+import numpy as np
+from langchain_core.documents import Document
+from app.graph.nodes.plan import _per_document, mmr
+
+def hit(doc_id, n):
+    return Document(page_content=f"{doc_id}-{n}", metadata={"doc_id": doc_id, "chunk_id": f"{doc_id}-{n}"})
+
+class FakeVectorDB:
+    def __init__(self, doc_ids):
+        self._doc_ids=doc_ids
+        self.searched=[]
+
+    def doc_ids(self):
+        return self._doc_ids
+
+    def search_document(self, query, doc_id, k):
+        self.searched.append(doc_id)
+        return [hit(doc_id, f"own{i}") for i in range(k)]
+
+def test_mmr_with_lambda_one_is_relevance_order():
+    vectors=np.array([[0.0, 1.0], [1.0, 0.1], [1.0, 0.0]], dtype=np.float32)
+    assert mmr(np.array([1.0, 0.0]), vectors, 3, 1.0)==[2, 1, 0]
+
+def test_mmr_skips_near_duplicates_of_selected_chunks():
+    vectors=np.array([[1.0, 0.0], [0.995, -0.0998], [0.6, 0.8]], dtype=np.float32) # row 1 nearly duplicates row 0
+    assert mmr(np.array([1.0, 0.3]), vectors, 2, 1.0)==[0, 1]
+    assert mmr(np.array([1.0, 0.3]), vectors, 2, 0.5)==[0, 2]
+
+def test_mmr_k_larger_than_pool():
+    vectors=np.eye(3, dtype=np.float32)
+    assert sorted(mmr(np.ones(3), vectors, 10, 0.5))==[0, 1, 2]
+
+def test_per_document_caps_each_document_and_interleaves():
+    pool=[hit("a", 0), hit("a", 1), hit("a", 2), hit("b", 0), hit("a", 3), hit("b", 1)]
+    docs, plan=_per_document(FakeVectorDB(["a", "b"]), "q", pool, quota=2, max_docs=5)
+    assert [d.page_content for d in docs]==["a-0", "b-0", "a-1", "b-1"]
+    assert plan["fallback_docs"]==[]
+
+def test_per_document_searches_documents_missing_from_the_pool():
+    vector_db=FakeVectorDB(["a", "b", "c"])
+    docs, plan=_per_document(vector_db, "q", [hit("a", 0), hit("a", 1)], quota=2, max_docs=5)
+    assert vector_db.searched==["b", "c"] and plan["fallback_docs"]==["b", "c"]
+    assert [d.page_content for d in docs]==["a-0", "b-own0", "c-own0", "a-1", "b-own1", "c-own1"]
+
+def test_per_document_respects_max_docs():
+    vector_db=FakeVectorDB(["a", "b", "c"])
+    docs, plan=_per_document(vector_db, "q", [hit("a", 0)], quota=1, max_docs=2)
+    assert [d.page_content for d in docs]==["a-0", "b-own0"]
+    assert vector_db.searched==["b"]
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import pytest
+from app.llms import rate_limit
+from app.llms.rate_limit import RateLimiter, Slots, TokenBucket, parse_duration
+
+class RateLimited(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.status_code=429
+        self.response=type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}, "status_code": 429})()
+
+@pytest.mark.parametrize("value, seconds", [
+    (None, 0.0), ("", 0.0), ("3", 3.0), ("7.66s", 7.66), ("120ms", 0.12), ("2m59.56s", 179.56), ("1h2m", 3720.0)
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value)==pytest.approx(seconds)
+
+def test_token_bucket_refills_over_time():
+    bucket=TokenBucket(60) # one token per second
+    now=bucket.updated
+    assert bucket.reserve(60, now)==0
+    assert bucket.reserve(2, now)==pytest.approx(2.0) # empty, two tokens take two seconds
+    assert bucket.reserve(2, now+2)==0
+
+def test_token_bucket_admits_requests_larger_than_capacity_once_full():
+    bucket=TokenBucket(60)
+    assert bucket.reserve(1000, bucket.updated)==0
+
+def test_token_bucket_disabled_only_honours_server_blocks():
+    bucket=TokenBucket(0)
+    assert bucket.reserve(10**6, 0.0)==0
+    bucket.block(5, 0.0)
+    assert bucket.reserve(1, 1.0)==pytest.approx(4.0)
+
+def test_token_bucket_sync_with_server_budget():
+    bucket=TokenBucket(60)
+    now=bucket.updated
+    bucket.sync(remaining=1, reset_seconds=30, now=now)
+    assert bucket.tokens==1
+    bucket.sync(remaining=0, reset_seconds=30, now=now)
+    assert bucket.reserve(1, now+10)==pytest.approx(20.0)
+
+def test_backoff_uses_retry_after_and_blocks_everyone(monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: high)
+    limiter=RateLimiter(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0, max_retries=3)
+    assert limiter._backoff(0, RateLimited(retry_after="4")) == pytest.approx(5.0) # retry-after plus up to 25% jitter
+    assert limiter._reserve(1)>3.9 # other callers wait as well
+
+def test_backoff_is_exponential_and_capped(monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(rate_limit.Config, "LLM_BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(rate_limit.Config, "LLM_BACKOFF_MAX", 3.0)
+    limiter=RateLimiter(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0, max_retries=3)
+    assert [limiter._backoff(attempt, RateLimited()) for attempt in range(4)]==[0.5, 1.0, 2.0, 3.0]
+
+def test_call_retries_rate_limited_calls(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    limiter=RateLimiter(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0, max_retries=2)
+    attempts=[]
+    def flaky():
+        attempts.append(1)
+        if len(attempts)<3:
+            raise RateLimited()
+        return "ok"
+    assert limiter.call(flaky, 1)=="ok"
+    assert len(attempts)==3
+    with pytest.raises(RateLimited):
+        limiter.call(lambda: (_ for _ in ()).throw(RateLimited()), 1)
+    with pytest.raises(ValueError): # other errors are not retried
+        limiter.call(lambda: (_ for _ in ()).throw(ValueError()), 1)
+
+@pytest.mark.asyncio
+async def test_async_slots_are_first_come_first_served():
+    slots=Slots(1)
+    await slots.aacquire()
+    order=[]
+    async def waiter(name):
+        await slots.aacquire()
+        order.append(name)
+        slots.release()
+    tasks=[asyncio.create_task(waiter(name)) for name in "abc"]
+    await asyncio.sleep(0)
+    slots.release()
+    await asyncio.gather(*tasks)
+    assert order==["a", "b", "c"]
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    slots=Slots(1)
+    await slots.aacquire()
+    cancelled=asyncio.create_task(slots.aacquire())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    slots.release()
+    await asyncio.wait_for(slots.aacquire(), 1) # the slot is free again
+
+@pytest.mark.asyncio
+async def test_slots_are_shared_with_threads():
+    slots=Slots(1)
+    await slots.aacquire()
+    acquired=threading.Event()
+    def worker():
+        slots.acquire()
+        acquired.set()
+        slots.release()
+    thread=threading.Thread(target=worker)
+    thread.start()
+    await asyncio.sleep(0.05)
+    assert not acquired.is_set()
+    slots.release()
+    thread.join(1)
+    assert acquired.is_set()
+    await asyncio.wait_for(slots.aacquire(), 1)
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+import pytest
+from app.config.config import Config
+from app.db import session_registry as registry_module
+from app.db.session_registry import INGESTING, PENDING, READY, STATE_FILE, Session, SessionRegistry, read_state
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """
+    Two registries sharing the upload and index directories, like two uvicorn workers.
+    """
+    monkeypatch.setattr(Config, "UPLOAD_PATH", str(tmp_path/"uploads"))
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path/"vector_db"))
+    monkeypatch.setattr(Config, "SESSION_TTL", 60.0)
+    os.makedirs(Config.UPLOAD_PATH)
+    os.makedirs(Config.VECTOR_DB_PATH)
+    return SessionRegistry(ingest_workers=1), SessionRegistry(ingest_workers=1)
+
+def create(registry, session_id, **kwargs):
+    os.makedirs(os.path.join(Config.UPLOAD_PATH, session_id))
+    return registry.register(Session(session_id, **kwargs))
+
+def age(session_id, seconds):
+    """
+    Move the session's last use back in time, as if it was not used for the given number of seconds.
+    """
+    session=read_state(session_id)
+    session.last_used-=seconds
+    registry_module.write_state(session)
+
+def wait_for(condition):
+    deadline=time.time()+5
+    while not condition() and time.time()<deadline:
+        time.sleep(0.01)
+    assert condition()
+
+def test_session_registered_in_one_worker_is_found_by_another(workers):
+    a, b=workers
+    create(a, "s1", status=READY, chunks=3)
+    session=b.get("s1", touch=False)
+    assert session.status==READY and session.chunks==3
+    assert b.get("missing") is None
+
+def test_other_workers_see_status_changes(workers):
+    a, b=workers
+    session=create(a, "s1")
+    assert b.get("s1", touch=False).status==PENDING
+    release=threading.Event()
+    assert a.submit(session, lambda s: (release.wait(5), setattr(s, "chunks", 7)))
+    assert b.get("s1", touch=False).status==INGESTING
+    assert not b.submit(b.get("s1"), lambda s: None) # one job per session across workers
+    release.set()
+    wait_for(lambda: b.get("s1", touch=False).status==READY)
+    assert b.get("s1").chunks==7
+
+def test_touch_in_one_worker_keeps_the_session_in_all(workers):
+    a, b=workers
+    create(a, "s1", status=READY)
+    age("s1", 50)
+    assert b.get("s1") is not None # used through worker b, refreshes the state file
+    age("s1", 20) # 70 seconds since the session was created, 20 since its last use
+    assert a.sweep()==0
+    assert a.get("s1", touch=False) is not None
+
+def test_sweep_removes_expired_sessions_of_any_worker(workers):
+    a, b=workers
+    create(a, "s1", status=READY)
+    create(a, "s2", status=READY)
+    age("s1", 61)
+    assert b.sweep()==1
+    assert not os.path.exists(os.path.join(Config.UPLOAD_PATH, "s1"))
+    assert a.get("s1") is None and a.get("s2") is not None
+
+def test_sweep_keeps_sessions_ingesting_in_another_worker(workers):
+    a, b=workers
+    create(a, "s1", status=INGESTING)
+    age("s1", 600) # last_used only counts once ingestion finished
+    assert b.sweep()==0
+    old=time.time()-120
+    os.utime(os.path.join(Config.UPLOAD_PATH, "s1", STATE_FILE), (old, old)) # the ingesting worker stopped long ago
+    assert b.sweep()==1
+
+def test_sweep_removes_stale_directories_without_state(workers):
+    a, _=workers
+    old=time.time()-120
+    for path in (os.path.join(Config.UPLOAD_PATH, "gone"), os.path.join(Config.VECTOR_DB_PATH, "orphan_vector_db")):
+        os.makedirs(path)
+        os.utime(path, (old, old))
+    os.makedirs(os.path.join(Config.UPLOAD_PATH, "fresh"))
+    assert a.sweep()==1
+    assert sorted(os.listdir(Config.UPLOAD_PATH))==["fresh"]
+    assert os.listdir(Config.VECTOR_DB_PATH)==[]
+
+def test_delete_in_one_worker_is_seen_by_another(workers):
+    a, b=workers
+    create(a, "s1", status=READY)
+    assert a.get("s1") is not None
+    assert b.delete("s1")
+    assert a.get("s1") is None and a.get("s1", touch=False) is None
+    assert not b.delete("s1")
+
+def test_session_ingested_in_a_request_is_published_when_ready(workers):
+    a, b=workers
+    session=create(a, "s1", status=INGESTING)
+    a.ready(session, 5)
+    assert a.get("s1", touch=False).status==READY # this worker sees its own state right away
+    wait_for(lambda: b.get("s1", touch=False).status==READY)
+    assert b.get("s1").chunks==5
@@ -0,0 +1,65 @@
+from app.db.session_store import SessionIndexStore
+
+def test_evicts_least_recently_used_over_budget():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "db-a", 40)
+    store.put("b", "db-b", 40)
+    assert store.get("a")=="db-a" # a is now more recently used than b
+    store.put("c", "db-c", 40)
+    assert store.get("b") is None
+    assert store.get("a")=="db-a" and store.get("c")=="db-c"
+    assert store.total_bytes==80
+
+def test_keeps_latest_entry_larger_than_budget():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "db-a", 40)
+    store.put("big", "db-big", 500)
+    assert store.get("a") is None
+    assert store.get("big")=="db-big"
+
+def test_pinned_session_survives_eviction_until_unpinned():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "db-a", 60)
+    with store.pin("a"):
+        store.put("b", "db-b", 60)
+        assert store.total_bytes==120 # over budget, but a is pinned
+    assert store.total_bytes==60
+    assert store.get("a") is None # evicted once the last pin is released
+    assert store.get("b")=="db-b"
+
+def test_pins_are_reference_counted():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "db-a", 60)
+    with store.pin("a"):
+        with store.pin("a"):
+            store.put("b", "db-b", 60)
+        assert store.total_bytes==120 # still pinned by the outer block
+    assert store.get("a") is None
+
+def test_pin_before_publish():
+    store=SessionIndexStore(max_bytes=100)
+    with store.pin("a"):
+        store.put("a", "db-a", 60)
+        store.put("b", "db-b", 60)
+        assert store.get("a")=="db-a"
+
+def test_put_if_absent_does_not_replace_published_index():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "published", 10)
+    assert not store.put_if_absent("a", "from-disk", 10)
+    assert store.get("a")=="published"
+    assert store.put_if_absent("b", "from-disk", 10)
+    assert store.get("b")=="from-disk"
+
+def test_put_if_absent_evicts_others():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "db-a", 60)
+    assert store.put_if_absent("b", "db-b", 60)
+    assert store.get("a") is None and store.get("b")=="db-b"
+
+def test_discard():
+    store=SessionIndexStore(max_bytes=100)
+    store.put("a", "db-a", 10)
+    store.discard("a")
+    store.discard("missing")
+    assert store.get("a") is None and store.total_bytes==0
@@ -0,0 +1,53 @@
+import pytest
+from app.db.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+@pytest.fixture
+def index():
+    index=BM25Index()
+    index.add(["a", "b", "c", "d"], [
+        "Invoice INV-2041 was paid on 12 March.",
+        "The invoice total is due within 30 days of the invoice date.",
+        "Payment terms and late fees are described in section 4.",
+        "The warranty covers manufacturing defects for two years."
+    ])
+    return index
+
+def test_tokenize_keeps_identifiers_and_numbers():
+    assert tokenize("Invoice INV-2041, 12 March")==["invoice", "inv", "2041", "12", "march"]
+
+def test_rare_terms_outrank_common_ones(index):
+    ids=[chunk_id for chunk_id, _ in index.search("invoice 2041", 4)]
+    assert ids==["a", "b"] # only a has the rare identifier, b only the common term
+
+def test_term_frequency_saturates_and_scores_are_ordered(index):
+    results=index.search("invoice", 4)
+    assert [chunk_id for chunk_id, _ in results]==["b", "a"] # b mentions it twice
+    assert results[0][1]>results[1][1]>0
+    assert index.search("nothing matches", 4)==[]
+    assert len(index.search("the invoice", 1))==1
+
+def test_removed_chunks_are_never_returned(index):
+    copy=index.copy()
+    copy.remove(["a"])
+    assert [chunk_id for chunk_id, _ in copy.search("2041 invoice", 4)]==["b"]
+    assert len(copy)==3 and len(index)==4 # the original is untouched
+    assert [chunk_id for chunk_id, _ in index.search("2041", 4)]==["a"]
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    dense=["x", "y", "z"]
+    sparse=["y", "w", "x"]
+    fused=reciprocal_rank_fusion([dense, sparse], [1.0, 1.0], k=60)
+    assert [chunk_id for chunk_id, _ in fused]==["y", "x", "w", "z"]
+    assert fused[0][1]==pytest.approx(1/62+1/61)
+
+def test_reciprocal_rank_fusion_weights():
+    fused=reciprocal_rank_fusion([["x", "y"], ["y", "x"]], [2.0, 1.0], k=60)
+    assert [chunk_id for chunk_id, _ in fused]==["x", "y"] # the heavier ranking breaks the tie
+    assert reciprocal_rank_fusion([["x"], ["y"]], [1.0, 0.0], k=60)[1]==("y", 0.0)
+
+def test_bm25_hits_are_promoted_by_fusion(index):
+    dense=["d", "c", "b", "a"] # embedding search misses the identifier
+    sparse=[chunk_id for chunk_id, _ in index.search("INV-2041", 4)]
+    fused=reciprocal_rank_fusion([dense, sparse], [1.0, 1.0], k=60)
+    assert sparse==["a"]
+    assert [chunk_id for chunk_id, _ in fused]==["a", "d", "c", "b"]
@@ -0,0 +1,35 @@
+import json
+from app.graph.streaming import AnswerTokenExtractor
+
+def stream(pieces, field="answer"):
+    extractor=AnswerTokenExtractor(field)
+    return "".join(extractor.feed(piece) for piece in pieces)
+
+def test_extracts_answer_from_token_sized_pieces():
+    raw=json.dumps({"answer": "Line one\nLine \"two\" \\ done", "report_md": "# ignored"})
+    assert stream(raw[i:i+3] for i in range(0, len(raw), 3))=="Line one\nLine \"two\" \\ done"
+
+def test_every_split_of_an_escape_gives_the_same_text():
+    raw=json.dumps({"answer": "tab\there, caf\u00e9, emoji \U0001F600!"}) # ascii-escaped, including a surrogate pair
+    expected="tab\there, caf\u00e9, emoji \U0001F600!"
+    for cut in range(1, len(raw)):
+        assert stream([raw[:cut], raw[cut:]])==expected
+    assert stream(raw)==expected
+
+def test_surrogate_pair_split_across_feeds_is_one_character():
+    extractor=AnswerTokenExtractor()
+    assert extractor.feed('{"answer": "a\\uD83D')=="a"
+    assert extractor.feed('\\uDE')==""
+    assert extractor.feed('00b"}')=="\U0001F600b"
+
+def test_lone_high_surrogate_is_passed_through():
+    assert stream(['{"answer": "\\uD83Dx"}'])=="\ud83dx"
+
+def test_stops_at_the_closing_quote_and_skips_other_fields():
+    extractor=AnswerTokenExtractor()
+    assert extractor.feed('{"report_md": "not \\"answer\\": this", ')==""
+    assert extractor.feed('"answer" : "yes"')=="yes"
+    assert extractor.feed(', "other": "no"}')==""
+
+def test_custom_field():
+    assert stream(['{"answer": "x", "summary": "short"}'], field="summary")=="short"
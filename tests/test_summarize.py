@@ -0,0 +1,74 @@
+import asyncio
+import json
+import pytest
+from langchain_core.documents import Document
+from app.config.config import Config
+from app.graph.context import count_tokens
+from app.graph.nodes import summarize
+from app.graph.nodes.summarize import REDUCE_PROMPT, _fit, _pack
+from app.llms.groq import llm_task
+
+def test_pack_groups_consecutive_texts_within_the_budget():
+    texts=["a "*40, "b "*40, "c "*40, "d "*200, "e "*10]
+    sizes=[count_tokens(text) for text in texts]
+    budget=sizes[0]+sizes[1]
+    groups=_pack(texts, budget)
+    assert groups==["\n".join(texts[:2]), texts[2], texts[3], texts[4]] # an oversized text forms its own group
+    assert _pack(texts, 10**6)==["\n".join(texts)]
+    assert _pack([], 100)==[]
+
+def test_fit_shares_the_budget_between_partials():
+    partials=["short", "long "*400, "long "*400]
+    fitted=_fit(partials, 90)
+    assert fitted[0]=="short"
+    assert all(count_tokens(p)<=31 for p in fitted) # the approximate count used without tiktoken may be one over
+
+class FakeResponse:
+    def __init__(self, answer):
+        self.content=json.dumps({"answer": answer})
+
+class FakeLLM:
+    def __init__(self):
+        self.tasks=[]
+        self.prompts=[]
+
+    def _respond(self, prompt):
+        self.tasks.append(llm_task.get())
+        self.prompts.append(prompt)
+        return FakeResponse("Answer: "+"bullet "*80) # every partial summary is too large to be reduced together with another
+
+    def invoke(self, prompt, **kwargs):
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        return self._respond(prompt)
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake=FakeLLM()
+    monkeypatch.setattr(summarize, "get_groq_llm", lambda **kwargs: fake)
+    monkeypatch.setattr(Config, "SUMMARIZE_MAP_GROUP_TOKENS", 100)
+    return fake
+
+def state():
+    docs=[Document(page_content="text "*60, metadata={"doc_id": "doc_0", "source": "a.pdf", "page": page, "start_index": 0}) for page in range(4)]
+    return {"query": "summarize", "documents": docs}
+
+def assert_final_prompt_fits(llm):
+    summaries_tokens=count_tokens(llm.prompts[-1])-count_tokens(REDUCE_PROMPT.format(summaries="", query="summarize"))
+    assert len(llm.prompts)==5 # four map calls, no intermediate reduce, the final reduce
+    assert summaries_tokens<=Config.SUMMARIZE_MAP_GROUP_TOKENS+4
+
+def test_map_reduce_truncates_partials_that_cannot_be_combined(llm):
+    token=llm_task.set("summarize")
+    try:
+        result=summarize.map_reduce_summarize(state())
+    finally:
+        llm_task.reset(token)
+    assert result["answer"].startswith("Answer:")
+    assert_final_prompt_fits(llm)
+    assert set(llm.tasks)=={"summarize"} # the node's task reaches the map calls on the pool threads
+
+def test_async_map_reduce_truncates_partials_that_cannot_be_combined(llm):
+    asyncio.run(summarize.amap_reduce_summarize(state()))
+    assert_final_prompt_fits(llm)